@@ -0,0 +1,159 @@
+"""
+Precomputed Address Features for AquaSphere
+Stores distance from the hub and encoded location ids for saved addresses
+
+Distance and label-encoded municipality/barangay/postal code only change
+when the address does, so they are computed when an address is saved (or
+first used for an order) and quotes fill in the time-dependent features.
+
+user_state_save.php runs `python address_features.py save <user id> '<address JSON>'`
+in the background whenever a customer saves a delivery address; the address
+id is written back into users.delivery_address so later quotes can send it.
+"""
+
+import os
+import sys
+import json
+
+# Distance and label encoders come from the prediction module
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml')
+sys.path.insert(0, ML_DIR)
+from predict import compute_address_features
+from db import sql
+
+ML_MODEL_DIR = os.path.join(ML_DIR, 'models')
+
+FEATURE_COLUMNS = ['latitude', 'longitude', 'municipality', 'barangay', 'postal_code', 'distance_km',
+                   'municipality_encoded', 'barangay_encoded', 'postal_code_encoded', 'model_version']
+
+
+def ensure_schema(cursor, postgres=False):
+    """Create the address_features table if it doesn't exist"""
+    id_type = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS address_features (
+            id {id_type},
+            address_key TEXT UNIQUE NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            municipality TEXT,
+            barangay TEXT,
+            postal_code TEXT,
+            distance_km REAL NOT NULL,
+            municipality_encoded INTEGER,
+            barangay_encoded INTEGER,
+            postal_code_encoded INTEGER,
+            model_version TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def parse_address(delivery_address):
+    """
+    Get a saved-address dict (as sent by cart.html/profile.html) from a dict or JSON string
+
+    Returns:
+        The address dict, or None if it has no coordinates
+    """
+    address = delivery_address
+    if isinstance(address, str):
+        try:
+            address = json.loads(address)
+        except ValueError:
+            return None
+    if not isinstance(address, dict) or not address.get('latitude') or not address.get('longitude'):
+        return None
+    return address
+
+
+def address_key(address):
+    """Identify an address by its rounded coordinates and location names"""
+    return '|'.join([
+        f"{float(address['latitude']):.6f}",
+        f"{float(address['longitude']):.6f}",
+        str(address.get('city', '')).strip().lower(),
+        str(address.get('barangay', '')).strip().lower(),
+        str(address.get('postalCode', '')).strip()
+    ])
+
+
+def upsert_address_features(cursor, address, postgres=False, model_dir=ML_MODEL_DIR):
+    """
+    Compute and store the features of an address (inside the caller's transaction)
+
+    Args:
+        cursor: Database cursor
+        address: Saved-address dict with 'latitude', 'longitude', 'city', 'barangay', 'postalCode'
+
+    Returns:
+        The address id
+    """
+    features = compute_address_features(
+        address['latitude'], address['longitude'],
+        address.get('city', ''), address.get('barangay', ''), address.get('postalCode', ''),
+        model_dir
+    )
+    key = address_key(address)
+    values = [features.get(col) for col in FEATURE_COLUMNS]
+
+    cursor.execute(sql(f"""
+        INSERT INTO address_features (address_key, {', '.join(FEATURE_COLUMNS)})
+        VALUES (?, {', '.join('?' for _ in FEATURE_COLUMNS)})
+        ON CONFLICT (address_key) DO UPDATE SET
+            {', '.join(f'{col} = EXCLUDED.{col}' for col in FEATURE_COLUMNS)},
+            updated_at = CURRENT_TIMESTAMP
+    """, postgres), [key] + values)
+
+    cursor.execute(sql("SELECT id FROM address_features WHERE address_key = ?", postgres), (key,))
+    return cursor.fetchone()[0]
+
+
+def get_address_features(cursor, address_id, postgres=False):
+    """Load an address's stored features, or None if the id is unknown"""
+    cursor.execute(sql(f"""
+        SELECT {', '.join(FEATURE_COLUMNS)} FROM address_features WHERE id = ?
+    """, postgres), (address_id,))
+    row = cursor.fetchone()
+    return dict(zip(FEATURE_COLUMNS, row)) if row else None
+
+
+def save_user_address(cursor, user_id, saved_json, postgres=False):
+    """
+    Precompute the features of an address saved by user_state_save.php and
+    store its address_id back in users.delivery_address
+
+    The write-back only applies if the user's saved address is still
+    saved_json, so a slow run can't overwrite a newer address.
+
+    Returns:
+        The address id, or None if saved_json has no coordinates
+    """
+    address = parse_address(saved_json)
+    if address is None:
+        return None
+    address_id = upsert_address_features(cursor, address, postgres)
+    cursor.execute(sql("""
+        UPDATE users SET delivery_address = ? WHERE id = ? AND delivery_address = ?
+    """, postgres), (json.dumps(dict(address, address_id=address_id)), user_id, saved_json))
+    return address_id
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] != 'save':
+        print("Usage: python address_features.py save <user id> '<delivery address JSON>'")
+        sys.exit(1)
+
+    from db import connect
+
+    # Fails instead of falling back to SQLite when PostgreSQL is configured but unreachable from Python
+    conn, postgres = connect()
+    cursor = conn.cursor()
+    ensure_schema(cursor, postgres)
+    address_id = save_user_address(cursor, int(sys.argv[2]), sys.argv[3], postgres)
+    if address_id is None:
+        print(json.dumps({'success': False, 'message': 'latitude and longitude are required'}), file=sys.stderr)
+        sys.exit(1)
+    conn.commit()
+    conn.close()
+    print(json.dumps({'success': True, 'address_id': address_id}))
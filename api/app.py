@@ -3,12 +3,34 @@ Python Flask API for AquaSphere
 Additional backend functionality
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
-import sqlite3
+import sys
+import json
+import math
+import time
+import threading
 from datetime import datetime
 
+# Delivery prediction modules live in ../ml
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml')
+sys.path.insert(0, ML_DIR)
+
+from delivery_slots import DeliverySlotScheduler, NoDeliveryCapacity, DEFAULT_HUB_ID, ensure_schema as ensure_slot_schema
+import rollups
+import address_features
+import prediction_monitor
+from order_ingest import GroupCommitWriter
+import order_export
+import order_events
+from response_encoding import FastJSONProvider, compress_response
+import sqlite_backend
+from sqlite_backend import SingleWriterBackend
+from route_batching import plan_routes, load_pending_stops, DEFAULT_VEHICLE_CAPACITY, DEFAULT_SHIFT_MINUTES
+from predict import calculate_shipping_fee, ShadowEvaluator
+from prediction_coalescer import PredictionCoalescer
+
 # Try to import psycopg2, but make it optional
 try:
     import psycopg2
@@ -20,7 +42,27 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)
 
+# jsonify() uses the fast encoder (handles datetime/Decimal from psycopg2 rows)
+app.json = FastJSONProvider(app)
+
+@app.after_request
+def encode_response(response):
+    """Compress large JSON/CSV responses with gzip or brotli when the client accepts it"""
+    return compress_response(response, request.headers.get('Accept-Encoding', ''))
+
 # Database configuration
+# SQLITE_SINGLE_WRITER=1 serves SQLite reads from a pool of read-only
+# connections and sends this worker's writes through one writer thread (one per process)
+SQLITE_SINGLE_WRITER = os.environ.get('SQLITE_SINGLE_WRITER') == '1'
+_sqlite_backend = None
+
+def get_sqlite_backend():
+    """Get the single-writer SQLite backend, creating it on first use"""
+    global _sqlite_backend
+    if _sqlite_backend is None:
+        _sqlite_backend = SingleWriterBackend(os.environ.get('DATABASE_PATH', 'aquasphere.db'))
+    return _sqlite_backend
+
 def get_db_connection():
     """Get database connection (PostgreSQL or SQLite)"""
     # Check for PostgreSQL connection
@@ -29,15 +71,184 @@ def get_db_connection():
     if database_url and PSYCOPG2_AVAILABLE:
         # PostgreSQL connection
         return psycopg2.connect(database_url)
+    elif SQLITE_SINGLE_WRITER:
+        # Pooled read-only connection; writes go through run_write()
+        return get_sqlite_backend().read_connection()
     else:
         # SQLite connection (local development or if psycopg2 not available)
         db_path = os.environ.get('DATABASE_PATH', 'aquasphere.db')
-        return sqlite3.connect(db_path)
+        return sqlite_backend.connect(db_path)
+
+def get_write_connection():
+    """Get a writable database connection (bypasses the SQLite read pool)"""
+    if is_postgres():
+        return psycopg2.connect(os.environ.get('DATABASE_URL'))
+    return sqlite_backend.connect(os.environ.get('DATABASE_PATH', 'aquasphere.db'))
 
 def is_postgres():
     """Check if using PostgreSQL"""
     return os.environ.get('DATABASE_URL') is not None and PSYCOPG2_AVAILABLE
 
+def is_single_writer():
+    """Check if SQLite writes are owned by the writer thread"""
+    return SQLITE_SINGLE_WRITER and not is_postgres()
+
+# Group-commit ingestion (ORDER_INGEST_MODE=group) batches checkout bursts into
+# fewer transactions; each client still waits for its own durable commit
+ORDER_INGEST_MODE = os.environ.get('ORDER_INGEST_MODE', 'direct')
+order_writer = GroupCommitWriter(
+    get_write_connection, lambda cursor, job: job(cursor), is_postgres(),
+    max_batch=int(os.environ.get('ORDER_GROUP_MAX_BATCH', 32)),
+    max_wait_ms=float(os.environ.get('ORDER_GROUP_MAX_WAIT_MS', 5))
+)
+
+def run_write(job, group=False):
+    """
+    Run job(cursor) in a committed write transaction and return its result
+    
+    Uses the single SQLite writer when enabled, the group-commit writer when
+    group is True, and otherwise a connection of its own.
+    """
+    if is_single_writer():
+        return get_sqlite_backend().write(job)
+    if group:
+        return order_writer.submit(job)
+    
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    try:
+        result = job(cursor)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# Concurrent delivery quotes are predicted together in small batches
+prediction_coalescer = PredictionCoalescer(
+    os.path.join(ML_DIR, 'models'),
+    max_wait_ms=float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 2)),
+    max_batch=int(os.environ.get('PREDICT_MAX_BATCH', 64))
+)
+
+# SHADOW_MODEL_DIR scores a candidate model on live quotes in the background
+shadow_evaluator = ShadowEvaluator(os.environ['SHADOW_MODEL_DIR']) if os.environ.get('SHADOW_MODEL_DIR') else None
+
+# Rolling accuracy of quotes against actual deliveries and per-municipality
+# feature drift (GET /api/python/predict-delivery/monitor)
+accuracy_monitor = prediction_monitor.PredictionMonitor(run_write, is_postgres(), os.path.join(ML_DIR, 'models'))
+
+# Order status events for /api/python/orders/events. With several workers on
+# PostgreSQL, ORDER_EVENTS_PG_BRIDGE=1 sends them through LISTEN/NOTIFY so every
+# worker's subscribers see every change
+order_event_bus = order_events.OrderEventBus()
+ORDER_EVENTS_PG_BRIDGE = os.environ.get('ORDER_EVENTS_PG_BRIDGE') == '1' and is_postgres()
+order_events_bridge = (order_events.PostgresNotifyBridge(get_write_connection, order_event_bus)
+                       if ORDER_EVENTS_PG_BRIDGE else None)
+
+# Event table (ids for Last-Event-ID replay) is created on first use
+_order_events_ready = False
+
+def ensure_order_events():
+    """Create the order event table on first use"""
+    global _order_events_ready
+    if not _order_events_ready:
+        run_write(lambda cursor: order_events.ensure_schema(cursor, is_postgres()))
+        _order_events_ready = True
+
+def queue_order_event(cursor, event):
+    """
+    Record an order event from inside a write transaction
+    
+    Returns the event for publish_order_event() to send after the commit, or
+    None when pg_notify() will deliver it at commit time instead.
+    """
+    order_events.record(cursor, event, is_postgres())
+    if ORDER_EVENTS_PG_BRIDGE:
+        order_events.notify(cursor, event)
+        return None
+    return event
+
+def publish_order_event(event):
+    """Publish an event queued by queue_order_event() once its transaction has committed"""
+    if event is not None:
+        order_event_bus.publish(event)
+
+# Delivery slot scheduler (index is loaded from the database on first use and
+# reloaded every DELIVERY_SLOT_REFRESH_SECONDS so other workers' bookings show up)
+slot_scheduler = DeliverySlotScheduler()
+_slot_schema_ready = False
+_slot_scheduler_lock = threading.Lock()
+
+def get_slot_scheduler():
+    """
+    Get the delivery slot scheduler, creating its tables on first use
+    
+    When the index is stale, reservations of orders cancelled by the PHP
+    pages are released first, then the index is reloaded.
+    """
+    global _slot_schema_ready
+    if not _slot_schema_ready:
+        run_write(lambda cursor: ensure_slot_schema(cursor, is_postgres()))
+        _slot_schema_ready = True
+    if slot_scheduler.needs_load():
+        with _slot_scheduler_lock:
+            if slot_scheduler.needs_load():
+                run_write(lambda cursor: slot_scheduler.release_cancelled(cursor, is_postgres()))
+                conn = get_db_connection()
+                slot_scheduler.load(conn.cursor(), is_postgres())
+                conn.close()
+    return slot_scheduler
+
+# Dashboard rollup table is created on first use
+_rollups_ready = False
+
+def ensure_rollups():
+    """Create the order rollup table on first use"""
+    global _rollups_ready
+    if not _rollups_ready:
+        run_write(lambda cursor: rollups.ensure_schema(cursor, is_postgres()))
+        _rollups_ready = True
+
+# The PHP pages change orders without updating the rollups, so each worker
+# rebuilds them from the orders table when the dashboard is read and its last
+# rebuild is older than ROLLUPS_REBUILD_SECONDS (0 disables the rebuild)
+ROLLUPS_REBUILD_SECONDS = float(os.environ.get('ROLLUPS_REBUILD_SECONDS', 300))
+_rollups_rebuilt_at = None
+_rollups_rebuild_lock = threading.Lock()
+
+def refresh_rollups():
+    """Rebuild the order rollups if this worker's last rebuild is older than ROLLUPS_REBUILD_SECONDS"""
+    global _rollups_rebuilt_at
+    if ROLLUPS_REBUILD_SECONDS <= 0:
+        return
+    with _rollups_rebuild_lock:
+        if _rollups_rebuilt_at is None or time.monotonic() - _rollups_rebuilt_at >= ROLLUPS_REBUILD_SECONDS:
+            run_write(lambda cursor: rollups.rebuild(cursor, is_postgres()))
+            _rollups_rebuilt_at = time.monotonic()
+
+# Saved-address feature table is created on first use
+_address_features_ready = False
+
+def ensure_address_features():
+    """Create the address feature table on first use"""
+    global _address_features_ready
+    if not _address_features_ready:
+        run_write(lambda cursor: address_features.ensure_schema(cursor, is_postgres()))
+        _address_features_ready = True
+
+# Quote table for the prediction monitor is created on first use
+_prediction_quotes_ready = False
+
+def ensure_prediction_quotes():
+    """Create the prediction quote table on first use"""
+    global _prediction_quotes_ready
+    if not _prediction_quotes_ready:
+        run_write(lambda cursor: prediction_monitor.ensure_schema(cursor, is_postgres()))
+        _prediction_quotes_ready = True
+
 @app.route('/api/python/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -118,67 +329,214 @@ def get_orders():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def write_order(cursor, order):
+    """
+    Insert an order, its items, rollups and slot reservation using the caller's transaction
+    
+    Returns:
+        Dictionary with 'order_id', 'reservation' (confirm it after commit) and
+        'event' (pass it to publish_order_event() after commit)
+    """
+    user_id = order['user_id']
+    items = order['items']
+    delivery_date = order.get('delivery_date')
+    delivery_time = order.get('delivery_time')
+    delivery_address = order.get('delivery_address')
+    payment_method = order.get('payment_method', 'COD')
+    window = order.get('window')
+    
+    # Calculate total
+    total = sum(item['price'] * item['quantity'] for item in items)
+    
+    if is_postgres() and PSYCOPG2_AVAILABLE:
+        cursor.execute("""
+            INSERT INTO orders (user_id, delivery_date, delivery_time, delivery_address, 
+                              total_amount, payment_method, status)
+            VALUES (%s, %s, %s, %s, %s, %s, 'pending')
+            RETURNING id
+        """, (user_id, delivery_date, delivery_time, delivery_address, total, payment_method))
+        order_id = cursor.fetchone()[0]
+        
+        # Insert order items
+        for item in items:
+            cursor.execute("""
+                INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (order_id, item['name'], item['price'], item['quantity'], item['price'] * item['quantity']))
+    else:
+        cursor.execute("""
+            INSERT INTO orders (user_id, delivery_date, delivery_time, delivery_address, 
+                              total_amount, payment_method, status)
+            VALUES (?, ?, ?, ?, ?, ?, 'pending')
+        """, (user_id, delivery_date, delivery_time, delivery_address, total, payment_method))
+        order_id = cursor.lastrowid
+        
+        # Insert order items
+        for item in items:
+            cursor.execute("""
+                INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+                VALUES (?, ?, ?, ?, ?)
+            """, (order_id, item['name'], item['price'], item['quantity'], item['price'] * item['quantity']))
+    
+    # Count the order in the dashboard rollups in the same transaction
+    rollups.record_order_created(cursor, order_id, is_postgres())
+    
+    # Precompute prediction features for the delivery address so later quotes can reuse them
+    address = address_features.parse_address(delivery_address)
+    if address is not None:
+        address_features.upsert_address_features(cursor, address, is_postgres())
+    
+    # Keep the quoted delivery time so the prediction monitor can score it once delivered
+    if order.get('delivery_time_minutes') is not None:
+        prediction_monitor.record_quote(cursor, order_id, order['delivery_time_minutes'], address,
+                                        sum(int(item['quantity']) for item in items), is_postgres())
+    
+    # Reserve delivery capacity in the same transaction as the order
+    reservation = None
+    if window is not None:
+        reservation = slot_scheduler.reserve(cursor, order_id, order['delivery_time_minutes'],
+                                             window['slot_date'], order['hub_id'], is_postgres())
+        if reservation is None:
+            raise NoDeliveryCapacity('No delivery capacity available')
+        
+        # Orders without a requested date are delivered on the reserved day
+        if not delivery_date:
+            if is_postgres():
+                cursor.execute("UPDATE orders SET delivery_date = %s WHERE id = %s",
+                               (reservation['slot_date'], order_id))
+            else:
+                cursor.execute("UPDATE orders SET delivery_date = ? WHERE id = ?",
+                               (reservation['slot_date'], order_id))
+    
+    event = queue_order_event(cursor, order_events.make_event(order_id, user_id, 'pending'))
+    return {'order_id': order_id, 'reservation': reservation, 'event': event}
+
 @app.route('/api/python/orders', methods=['POST'])
 def create_order():
     """Create a new order"""
     try:
         data = request.get_json()
-        user_id = data.get('user_id')
-        items = data.get('items', [])
-        delivery_date = data.get('delivery_date')
-        delivery_time = data.get('delivery_time')
-        delivery_address = data.get('delivery_address')
-        payment_method = data.get('payment_method', 'COD')
+        order = {
+            'user_id': data.get('user_id'),
+            'items': data.get('items', []),
+            'delivery_date': data.get('delivery_date'),
+            'delivery_time': data.get('delivery_time'),
+            'delivery_address': data.get('delivery_address'),
+            'payment_method': data.get('payment_method', 'COD'),
+            'delivery_time_minutes': data.get('delivery_time_minutes'),
+            'hub_id': data.get('hub_id', DEFAULT_HUB_ID),
+            'window': None
+        }
         
-        if not user_id or not items:
+        if not order['user_id'] or not order['items']:
             return jsonify({'success': False, 'message': 'user_id and items are required'}), 400
         
-        # Calculate total
-        total = sum(item['price'] * item['quantity'] for item in items)
+        # Find the earliest day with delivery capacity before touching the database
+        if order['delivery_time_minutes'] is not None:
+            try:
+                minutes = float(order['delivery_time_minutes'])
+            except (TypeError, ValueError):
+                minutes = float('nan')
+            if not (math.isfinite(minutes) and minutes > 0):
+                return jsonify({'success': False, 'message': 'delivery_time_minutes must be a positive number'}), 400
+            order['delivery_time_minutes'] = minutes
+            order['window'] = get_slot_scheduler().earliest_window(order['delivery_time_minutes'], order['hub_id'])
+            if order['window'] is None:
+                return jsonify({'success': False, 'message': 'No delivery capacity available'}), 409
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        ensure_rollups()
+        ensure_address_features()
+        ensure_order_events()
+        if order['delivery_time_minutes'] is not None:
+            ensure_prediction_quotes()
         
-        if is_postgres() and PSYCOPG2_AVAILABLE:
-            cursor.execute("""
-                INSERT INTO orders (user_id, delivery_date, delivery_time, delivery_address, 
-                                  total_amount, payment_method, status)
-                VALUES (%s, %s, %s, %s, %s, %s, 'pending')
-                RETURNING id
-            """, (user_id, delivery_date, delivery_time, delivery_address, total, payment_method))
-            order_id = cursor.fetchone()[0]
-            
-            # Insert order items
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (order_id, item['name'], item['price'], item['quantity'], item['price'] * item['quantity']))
-        else:
-            cursor.execute("""
-                INSERT INTO orders (user_id, delivery_date, delivery_time, delivery_address, 
-                                  total_amount, payment_method, status)
-                VALUES (?, ?, ?, ?, ?, ?, 'pending')
-            """, (user_id, delivery_date, delivery_time, delivery_address, total, payment_method))
-            order_id = cursor.lastrowid
-            
-            # Insert order items
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (order_id, item['name'], item['price'], item['quantity'], item['price'] * item['quantity']))
+        try:
+            result = run_write(lambda cursor: write_order(cursor, order), group=ORDER_INGEST_MODE == 'group')
+        except NoDeliveryCapacity as e:
+            return jsonify({'success': False, 'message': str(e)}), 409
         
-        conn.commit()
-        conn.close()
+        reservation = result['reservation']
+        slot_scheduler.confirm(reservation)
+        publish_order_event(result['event'])
         
-        return jsonify({'success': True, 'order_id': order_id, 'message': 'Order created successfully'})
+        response = {'success': True, 'order_id': result['order_id'], 'message': 'Order created successfully'}
+        if reservation:
+            response['delivery_slot'] = reservation['slot_date']
+        return jsonify(response)
     
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/python/orders/export', methods=['GET'])
+def export_orders():
+    """Stream all orders matching the filters as NDJSON or CSV (for finance and ops reconciliation)"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in order_export.EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+    
+    filters = {
+        'date_from': request.args.get('date_from'),
+        'date_to': request.args.get('date_to'),
+        'statuses': [s.strip() for s in request.args.get('status', '').split(',') if s.strip()],
+        'municipality': request.args.get('municipality')
+    }
+    try:
+        for key in ('date_from', 'date_to'):
+            if filters[key]:
+                datetime.strptime(filters[key], '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'message': 'date_from and date_to must be YYYY-MM-DD'}), 400
+    
+    chunks = order_export.stream_export(get_db_connection, filters, export_format, is_postgres())
+    filename = f"orders-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return Response(chunks, mimetype=order_export.EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/python/orders/events', methods=['GET'])
+def stream_order_events():
+    """Stream order status changes as Server-Sent Events (one customer's orders with user_id, otherwise all)"""
+    user_id = request.args.get('user_id', type=int)
+    # EventSource sends Last-Event-ID when it reconnects; missed events are replayed
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Last-Event-ID must be an integer'}), 400
+    
+    if order_events_bridge is not None:
+        order_events_bridge.start()
+    ensure_order_events()
+    
+    def replay(last_event_id, user_id):
+        conn = get_db_connection()
+        try:
+            return order_events.load_since(conn.cursor(), last_event_id, user_id, is_postgres())
+        finally:
+            conn.close()
+    
+    return Response(order_events.stream(order_event_bus, user_id, last_event_id, replay), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/python/orders/events/stats', methods=['GET'])
+def get_order_event_stats():
+    """Get open event streams and published event counts for this worker"""
+    stats = order_event_bus.stats()
+    stats['pg_bridge'] = ORDER_EVENTS_PG_BRIDGE
+    return jsonify({'success': True, 'stats': stats})
+
+@app.route('/api/python/orders/ingest/stats', methods=['GET'])
+def get_order_ingest_stats():
+    """Get group-commit throughput and latency counters"""
+    if is_single_writer():
+        stats = get_sqlite_backend().writer.stats()
+        stats['mode'] = 'single_writer'
+    else:
+        stats = order_writer.stats()
+        stats['mode'] = ORDER_INGEST_MODE
+    return jsonify({'success': True, 'stats': stats})
+
 @app.route('/api/python/orders/<int:order_id>/status', methods=['PUT'])
-def update_order_status():
+def update_order_status(order_id):
     """Update order status"""
     try:
         data = request.get_json()
@@ -187,26 +545,243 @@ def update_order_status():
         if not status:
             return jsonify({'success': False, 'message': 'status is required'}), 400
         
+        ensure_rollups()
+        ensure_order_events()
+        scheduler = get_slot_scheduler()
+        
+        def apply_status(cursor):
+            # Move the order between rollup buckets before its status changes
+            # (this also locks the order, so the status read below can't go stale)
+            rollups.record_status_change(cursor, order_id, status, is_postgres())
+            
+            # Read the current status for the event before it changes
+            if is_postgres() and PSYCOPG2_AVAILABLE:
+                cursor.execute("SELECT user_id, status, payment_method FROM orders WHERE id = %s", (order_id,))
+            else:
+                cursor.execute("SELECT user_id, status, payment_method FROM orders WHERE id = ?", (order_id,))
+            row = cursor.fetchone()
+            event = None
+            if row is not None:
+                event = queue_order_event(cursor, order_events.make_event(order_id, row[0], status, row[1]))
+            
+            if is_postgres() and PSYCOPG2_AVAILABLE:
+                cursor.execute("""
+                    UPDATE orders 
+                    SET status = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                """, (status, order_id))
+            else:
+                cursor.execute("""
+                    UPDATE orders 
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (status, order_id))
+            
+            # Same history row as api/admin/update_order_status.php (the prediction monitor times deliveries from it)
+            if row is not None:
+                if is_postgres() and PSYCOPG2_AVAILABLE:
+                    cursor.execute("""
+                        INSERT INTO order_status_history (order_id, user_id, status, payment_method, created_at)
+                        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    """, (order_id, row[0], status, row[2]))
+                else:
+                    cursor.execute("""
+                        INSERT INTO order_status_history (order_id, user_id, status, payment_method, created_at)
+                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    """, (order_id, row[0], status, row[2]))
+            
+            # Cancelled orders give their delivery capacity back, and take it again if un-cancelled
+            released = reserved = None
+            if status == 'cancelled':
+                released = scheduler.release(cursor, order_id, is_postgres())
+            elif row is not None and row[1] == 'cancelled':
+                reserved = scheduler.reinstate(cursor, order_id, is_postgres())
+                if reserved is not None:
+                    # The original day may have filled up meanwhile
+                    if is_postgres() and PSYCOPG2_AVAILABLE:
+                        cursor.execute("UPDATE orders SET delivery_date = %s WHERE id = %s AND delivery_date < %s",
+                                       (reserved['slot_date'], order_id, reserved['slot_date']))
+                    else:
+                        cursor.execute("UPDATE orders SET delivery_date = ? WHERE id = ? AND delivery_date < ?",
+                                       (reserved['slot_date'], order_id, reserved['slot_date']))
+            return released, reserved, event
+        
+        try:
+            released, reserved, event = run_write(apply_status)
+        except NoDeliveryCapacity as e:
+            return jsonify({'success': False, 'message': str(e)}), 409
+        scheduler.confirm(released, released=True)
+        scheduler.confirm(reserved)
+        publish_order_event(event)
+        
+        return jsonify({'success': True, 'message': 'Order status updated'})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/users/<int:user_id>/delivery-address', methods=['PUT'])
+def update_delivery_address(user_id):
+    """Save a user's delivery address and precompute its prediction features"""
+    try:
+        address = address_features.parse_address(request.get_json())
+        if address is None:
+            return jsonify({'success': False, 'message': 'latitude and longitude are required'}), 400
+        
+        ensure_address_features()
+        
+        def save_address(cursor):
+            address['address_id'] = address_features.upsert_address_features(cursor, address, is_postgres())
+            if is_postgres() and PSYCOPG2_AVAILABLE:
+                cursor.execute("UPDATE users SET delivery_address = %s WHERE id = %s",
+                               (json.dumps(address), user_id))
+            else:
+                cursor.execute("UPDATE users SET delivery_address = ? WHERE id = ?",
+                               (json.dumps(address), user_id))
+            return cursor.rowcount
+        
+        if not run_write(save_address):
+            return jsonify({'success': False, 'message': 'User not found'}), 404
+        
+        return jsonify({'success': True, 'address_id': address['address_id'], 'delivery_address': address})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/predict-delivery', methods=['POST'])
+def predict_delivery():
+    """Predict delivery time, shipping fee and the earliest date range with delivery capacity"""
+    try:
+        data = request.get_json() or {}
+        now = datetime.now()
+        
+        if data.get('address_id') is not None:
+            # Saved address: distance and encodings were computed when it was saved
+            ensure_address_features()
+            conn = get_db_connection()
+            try:
+                order = address_features.get_address_features(conn.cursor(), int(data['address_id']), is_postgres())
+            finally:
+                conn.close()
+            if order is None:
+                return jsonify({'success': False, 'message': 'Address not found'}), 404
+        elif data.get('latitude') is None or data.get('longitude') is None:
+            return jsonify({'success': False, 'message': 'Latitude and longitude (or address_id) are required'}), 400
+        else:
+            order = {
+                'latitude': float(data['latitude']),
+                'longitude': float(data['longitude']),
+                'municipality': data.get('municipality', ''),
+                'barangay': data.get('barangay', ''),
+                'postal_code': data.get('postal_code', '')
+            }
+        
+        order['time_of_order'] = int(data.get('time_of_order', now.hour))
+        order['day_of_week'] = int(data.get('day_of_week', now.weekday()))
+        order['order_size'] = int(data.get('order_size', 1))
+        
+        # Latency for the shadow comparison is model time per row: the batch's model call
+        # divided by its size, leaving out the wait for the batch to fill
+        delivery_time_minutes, model_ms_per_row = prediction_coalescer.predict_timed(order)
+        if shadow_evaluator is not None:
+            shadow_evaluator.submit(order, delivery_time_minutes, model_ms_per_row)
+        accuracy_monitor.observe_quote(order, delivery_time_minutes)
+        
+        # Quote the earliest window the hub still has capacity for, like create_order() books
+        date_range_info = get_slot_scheduler().earliest_window(delivery_time_minutes,
+                                                               data.get('hub_id', DEFAULT_HUB_ID), now)
+        if date_range_info is None:
+            return jsonify({'success': False, 'message': 'No delivery capacity available'}), 409
+        
+        return jsonify({
+            'success': True,
+            'delivery_slot': date_range_info['slot_date'],
+            'delivery_time_minutes': delivery_time_minutes,
+            'shipping_fee': calculate_shipping_fee(delivery_time_minutes),
+            'delivery_time_hours': round(delivery_time_minutes / 60, 2),
+            'delivery_date_range': date_range_info['date_range'],
+            'delivery_start_date': date_range_info['start_date'],
+            'delivery_end_date': date_range_info['end_date'],
+            'delivery_start_date_formatted': date_range_info['start_date_formatted'],
+            'delivery_end_date_formatted': date_range_info['end_date_formatted']
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/predict-delivery/shadow', methods=['GET'])
+def get_shadow_stats():
+    """Get the running comparison between the primary and shadow models"""
+    if shadow_evaluator is None:
+        return jsonify({'success': False, 'message': 'Shadow evaluation is not enabled (set SHADOW_MODEL_DIR)'}), 404
+    return jsonify({'success': True, 'shadow': shadow_evaluator.stats()})
+
+@app.route('/api/python/predict-delivery/monitor', methods=['GET'])
+def get_prediction_monitor():
+    """Get rolling quote accuracy, per-municipality feature drift and the retraining alarm"""
+    try:
+        accuracy_monitor.sync()
+        return jsonify({'success': True, 'monitor': accuracy_monitor.stats()})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/delivery-slots/earliest', methods=['GET'])
+def get_earliest_delivery_slot():
+    """Get the earliest delivery window with capacity for a predicted delivery time"""
+    try:
+        delivery_time_minutes = request.args.get('delivery_time_minutes', type=float)
+        hub_id = request.args.get('hub_id', DEFAULT_HUB_ID)
+        if delivery_time_minutes is None:
+            return jsonify({'success': False, 'message': 'delivery_time_minutes is required'}), 400
+        
+        window = get_slot_scheduler().earliest_window(delivery_time_minutes, hub_id)
+        if window is None:
+            return jsonify({'success': False, 'message': 'No delivery capacity available'}), 409
+        
+        return jsonify({'success': True, 'window': window})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/admin/stats', methods=['GET'])
+def get_admin_stats():
+    """Get dashboard statistics from the order rollups"""
+    try:
+        days = request.args.get('days', 30, type=int)
+        
+        ensure_rollups()
+        refresh_rollups()
         conn = get_db_connection()
         cursor = conn.cursor()
+        stats = rollups.dashboard_stats(cursor, days, is_postgres())
+        conn.close()
         
-        if is_postgres() and PSYCOPG2_AVAILABLE:
-            cursor.execute("""
-                UPDATE orders 
-                SET status = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            """, (status, order_id))
-        else:
-            cursor.execute("""
-                UPDATE orders 
-                SET status = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (status, order_id))
+        return jsonify({'success': True, 'stats': stats})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/python/routes/plan', methods=['POST'])
+def plan_delivery_routes():
+    """Batch a day's pending orders into vehicle routes"""
+    try:
+        data = request.get_json() or {}
+        delivery_date = data.get('delivery_date')
+        vehicle_capacity = int(data.get('vehicle_capacity', DEFAULT_VEHICLE_CAPACITY))
+        shift_minutes = float(data.get('shift_minutes', DEFAULT_SHIFT_MINUTES))
         
-        conn.commit()
+        if not delivery_date:
+            return jsonify({'success': False, 'message': 'delivery_date is required'}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        stops, skipped = load_pending_stops(cursor, delivery_date, is_postgres())
         conn.close()
         
-        return jsonify({'success': True, 'message': 'Order status updated'})
+        plan = plan_routes(stops, vehicle_capacity, shift_minutes)
+        plan['skipped_order_ids'] = skipped
+        
+        return jsonify({'success': True, 'plan': plan})
     
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
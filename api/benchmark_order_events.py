@@ -0,0 +1,185 @@
+"""
+Benchmark for order status event streams
+Holds many idle Server-Sent Events connections open and measures server memory per connection and fan-out latency
+
+The API runs in a child process so its RSS is measured on its own; the
+streams are plain sockets multiplexed by one selector in this process.
+
+Usage:
+    python api/benchmark_order_events.py [connections] [updates]    (default: 1000 50)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import selectors
+import sqlite3
+import tempfile
+import statistics
+import multiprocessing
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONNECTIONS = 1000
+DEFAULT_UPDATES = 50
+
+# Streams are spread over this many customers, plus a few admin (all orders) streams
+USERS = 200
+ADMIN_STREAMS = 5
+
+
+def rss_mb(pid):
+    """Resident set size of a process (Linux)"""
+    with open(f'/proc/{pid}/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def serve(path, urls):
+    """Child process: serve the API against the benchmark database"""
+    os.environ['DATABASE_PATH'] = path
+    from load_test import start_local_server
+    urls.put(start_local_server())
+    while True:
+        time.sleep(3600)
+
+
+def request_json(base_url, method, path, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+class StreamClients:
+    """Idle event-stream connections read by a single selector"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+
+    def open(self, path):
+        sock = socket.create_connection((self.host, self.port))
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.buffers[sock] = b''
+
+    def poll(self, timeout):
+        """
+        Read whatever has arrived
+
+        Returns:
+            List of (receive time, order id) for each status event received
+        """
+        received = []
+        for key, _ in self.selector.select(timeout):
+            chunk = key.fileobj.recv(65536)
+            now = time.perf_counter()
+            buffer = self.buffers[key.fileobj] + chunk
+            *frames, self.buffers[key.fileobj] = buffer.split(b'\n\n')
+            for frame in frames:
+                for line in frame.split(b'\n'):
+                    if line.startswith(b'data: '):
+                        received.append((now, json.loads(line[6:])['order_id']))
+        return received
+
+    def close(self):
+        for sock in list(self.buffers):
+            self.selector.unregister(sock)
+            sock.close()
+        self.buffers.clear()
+
+
+def run_benchmark(connections, updates):
+    path = os.path.join(tempfile.mkdtemp(prefix='aquasphere-events-'), 'events.db')
+    conn = sqlite3.connect(path)
+    from load_test import create_schema
+    create_schema(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    context = multiprocessing.get_context('spawn')
+    urls = context.Queue()
+    server = context.Process(target=serve, args=(path, urls), daemon=True)
+    server.start()
+    base_url = urls.get(timeout=60)
+    host, port = base_url.rsplit('//', 1)[1].split(':')
+
+    print("=" * 72)
+    print(f"Order Event Stream Benchmark ({connections} idle connections, {updates} status updates)")
+    print("=" * 72)
+
+    # One order per customer to update later
+    order_ids = {}
+    for user_id in range(1, USERS + 1):
+        result = request_json(base_url, 'POST', '/api/python/orders',
+                              {'user_id': user_id, 'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 1}]})
+        order_ids[user_id] = result['order_id']
+    request_json(base_url, 'GET', '/api/python/orders/events/stats')
+    time.sleep(0.5)
+    baseline = rss_mb(server.pid)
+
+    clients = StreamClients(host, int(port))
+    started = time.perf_counter()
+    for n in range(connections):
+        clients.open('/api/python/orders/events' if n < ADMIN_STREAMS
+                     else f'/api/python/orders/events?user_id={n % USERS + 1}')
+    while request_json(base_url, 'GET', '/api/python/orders/events/stats')['stats']['subscribers'] < connections:
+        clients.poll(0.1)
+    open_seconds = time.perf_counter() - started
+    time.sleep(1.0)
+    clients.poll(0)
+    held = rss_mb(server.pid)
+    threads = len(os.listdir(f'/proc/{server.pid}/task'))
+
+    print(f"Opened {connections} streams in {open_seconds:.2f}s ({threads} server threads)")
+    print(f"Server RSS: {baseline:.1f} MB idle -> {held:.1f} MB with streams open "
+          f"({(held - baseline) * 1024 / connections:.1f} KB per connection)")
+
+    # Each update reaches its customer's streams plus the admin streams
+    streams_per_user = {}
+    for n in range(ADMIN_STREAMS, connections):
+        streams_per_user[n % USERS + 1] = streams_per_user.get(n % USERS + 1, 0) + 1
+
+    latencies = []
+    delivered = 0
+    expected_total = 0
+    statuses = ['processing', 'out_for_delivery']
+    for n in range(updates):
+        user_id = n % USERS + 1
+        expected = ADMIN_STREAMS + streams_per_user.get(user_id, 0)
+        expected_total += expected
+        sent = time.perf_counter()
+        request_json(base_url, 'PUT', f'/api/python/orders/{order_ids[user_id]}/status',
+                     {'status': statuses[n % 2]})
+        got = 0
+        deadline = sent + 5.0
+        while got < expected and time.perf_counter() < deadline:
+            for received_at, order_id in clients.poll(0.05):
+                if order_id == order_ids[user_id]:
+                    got += 1
+                    latencies.append((received_at - sent) * 1000)
+        delivered += got
+
+    clients.close()
+    server.terminate()
+
+    latencies.sort()
+    print(f"Delivered {delivered} of {expected_total} expected events to streams")
+    if latencies:
+        print(f"Update -> stream latency: p50 {statistics.median(latencies):.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, max {latencies[-1]:.1f} ms "
+              "(includes the status update request itself)")
+    print("=" * 72)
+
+
+if __name__ == '__main__':
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CONNECTIONS
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_UPDATES
+    run_benchmark(connections, updates)
@@ -0,0 +1,139 @@
+"""
+Benchmark for group-commit order ingestion
+Compares per-order commits with group commits on a scratch SQLite database
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='aquasphere-ingest-'), 'bench.db')
+os.environ['DATABASE_PATH'] = DB_PATH
+os.environ.pop('DATABASE_URL', None)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app
+from order_ingest import GroupCommitWriter
+
+THREADS = 32
+ORDERS_PER_THREAD = 50
+
+# (max_batch, max_wait_ms) settings to compare
+GROUP_SETTINGS = [(8, 1.0), (32, 2.0), (64, 5.0)]
+
+
+def create_schema():
+    """Create the order tables the PHP side normally creates"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivery_date DATE,
+            delivery_time TIME,
+            delivery_address TEXT,
+            total_amount DECIMAL(10,2) NOT NULL,
+            payment_method TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            product_price DECIMAL(10,2) NOT NULL,
+            quantity INTEGER NOT NULL,
+            subtotal DECIMAL(10,2) NOT NULL
+        );
+    """)
+    conn.close()
+    app.ensure_rollups()
+
+
+def sample_order(i):
+    return {
+        'user_id': i % 100 + 1,
+        'items': [{'name': '5 Gallon Refill', 'price': 35.0, 'quantity': i % 5 + 1}],
+        'delivery_address': '{"city": "Calauan"}',
+        'payment_method': 'COD',
+        'window': None
+    }
+
+
+def direct_submit(order):
+    """One connection and one commit per order (the default mode)"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        result = app.write_order(conn.cursor(), order)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+
+def run(submit):
+    """Drive submit() from THREADS threads and collect latencies"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(t):
+        for n in range(ORDERS_PER_THREAD):
+            started = time.perf_counter()
+            try:
+                submit(sample_order(t * ORDERS_PER_THREAD + n))
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return len(latencies) / wall, pct(0.50), pct(0.99), len(errors)
+
+
+def run_benchmark():
+    create_schema()
+    total = THREADS * ORDERS_PER_THREAD
+
+    print("=" * 72)
+    print(f"Order Ingestion Benchmark ({THREADS} threads x {ORDERS_PER_THREAD} orders, SQLite)")
+    print("=" * 72)
+    print(f"{'mode':<24} {'orders/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'avg batch':>10}")
+
+    throughput, p50, p99, errors = run(direct_submit)
+    print(f"{'direct':<24} {throughput:>10.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7} {1.0:>10.1f}")
+
+    for max_batch, max_wait_ms in GROUP_SETTINGS:
+        writer = GroupCommitWriter(lambda: sqlite3.connect(DB_PATH), app.write_order,
+                                   max_batch=max_batch, max_wait_ms=max_wait_ms)
+        throughput, p50, p99, errors = run(writer.submit)
+        label = f"group N={max_batch} T={max_wait_ms}ms"
+        print(f"{label:<24} {throughput:>10.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7} {writer.stats()['avg_batch_size']:>10.1f}")
+
+    conn = sqlite3.connect(DB_PATH)
+    count = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    conn.close()
+    print(f"\n{count} orders written ({total} per mode)")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,115 @@
+"""
+Benchmark for the response encoding layer
+Compares encode time and bytes on the wire for typical and large order histories
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import random
+from decimal import Decimal
+from datetime import datetime, timedelta, time as dtime
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import response_encoding
+from response_encoding import FastJSONProvider, compress, BROTLI_AVAILABLE, ORJSON_AVAILABLE
+from load_test import random_address, random_items
+
+# (label, orders in the history)
+HISTORIES = [('typical', 25), ('large', 5000)]
+
+ENCODE_REPEATS = 20
+
+
+def make_history(orders, rng):
+    """An order history shaped like GET /api/python/orders rows from RealDictCursor on PostgreSQL"""
+    address = json.dumps(random_address(rng))
+    now = datetime(2026, 10, 1, 9, 30)
+    history = []
+    for n in range(orders):
+        items = random_items(rng)
+        order_date = now - timedelta(hours=n * 7)
+        history.append({
+            'id': 100000 + n,
+            'user_id': 42,
+            'order_date': order_date,
+            'delivery_date': (order_date + timedelta(days=1)).date(),
+            'delivery_time': dtime(rng.randint(8, 17), 0),
+            'delivery_address': address,
+            'total_amount': Decimal(f"{sum(i['price'] * i['quantity'] for i in items):.2f}"),
+            'payment_method': rng.choice(['COD', 'GCash']),
+            'status': rng.choice(['delivered', 'delivered', 'delivered', 'cancelled', 'pending']),
+            'created_at': order_date,
+            'updated_at': order_date + timedelta(hours=3),
+            'items': [{'product_name': i['name'], 'quantity': i['quantity'], 'price': Decimal(f"{i['price']:.2f}")}
+                      for i in items]
+        })
+    return {'success': True, 'orders': history}
+
+
+def time_call(func, repeats=ENCODE_REPEATS):
+    """Best-of-N wall time in milliseconds, and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def run_benchmark():
+    app = Flask(__name__)
+    encoders = [('flask jsonify (stdlib)', DefaultJSONProvider(app))]
+    if ORJSON_AVAILABLE:
+        encoders.append(('fast (orjson)', FastJSONProvider(app)))
+    encoders.append(('fast (stdlib fallback)', None))
+
+    print("=" * 80)
+    print("Response Encoding Benchmark")
+    print("=" * 80)
+
+    rng = random.Random(3)
+    for label, orders in HISTORIES:
+        history = make_history(orders, rng)
+        # Flask's default provider can't encode datetime.time (TIME columns), so
+        # its run gets delivery_time pre-converted outside the timed region
+        stdlib_history = {'success': True,
+                          'orders': [dict(order, delivery_time=str(order['delivery_time'])) for order in history['orders']]}
+        print(f"\n{label} history ({orders} orders)")
+        print(f"  {'encoder':<26} {'encode ms':>10} {'bytes':>10}")
+
+        body = None
+        with app.app_context():
+            for name, provider in encoders:
+                if provider is None:
+                    # Same provider with orjson switched off
+                    orjson_available = response_encoding.ORJSON_AVAILABLE
+                    response_encoding.ORJSON_AVAILABLE = False
+                    ms, response = time_call(lambda: FastJSONProvider(app).response(history))
+                    response_encoding.ORJSON_AVAILABLE = orjson_available
+                else:
+                    payload = stdlib_history if isinstance(provider, DefaultJSONProvider) else history
+                    ms, response = time_call(lambda: provider.response(payload))
+                data = response.get_data()
+                body = data
+                print(f"  {name:<26} {ms:>10.3f} {len(data):>10}")
+
+        print(f"  {'compression':<26} {'ms':>10} {'bytes':>10} {'ratio':>8}")
+        print(f"  {'identity':<26} {0.0:>10.3f} {len(body):>10} {1.0:>8.2f}")
+        encodings = [('gzip', 'gzip')] + ([('br', 'brotli')] if BROTLI_AVAILABLE else [])
+        for encoding, name in encodings:
+            ms, compressed = time_call(lambda: compress(body, encoding), repeats=5)
+            print(f"  {name:<26} {ms:>10.3f} {len(compressed):>10} {len(body) / len(compressed):>8.2f}")
+        ms, compressed = time_call(lambda: gzip.compress(body, compresslevel=9), repeats=5)
+        print(f"  {'gzip -9 (for reference)':<26} {ms:>10.3f} {len(compressed):>10} {len(body) / len(compressed):>8.2f}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
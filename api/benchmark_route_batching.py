@@ -0,0 +1,77 @@
+"""
+Benchmark for the route batching engine
+Plans routes for synthetic Laguna orders at 100, 1k and 5k stops
+
+Stops are loaded from a SQLite orders table through load_pending_stops, so
+the timing includes the delivery time predictions the planner depends on.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from route_batching import plan_routes, haversine_matrix, load_pending_stops
+from load_test import create_schema, random_address
+
+SIZES = [100, 1000, 5000]
+DELIVERY_DATE = '2026-03-02'
+
+
+def seed_orders(num_stops, seed=42):
+    """Create an in-memory database with num_stops pending orders for DELIVERY_DATE"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    create_schema(cursor)
+    for i in range(num_stops):
+        order_size = rng.randint(1, 50)
+        cursor.execute("""
+            INSERT INTO orders (id, user_id, delivery_date, delivery_address, total_amount, status)
+            VALUES (?, ?, ?, ?, ?, 'pending')
+        """, (i + 1, i % 500 + 1, DELIVERY_DATE, json.dumps(random_address(rng)), 35.0 * order_size))
+        cursor.execute("""
+            INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+            VALUES (?, 'Round Gallon', 35, ?, ?)
+        """, (i + 1, order_size, 35.0 * order_size))
+    conn.commit()
+    return conn
+
+
+def run_benchmark():
+    """Time loading the stops, the distance matrix and the full plan for each size"""
+    print("=" * 60)
+    print("Route Batching Benchmark")
+    print("=" * 60)
+    print(f"{'stops':>6} {'load (s)':>9} {'matrix (s)':>11} {'plan (s)':>9} {'vehicles':>9} {'km':>10}")
+
+    for size in SIZES:
+        conn = seed_orders(size)
+
+        start = time.perf_counter()
+        stops, skipped = load_pending_stops(conn.cursor(), DELIVERY_DATE)
+        load_seconds = time.perf_counter() - start
+        conn.close()
+        assert len(stops) == size and not skipped, f"expected {size} stops loaded, got {len(stops)}"
+
+        start = time.perf_counter()
+        haversine_matrix([s['latitude'] for s in stops], [s['longitude'] for s in stops])
+        matrix_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plan = plan_routes(stops)
+        plan_seconds = time.perf_counter() - start
+
+        assigned = sum(len(r['order_ids']) for r in plan['routes'])
+        assert assigned == size, f"expected {size} stops routed, got {assigned}"
+
+        print(f"{size:>6} {load_seconds:>9.3f} {matrix_seconds:>11.3f} {plan_seconds:>9.3f} "
+              f"{plan['vehicles']:>9} {plan['total_distance_km']:>10.1f}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,213 @@
+"""
+Concurrency test for the SQLite backend profiles
+Drives mixed reads and writes from many threads and reports throughput and lock errors
+
+Each profile runs once in a single process and once split across several
+worker processes, the way a multi-worker deployment shares one database
+file: each process then has its own writer thread and they contend on the
+SQLite write lock.
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sqlite_backend import SingleWriterBackend
+
+THREADS = 32
+OPS_PER_THREAD = 200
+WRITE_RATIO = 0.2
+SEED_ORDERS = 5000
+PROCESSES = 4
+
+
+def create_database(path):
+    """Create and seed the order tables the PHP side normally creates"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_amount DECIMAL(10,2) NOT NULL,
+            status TEXT DEFAULT 'pending'
+        );
+        CREATE TABLE order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            product_price DECIMAL(10,2) NOT NULL,
+            quantity INTEGER NOT NULL,
+            subtotal DECIMAL(10,2) NOT NULL
+        );
+        CREATE INDEX idx_orders_user_id ON orders(user_id);
+        CREATE INDEX idx_order_items_order_id ON order_items(order_id);
+    """)
+    rng = random.Random(7)
+    for _ in range(SEED_ORDERS):
+        cursor = conn.execute("INSERT INTO orders (user_id, total_amount) VALUES (?, ?)",
+                              (rng.randint(1, 500), 35.0))
+        conn.execute("""
+            INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+            VALUES (?, '5 Gallon Refill', 35.0, 1, 35.0)
+        """, (cursor.lastrowid,))
+    conn.commit()
+    conn.close()
+
+
+def read_orders(cursor, user_id):
+    cursor.execute("""
+        SELECT o.id, o.total_amount, o.status, COUNT(oi.id)
+        FROM orders o
+        LEFT JOIN order_items oi ON o.id = oi.order_id
+        WHERE o.user_id = ?
+        GROUP BY o.id
+    """, (user_id,))
+    return cursor.fetchall()
+
+
+def write_order(cursor, user_id):
+    cursor.execute("INSERT INTO orders (user_id, total_amount) VALUES (?, ?)", (user_id, 70.0))
+    order_id = cursor.lastrowid
+    cursor.execute("""
+        INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+        VALUES (?, '5 Gallon Refill', 35.0, 2, 70.0)
+    """, (order_id,))
+    return order_id
+
+
+def legacy_profile(path):
+    """What get_db_connection() did before: a fresh default connection per request"""
+
+    def read(user_id):
+        conn = sqlite3.connect(path)
+        try:
+            return read_orders(conn.cursor(), user_id)
+        finally:
+            conn.close()
+
+    def write(user_id):
+        conn = sqlite3.connect(path)
+        try:
+            result = write_order(conn.cursor(), user_id)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+
+    return read, write
+
+
+def single_writer_profile(path):
+    """WAL + pooled read-only connections + one writer thread"""
+    backend = SingleWriterBackend(path)
+
+    def read(user_id):
+        conn = backend.read_connection()
+        try:
+            return read_orders(conn.cursor(), user_id)
+        finally:
+            conn.close()
+
+    def write(user_id):
+        return backend.write(lambda cursor: write_order(cursor, user_id))
+
+    return read, write
+
+
+PROFILES = {'legacy': legacy_profile, 'single_writer': single_writer_profile}
+
+
+def run_threads(path, profile, threads, first_seed, go=None):
+    """Run worker threads against one profile in this process and return their op counts"""
+    read, write = PROFILES[profile](path)
+
+    counts = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'other_errors': 0}
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(OPS_PER_THREAD):
+            is_write = rng.random() < WRITE_RATIO
+            try:
+                if is_write:
+                    write(rng.randint(1, 500))
+                else:
+                    read(rng.randint(1, 500))
+                key = 'writes' if is_write else 'reads'
+            except sqlite3.OperationalError as e:
+                key = 'lock_errors' if 'locked' in str(e) or 'busy' in str(e) else 'other_errors'
+            except Exception:
+                key = 'other_errors'
+            with lock:
+                counts[key] += 1
+
+    workers = [threading.Thread(target=worker, args=(first_seed + t,)) for t in range(threads)]
+    if go is not None:
+        go.wait()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return counts
+
+
+def _worker_process(path, profile, threads, first_seed, ready, go, results):
+    """Child process: set the profile up, wait for the start signal, report the counts"""
+    ready.put(True)
+    results.put(run_threads(path, profile, threads, first_seed, go))
+
+
+def run_profile(profile, processes=1):
+    path = os.path.join(tempfile.mkdtemp(prefix='aquasphere-sqlite-'), 'bench.db')
+    create_database(path)
+
+    if processes == 1:
+        started = time.perf_counter()
+        counts = run_threads(path, profile, THREADS, 0)
+    else:
+        # Spawned workers start from a clean interpreter, like separate server workers
+        context = multiprocessing.get_context('spawn')
+        ready, results, go = context.Queue(), context.Queue(), context.Event()
+        per_process = THREADS // processes
+        children = [context.Process(target=_worker_process,
+                                    args=(path, profile, per_process, n * per_process, ready, go, results))
+                    for n in range(processes)]
+        for child in children:
+            child.start()
+        for _ in children:
+            ready.get(timeout=60)
+        started = time.perf_counter()
+        go.set()
+        counts = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'other_errors': 0}
+        for _ in children:
+            for key, value in results.get().items():
+                counts[key] += value
+        for child in children:
+            child.join()
+    wall = time.perf_counter() - started
+
+    ok = counts['reads'] + counts['writes']
+    print(f"{profile:<14} {processes:>5} {ok / wall:>9.1f} {counts['reads']:>7} {counts['writes']:>7} "
+          f"{counts['lock_errors']:>12} {counts['other_errors']:>7} {wall:>8.2f}")
+
+
+def run_concurrency_test():
+    print("=" * 78)
+    print(f"SQLite Concurrency Test ({THREADS} threads x {OPS_PER_THREAD} ops, "
+          f"{int(WRITE_RATIO * 100)}% writes)")
+    print("=" * 78)
+    print(f"{'profile':<14} {'procs':>5} {'ops/s':>9} {'reads':>7} {'writes':>7} {'lock errors':>12} {'other':>7} {'wall s':>8}")
+    for profile in PROFILES:
+        run_profile(profile)
+        run_profile(profile, PROCESSES)
+
+
+if __name__ == '__main__':
+    run_concurrency_test()
@@ -0,0 +1,89 @@
+"""
+Shared Test Setup for the AquaSphere API
+Temporary database with every table the API touches
+
+app.py creates its tables lazily behind process-wide flags, so once one test
+has created a table, later tests in the same process (each on a fresh
+database) skip creating it. Every test that goes through the API therefore
+starts from api_database(), which creates all of them; add new tables to
+API_TABLES instead of to each test.
+
+The test scripts also run on their own (python api/test_*.py); their
+__main__ blocks use api_database() directly.
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import contextlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rollups
+import delivery_slots
+import address_features
+import prediction_monitor
+import order_events
+from load_test import create_schema
+
+# Everything the API reads or writes, in creation order
+API_TABLES = (
+    create_schema,
+    delivery_slots.ensure_schema,
+    rollups.ensure_schema,
+    address_features.ensure_schema,
+    prediction_monitor.ensure_schema,
+    order_events.ensure_schema
+)
+
+
+@contextlib.contextmanager
+def api_database(prefix='aquasphere-test-'):
+    """
+    Temporary SQLite database with every API table, used as DATABASE_PATH until exit
+
+    DATABASE_PATH is restored afterwards, and an already imported app reloads
+    its delivery slot index, rebuilds its rollups and empties its accuracy
+    monitor window, so no state leaks into the next test.
+
+    Yields:
+        (path, connection)
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix=prefix), 'aquasphere.db')
+    conn = sqlite3.connect(path)
+    for ensure in API_TABLES:
+        ensure(conn.cursor())
+    conn.commit()
+
+    previous = os.environ.get('DATABASE_PATH')
+    os.environ['DATABASE_PATH'] = path
+    _reset_app()
+    try:
+        yield path, conn
+    finally:
+        conn.close()
+        if previous is None:
+            os.environ.pop('DATABASE_PATH', None)
+        else:
+            os.environ['DATABASE_PATH'] = previous
+        _reset_app()
+
+
+def _reset_app():
+    """Make an imported app reload its per-database state on next use"""
+    app = sys.modules.get('app')
+    if app is not None:
+        app.slot_scheduler.loaded_at = None
+        app._rollups_rebuilt_at = None
+        with app.accuracy_monitor._lock:
+            app.accuracy_monitor._reset(app.accuracy_monitor.model_version)
+
+
+@pytest.fixture
+def api_db():
+    """pytest fixture for api_database()"""
+    with api_database() as db:
+        yield db
@@ -466,6 +466,88 @@ function init_db() {
         @execute_sql($conn, "ALTER TABLE products ADD COLUMN image_url TEXT");
     }
     
+    // Tables maintained by the Python API (api/app.py also creates them on first use)
+    $python_api_tables = [
+        'address_features' => "
+        CREATE TABLE IF NOT EXISTS address_features (
+            id " . get_id_type() . ",
+            address_key TEXT UNIQUE NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            municipality TEXT,
+            barangay TEXT,
+            postal_code TEXT,
+            distance_km REAL NOT NULL,
+            municipality_encoded " . get_integer_type() . ",
+            barangay_encoded " . get_integer_type() . ",
+            postal_code_encoded " . get_integer_type() . ",
+            model_version TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ",
+        'delivery_slot_capacity' => "
+        CREATE TABLE IF NOT EXISTS delivery_slot_capacity (
+            hub_id TEXT NOT NULL,
+            slot_date DATE NOT NULL,
+            capacity_minutes REAL NOT NULL,
+            reserved_minutes REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (hub_id, slot_date)
+        )
+        ",
+        'delivery_slot_reservations' => "
+        CREATE TABLE IF NOT EXISTS delivery_slot_reservations (
+            order_id " . get_integer_type() . " PRIMARY KEY,
+            hub_id TEXT NOT NULL,
+            slot_date DATE NOT NULL,
+            minutes REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            released_at TIMESTAMP
+        )
+        ",
+        'order_rollups' => "
+        CREATE TABLE IF NOT EXISTS order_rollups (
+            day DATE NOT NULL,
+            status TEXT NOT NULL,
+            municipality TEXT NOT NULL,
+            order_count " . get_integer_type() . " NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            bottles " . get_integer_type() . " NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status, municipality)
+        )
+        ",
+        'prediction_quotes' => "
+        CREATE TABLE IF NOT EXISTS prediction_quotes (
+            order_id " . get_integer_type() . " PRIMARY KEY,
+            model_version TEXT NOT NULL,
+            municipality TEXT,
+            distance_km REAL,
+            order_size " . get_integer_type() . ",
+            predicted_minutes REAL NOT NULL,
+            ordered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            actual_minutes REAL,
+            matched_at TIMESTAMP
+        )
+        ",
+        'order_events' => "
+        CREATE TABLE IF NOT EXISTS order_events (
+            id " . get_id_type() . ",
+            order_id " . get_integer_type() . " NOT NULL,
+            user_id " . get_integer_type() . ",
+            status TEXT NOT NULL,
+            previous_status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        "
+    ];
+    foreach ($python_api_tables as $table => $query) {
+        $result = execute_sql($conn, $query);
+        if ($result === false) {
+            error_log("Failed to create $table table: " . ($GLOBALS['use_postgres'] ? pg_last_error($conn) : "SQLite error"));
+        }
+    }
+    execute_sql($conn, "CREATE INDEX IF NOT EXISTS idx_delivery_slot_reservations_slot ON delivery_slot_reservations (hub_id, slot_date)");
+    execute_sql($conn, "CREATE INDEX IF NOT EXISTS idx_prediction_quotes_ordered_at ON prediction_quotes (ordered_at)");
+    
     close_connection($conn);
     error_log("Database initialization completed. Using: " . ($GLOBALS['use_postgres'] ? "PostgreSQL" : "SQLite"));
 }
@@ -0,0 +1,61 @@
+"""
+Database Helpers for AquaSphere
+Helpers shared by the API modules that run on both PostgreSQL and SQLite
+"""
+
+import os
+import sqlite3
+
+# The PHP side (api/database.php) uses PostgreSQL when DATABASE_URL or all of these are set
+PG_VARIABLES = ('PGHOST', 'PGDATABASE', 'PGUSER', 'PGPASSWORD')
+
+
+def sql(query, postgres):
+    """Convert a query written with SQLite placeholders to the active backend"""
+    return query.replace('?', '%s') if postgres else query
+
+
+def begin_write(cursor, postgres):
+    """
+    Take the SQLite write lock before a read that decides what the transaction writes
+
+    Python's sqlite3 only opens a transaction at the first INSERT/UPDATE, so a
+    SELECT before it holds no lock and two writers can both act on the same
+    old row. BEGIN IMMEDIATE takes the lock up front (PostgreSQL callers use
+    SELECT ... FOR UPDATE instead). Does nothing inside an open transaction.
+    """
+    if not postgres and not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+def postgres_configured():
+    """Whether the PHP side would use PostgreSQL (same check as api/database.php)"""
+    return bool(os.environ.get('DATABASE_URL')) or all(os.environ.get(name) for name in PG_VARIABLES)
+
+
+def connect(database_path=None):
+    """
+    Connect to the database the PHP pages use (for scripts run from PHP)
+
+    Unlike the Flask app, this never falls back to SQLite when PostgreSQL is
+    configured: a script would otherwise write to a local aquasphere.db that
+    nothing reads.
+
+    Args:
+        database_path: SQLite file (default: DATABASE_PATH or aquasphere.db)
+
+    Returns:
+        (connection, postgres)
+
+    Raises:
+        RuntimeError: PostgreSQL is configured but psycopg2 is not installed
+    """
+    if postgres_configured():
+        try:
+            import psycopg2
+        except ImportError:
+            raise RuntimeError('PostgreSQL is configured (DATABASE_URL or PGHOST/PGDATABASE/PGUSER/PGPASSWORD) '
+                               'but psycopg2 is not installed')
+        # An empty DSN makes libpq read the PG* variables, like database.php does
+        return psycopg2.connect(os.environ.get('DATABASE_URL') or ''), True
+    return sqlite3.connect(database_path or os.environ.get('DATABASE_PATH', 'aquasphere.db'), timeout=5), False
@@ -0,0 +1,332 @@
+"""
+Capacity-aware Delivery Slot Scheduler for AquaSphere
+Keeps per-day, per-hub delivery capacity and reserves minutes at order creation
+"""
+
+import os
+import sys
+import time
+import threading
+from datetime import datetime, date, timedelta
+
+# The date-range rules live with the prediction model
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml'))
+from predict import calculate_delivery_date_range
+from db import sql
+
+# Only one hub today (San Pablo City), but every counter is keyed by hub
+DEFAULT_HUB_ID = 'san-pablo'
+
+# Delivery minutes a hub can serve per day (3 vehicles x 8 hour shifts by default)
+DEFAULT_DAILY_CAPACITY_MINUTES = int(os.environ.get('DELIVERY_DAILY_CAPACITY_MINUTES', 3 * 8 * 60))
+
+# How many days ahead we look for a free slot before giving up
+DEFAULT_HORIZON_DAYS = 14
+
+# Seconds before the in-memory index is reloaded, so reservations made by
+# other API workers (or directly in the database) show up in quoted windows
+DEFAULT_REFRESH_SECONDS = float(os.environ.get('DELIVERY_SLOT_REFRESH_SECONDS', 30))
+
+
+class NoDeliveryCapacity(Exception):
+    """Raised when no day within the scheduling horizon can take an order"""
+
+
+def _to_date(value):
+    """Normalize DATE values from psycopg2 (date) and SQLite (ISO text)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def ensure_schema(cursor, postgres=False):
+    """Create the capacity and reservation tables if they don't exist"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS delivery_slot_capacity (
+            hub_id TEXT NOT NULL,
+            slot_date DATE NOT NULL,
+            capacity_minutes REAL NOT NULL,
+            reserved_minutes REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (hub_id, slot_date)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS delivery_slot_reservations (
+            order_id INTEGER PRIMARY KEY,
+            hub_id TEXT NOT NULL,
+            slot_date DATE NOT NULL,
+            minutes REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            released_at TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_delivery_slot_reservations_slot
+        ON delivery_slot_reservations (hub_id, slot_date)
+    """)
+
+
+class DeliverySlotScheduler:
+    """
+    Delivery slot scheduler backed by the delivery_slot_capacity table
+
+    The database is the source of truth: reservations are made with a
+    conditional UPDATE on a single (hub_id, slot_date) row, so concurrent
+    checkouts only contend on the day they are booking. An in-memory index
+    of reserved minutes answers "earliest feasible window" without a query;
+    it is reloaded from the capacity counters every refresh_seconds, and as
+    soon as a reservation finds its quoted day already full.
+    """
+
+    def __init__(self, capacity_minutes=DEFAULT_DAILY_CAPACITY_MINUTES, horizon_days=DEFAULT_HORIZON_DAYS,
+                 refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.capacity_minutes = capacity_minutes
+        self.horizon_days = horizon_days
+        self.refresh_seconds = refresh_seconds
+        # time.monotonic() of the last load, None until loaded (or once known to be stale)
+        self.loaded_at = None
+        # hub_id -> {date: capacity_minutes} for days with a custom capacity
+        self._capacity = {}
+        # hub_id -> {date: reserved_minutes}
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def load(self, cursor, postgres=False):
+        """
+        Rebuild the in-memory index from the database
+
+        Reserved minutes come from delivery_slot_capacity, the same counters
+        reserve() checks, so a quoted day is one reserve() will accept. Run
+        release_cancelled() first so orders cancelled outside this API have
+        given their minutes back.
+        """
+        cursor.execute("SELECT hub_id, slot_date, capacity_minutes, reserved_minutes FROM delivery_slot_capacity")
+        capacity = {}
+        reserved = {}
+        for hub_id, slot_date, capacity_minutes, reserved_minutes in cursor.fetchall():
+            slot_date = _to_date(slot_date)
+            capacity.setdefault(hub_id, {})[slot_date] = float(capacity_minutes)
+            reserved.setdefault(hub_id, {})[slot_date] = float(reserved_minutes or 0)
+
+        with self._lock:
+            self._capacity = capacity
+            self._reserved = reserved
+            self.loaded_at = time.monotonic()
+
+    def release_cancelled(self, cursor, postgres=False):
+        """
+        Release the reservations of orders cancelled without going through release()
+
+        cancel_order.php and the admin status page only update orders.status,
+        so their cancellations are picked up here (inside the caller's
+        transaction) before the index is reloaded.
+
+        Returns:
+            Number of reservations released
+        """
+        cursor.execute("""
+            SELECT r.order_id
+            FROM delivery_slot_reservations r
+            JOIN orders o ON o.id = r.order_id
+            WHERE r.released_at IS NULL AND o.status = 'cancelled'
+        """)
+        order_ids = [row[0] for row in cursor.fetchall()]
+        return sum(1 for order_id in order_ids if self.release(cursor, order_id, postgres) is not None)
+
+    def needs_load(self):
+        """Whether the index has never been loaded or is older than refresh_seconds"""
+        loaded_at = self.loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at >= self.refresh_seconds
+
+    def remaining_minutes(self, hub_id, slot_date):
+        """Minutes still available for a hub on a given day"""
+        capacity = self._capacity.get(hub_id, {}).get(slot_date, self.capacity_minutes)
+        return capacity - self._reserved.get(hub_id, {}).get(slot_date, 0.0)
+
+    def earliest_window(self, delivery_time_minutes, hub_id=DEFAULT_HUB_ID, order_datetime=None):
+        """
+        Find the earliest delivery window with enough capacity left
+
+        Args:
+            delivery_time_minutes: Predicted delivery time in minutes
+            hub_id: Hub the order is dispatched from
+            order_datetime: Datetime object for when the order was placed (default: current time)
+
+        Returns:
+            Dictionary shaped like calculate_delivery_date_range() plus 'slot_date'
+            and 'hub_id', or None if no day within the horizon has capacity
+        """
+        if order_datetime is None:
+            order_datetime = datetime.now()
+
+        baseline = calculate_delivery_date_range(delivery_time_minutes, order_datetime)
+        start = datetime.fromisoformat(baseline['start_date'])
+        end = datetime.fromisoformat(baseline['end_date'])
+
+        with self._lock:
+            for offset in range(self.horizon_days):
+                slot_date = start.date() + timedelta(days=offset)
+                if self.remaining_minutes(hub_id, slot_date) >= delivery_time_minutes:
+                    break
+            else:
+                return None
+
+        if offset == 0:
+            window = baseline
+        else:
+            # Shift the whole window past the fully booked days
+            window = _format_window(start + timedelta(days=offset), end + timedelta(days=offset))
+
+        window['slot_date'] = slot_date.isoformat()
+        window['hub_id'] = hub_id
+        return window
+
+    def reserve(self, cursor, order_id, delivery_time_minutes, slot_date, hub_id=DEFAULT_HUB_ID, postgres=False):
+        """
+        Reserve delivery minutes for an order inside the caller's transaction
+
+        Starts at slot_date and moves forward a day at a time if another
+        checkout took the remaining capacity first. The caller commits, then
+        passes the result to confirm() to update the in-memory index.
+
+        Returns:
+            Dictionary with 'order_id', 'hub_id', 'slot_date' and 'minutes',
+            or None if no day within the horizon has capacity
+        """
+        slot_date = _to_date(slot_date)
+
+        for offset in range(self.horizon_days):
+            day = (slot_date + timedelta(days=offset)).isoformat()
+            cursor.execute(sql("""
+                INSERT INTO delivery_slot_capacity (hub_id, slot_date, capacity_minutes, reserved_minutes)
+                VALUES (?, ?, ?, 0)
+                ON CONFLICT (hub_id, slot_date) DO NOTHING
+            """, postgres), (hub_id, day, self.capacity_minutes))
+
+            # Row-level compare-and-add: only succeeds if the day still has room
+            cursor.execute(sql("""
+                UPDATE delivery_slot_capacity
+                SET reserved_minutes = reserved_minutes + ?
+                WHERE hub_id = ? AND slot_date = ? AND reserved_minutes + ? <= capacity_minutes
+            """, postgres), (delivery_time_minutes, hub_id, day, delivery_time_minutes))
+
+            if cursor.rowcount == 1:
+                if offset:
+                    # Another worker filled the quoted day: reload before the next quote
+                    self.loaded_at = None
+                cursor.execute(sql("""
+                    INSERT INTO delivery_slot_reservations (order_id, hub_id, slot_date, minutes)
+                    VALUES (?, ?, ?, ?)
+                """, postgres), (order_id, hub_id, day, delivery_time_minutes))
+                return {
+                    'order_id': order_id,
+                    'hub_id': hub_id,
+                    'slot_date': day,
+                    'minutes': delivery_time_minutes
+                }
+
+        return None
+
+    def release(self, cursor, order_id, postgres=False):
+        """
+        Give an order's reserved minutes back inside the caller's transaction
+
+        The reservation is marked released with a conditional UPDATE, so when
+        two cancellations race only the one that flips the row returns the
+        minutes. The row is kept so the order can be reinstated later.
+
+        Returns:
+            The released reservation (pass it to confirm(..., released=True)), or None
+        """
+        cursor.execute(sql("""
+            UPDATE delivery_slot_reservations SET released_at = CURRENT_TIMESTAMP
+            WHERE order_id = ? AND released_at IS NULL
+        """, postgres), (order_id,))
+        if cursor.rowcount != 1:
+            return None
+
+        cursor.execute(sql("""
+            SELECT hub_id, slot_date, minutes FROM delivery_slot_reservations WHERE order_id = ?
+        """, postgres), (order_id,))
+        row = cursor.fetchone()
+        hub_id, slot_date, minutes = row[0], _to_date(row[1]).isoformat(), float(row[2])
+        cursor.execute(sql("""
+            UPDATE delivery_slot_capacity
+            SET reserved_minutes = reserved_minutes - ?
+            WHERE hub_id = ? AND slot_date = ?
+        """, postgres), (minutes, hub_id, slot_date))
+
+        return {'order_id': order_id, 'hub_id': hub_id, 'slot_date': slot_date, 'minutes': minutes}
+
+    def reinstate(self, cursor, order_id, postgres=False, today=None):
+        """
+        Reserve capacity again for an order whose reservation was released
+
+        Used when a cancelled order goes back to an active status. The order
+        books its original day if that is still ahead and has room, otherwise
+        the next day that does.
+
+        Args:
+            cursor: Cursor inside the caller's transaction
+            order_id: Order to reinstate
+            postgres: Whether the cursor is a PostgreSQL cursor
+            today: First day that may be booked (default: today)
+
+        Returns:
+            The new reservation (pass it to confirm()), or None if the order
+            has no released reservation
+
+        Raises:
+            NoDeliveryCapacity: No day within the horizon has room for it
+        """
+        cursor.execute(sql("""
+            SELECT hub_id, slot_date, minutes FROM delivery_slot_reservations
+            WHERE order_id = ? AND released_at IS NOT NULL
+        """, postgres), (order_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        # Same claim-by-rowcount as release(): a racing reinstatement finds nothing to delete
+        cursor.execute(sql("""
+            DELETE FROM delivery_slot_reservations WHERE order_id = ? AND released_at IS NOT NULL
+        """, postgres), (order_id,))
+        if cursor.rowcount != 1:
+            return None
+
+        slot_date = max(_to_date(row[1]), today or date.today())
+        reservation = self.reserve(cursor, order_id, float(row[2]), slot_date, row[0], postgres)
+        if reservation is None:
+            raise NoDeliveryCapacity('No delivery capacity available')
+        return reservation
+
+    def confirm(self, reservation, released=False):
+        """Apply a committed reservation (or release) to the in-memory index"""
+        if not reservation:
+            return
+        slot_date = _to_date(reservation['slot_date'])
+        delta = -reservation['minutes'] if released else reservation['minutes']
+        with self._lock:
+            days = self._reserved.setdefault(reservation['hub_id'], {})
+            days[slot_date] = max(0.0, days.get(slot_date, 0.0) + delta)
+
+
+def _format_window(start_date, end_date):
+    """Format a delivery window the same way calculate_delivery_date_range() does"""
+    start_formatted = start_date.strftime('%b %d')
+    end_formatted = end_date.strftime('%b %d')
+
+    if start_date.year != end_date.year or start_date.month != end_date.month:
+        date_range = f"{start_date.strftime('%b %d')} - {end_date.strftime('%b %d, %Y')}"
+    else:
+        date_range = f"{start_formatted} - {end_formatted}"
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'start_date_formatted': start_formatted,
+        'end_date_formatted': end_formatted,
+        'date_range': date_range
+    }
@@ -0,0 +1,450 @@
+"""
+Load Test Harness for the AquaSphere Python API
+Replays a mix of order reads, creations and status updates and reports JSON results
+
+The database is seeded with synthetic Laguna customers and order histories
+(same municipalities and barangays as ml/generate_synthetic_data.py). Worker
+threads then keep `--concurrency` requests in flight for `--duration`
+seconds. The JSON report has throughput, p50/p95/p99 latency and error
+rates per operation, so runs can be compared for regressions.
+
+Usage:
+    python api/load_test.py [--users 500] [--orders 20000] [--concurrency 16]
+                            [--duration 30] [--mix read=70,create=20,update=10]
+                            [--url http://host:port] [--output report.json]
+
+Without --url the app is started in-process on a free port against a fresh
+SQLite database. Set DATABASE_URL to seed and test against a local PostgreSQL
+database instead. With --url, the seeded database (DATABASE_URL or
+DATABASE_PATH) must be the one the target server uses. ORDER_INGEST_MODE,
+SQLITE_SINGLE_WRITER and the other app settings are read from the
+environment as usual.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+import http.client
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+ML_DIR = os.path.join(API_DIR, '..', 'ml')
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, ML_DIR)
+
+from generate_synthetic_data import LAGUNA_MUNICIPALITIES, BARANGAYS
+import rollups
+from db import sql
+
+# Try to import psycopg2, but make it optional
+try:
+    import psycopg2
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+PRODUCTS = [
+    ('5-Gallon Refill', 35.0),
+    ('5-Gallon Round Refill', 40.0),
+    ('1 Liter Bottle', 15.0),
+    ('500 mL Bottle', 10.0)
+]
+
+# Seeded order statuses, weighted like a mostly-delivered history
+SEED_STATUSES = [('delivered', 70), ('cancelled', 8), ('pending', 8), ('preparing', 5),
+                 ('shipped', 4), ('out_for_delivery', 5)]
+
+# Statuses the update operation moves orders to
+UPDATE_STATUSES = ['preparing', 'shipped', 'out_for_delivery', 'delivered']
+
+DEFAULT_MIX = 'read=70,create=20,update=10'
+OPERATIONS = ('read', 'create', 'update')
+
+
+def create_schema(cursor, postgres=False):
+    """Create the tables the PHP side normally creates (columns the Python API uses)"""
+    id_type = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS users (
+            id {id_type},
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            delivery_address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS orders (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivery_date DATE,
+            delivery_time TIME,
+            delivery_address TEXT,
+            total_amount DECIMAL(10,2) NOT NULL,
+            payment_method TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS order_items (
+            id {id_type},
+            order_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            product_price DECIMAL(10,2) NOT NULL,
+            quantity INTEGER NOT NULL,
+            subtotal DECIMAL(10,2) NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS order_status_history (
+            id {id_type},
+            order_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            payment_method TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)")
+
+
+def random_address(rng):
+    """A saved delivery address like the ones cart.html and profile.html store"""
+    municipality = rng.choice(list(LAGUNA_MUNICIPALITIES.keys()))
+    muni = LAGUNA_MUNICIPALITIES[municipality]
+    return {
+        'latitude': round(muni['lat'] + rng.uniform(-0.05, 0.05), 6),
+        'longitude': round(muni['lng'] + rng.uniform(-0.05, 0.05), 6),
+        'city': municipality,
+        'barangay': rng.choice(BARANGAYS[municipality]),
+        'postalCode': muni['postal'],
+        'street': f"{rng.randint(1, 999)} Rizal St."
+    }
+
+
+def random_items(rng):
+    items = []
+    for name, price in rng.sample(PRODUCTS, rng.randint(1, 3)):
+        items.append({'name': name, 'price': price, 'quantity': rng.randint(1, 10)})
+    return items
+
+
+def seed(conn, postgres, users, orders, rng):
+    """
+    Insert synthetic users with saved addresses and their order histories
+
+    Returns:
+        Dictionary with 'users' (id -> address JSON) and 'order_ids'
+    """
+    cursor = conn.cursor()
+    create_schema(cursor, postgres)
+
+    run_tag = f"{int(time.time())}{rng.randint(1000, 9999)}"
+    user_addresses = {}
+    for n in range(users):
+        address = json.dumps(random_address(rng))
+        params = (f"loadtest_{run_tag}_{n}", 'x', f"loadtest_{run_tag}_{n}@example.com", address)
+        if postgres:
+            cursor.execute("""
+                INSERT INTO users (username, password_hash, email, delivery_address)
+                VALUES (%s, %s, %s, %s) RETURNING id
+            """, params)
+            user_id = cursor.fetchone()[0]
+        else:
+            cursor.execute("""
+                INSERT INTO users (username, password_hash, email, delivery_address)
+                VALUES (?, ?, ?, ?)
+            """, params)
+            user_id = cursor.lastrowid
+        user_addresses[user_id] = address
+
+    statuses = [status for status, _ in SEED_STATUSES]
+    weights = [weight for _, weight in SEED_STATUSES]
+    user_ids = list(user_addresses)
+    now = datetime.now()
+    order_ids = []
+    for _ in range(orders):
+        user_id = rng.choice(user_ids)
+        items = random_items(rng)
+        order_date = now - timedelta(days=rng.uniform(0, 90))
+        delivery_date = (order_date + timedelta(days=rng.randint(1, 3))).date().isoformat()
+        params = (user_id, order_date.strftime('%Y-%m-%d %H:%M:%S'), delivery_date, user_addresses[user_id],
+                  sum(item['price'] * item['quantity'] for item in items),
+                  rng.choice(['COD', 'GCash']), rng.choices(statuses, weights)[0])
+        if postgres:
+            cursor.execute("""
+                INSERT INTO orders (user_id, order_date, delivery_date, delivery_address,
+                                    total_amount, payment_method, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
+            """, params)
+            order_id = cursor.fetchone()[0]
+        else:
+            cursor.execute("""
+                INSERT INTO orders (user_id, order_date, delivery_date, delivery_address,
+                                    total_amount, payment_method, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, params)
+            order_id = cursor.lastrowid
+        cursor.executemany(sql("""
+            INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+            VALUES (?, ?, ?, ?, ?)
+        """, postgres), [(order_id, item['name'], item['price'], item['quantity'], item['price'] * item['quantity'])
+                         for item in items])
+        order_ids.append(order_id)
+
+    # Keep the dashboard rollups consistent with the seeded orders
+    rollups.rebuild(cursor, postgres)
+    conn.commit()
+    return {'users': user_addresses, 'order_ids': order_ids}
+
+
+def parse_mix(mix):
+    """Parse 'read=70,create=20,update=10' into operation weights"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (expected one of {', '.join(OPERATIONS)})")
+        weights[name] = float(weight)
+    if not any(weights.values()):
+        raise ValueError('The operation mix needs at least one positive weight')
+    return weights
+
+
+def start_local_server():
+    """Serve api/app.py in-process on a free port and return its base URL"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+
+    class KeepAliveRequestHandler(WSGIRequestHandler):
+        # Let each worker reuse its connection like a pooled HTTP client
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+class LoadGenerator:
+    """
+    Closed-loop load generator: each worker sends its next request as soon as
+    the previous one returns
+
+    Args:
+        base_url: Base URL of the Python API
+        dataset: Result of seed()
+        weights: Operation weights from parse_mix()
+        concurrency: Number of worker threads
+    """
+
+    def __init__(self, base_url, dataset, weights, concurrency=16):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.users = dataset['users']
+        self.user_ids = list(dataset['users'])
+        self.order_ids = list(dataset['order_ids'])
+        self.operations = list(weights)
+        self.weights = [weights[op] for op in self.operations]
+        self.concurrency = concurrency
+
+        self._lock = threading.Lock()
+        self._recording = False
+        self._samples = {op: [] for op in OPERATIONS}
+        self._errors = {op: 0 for op in OPERATIONS}
+        self._status_codes = {}
+
+    def _request(self, conn, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        return response.status, payload
+
+    def _run_operation(self, conn, op, rng):
+        """Send one request; returns (HTTP status, succeeded)"""
+        if op == 'read':
+            status, payload = self._request(conn, 'GET', f"/api/python/orders?user_id={rng.choice(self.user_ids)}")
+        elif op == 'create':
+            user_id = rng.choice(self.user_ids)
+            status, payload = self._request(conn, 'POST', '/api/python/orders', {
+                'user_id': user_id,
+                'items': random_items(rng),
+                'delivery_address': self.users[user_id],
+                'payment_method': 'COD'
+            })
+            if status == 200:
+                order_id = json.loads(payload).get('order_id')
+                with self._lock:
+                    self.order_ids.append(order_id)
+        else:
+            with self._lock:
+                order_id = rng.choice(self.order_ids)
+            status, payload = self._request(conn, 'PUT', f"/api/python/orders/{order_id}/status",
+                                            {'status': rng.choice(UPDATE_STATUSES)})
+        return status, status < 400 and json.loads(payload).get('success', False)
+
+    def _worker(self, seed, deadline):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while time.perf_counter() < deadline:
+            op = rng.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, ok = self._run_operation(conn, op, rng)
+            except Exception:
+                status, ok = 'exception', False
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                if not self._recording:
+                    continue
+                self._samples[op].append(elapsed)
+                if not ok:
+                    self._errors[op] += 1
+                self._status_codes[str(status)] = self._status_codes.get(str(status), 0) + 1
+        conn.close()
+
+    def run(self, duration, warmup=2.0):
+        """
+        Run the load for warmup + duration seconds (warm-up requests are not recorded)
+
+        Returns:
+            Report dictionary
+        """
+        started = time.perf_counter()
+        deadline = started + warmup + duration
+        threads = [threading.Thread(target=self._worker, args=(n, deadline), daemon=True)
+                   for n in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+
+        time.sleep(warmup)
+        with self._lock:
+            self._recording = True
+            measured_from = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - measured_from)
+
+    def report(self, elapsed):
+        operations = {}
+        all_samples = []
+        total_errors = 0
+        for op in OPERATIONS:
+            samples = self._samples[op]
+            if not samples:
+                continue
+            all_samples.extend(samples)
+            total_errors += self._errors[op]
+            operations[op] = summarize(samples, self._errors[op], elapsed)
+
+        report = summarize(all_samples, total_errors, elapsed)
+        report['operations'] = operations
+        report['status_codes'] = self._status_codes
+        return report
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of pre-sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, errors, elapsed):
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(sum(samples) / count * 1000, 3) if count else 0.0,
+            'p50': round(percentile(samples, 0.50) * 1000, 3),
+            'p95': round(percentile(samples, 0.95) * 1000, 3),
+            'p99': round(percentile(samples, 0.99) * 1000, 3),
+            'max': round(samples[-1] * 1000, 3) if count else 0.0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the AquaSphere Python orders API')
+    parser.add_argument('--users', type=int, default=500, help='Synthetic customers to seed')
+    parser.add_argument('--orders', type=int, default=20000, help='Historical orders to seed')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before recording')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--url', help='Test a running server instead of starting the app in-process')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    postgres = bool(os.environ.get('DATABASE_URL')) and PSYCOPG2_AVAILABLE
+
+    if not postgres and not args.url and not os.environ.get('DATABASE_PATH'):
+        # Fresh database for every in-process run
+        os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='aquasphere-load-'), 'load_test.db')
+
+    if postgres:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    else:
+        conn = sqlite3.connect(os.environ.get('DATABASE_PATH', 'aquasphere.db'))
+    seeded_at = time.perf_counter()
+    dataset = seed(conn, postgres, args.users, args.orders, random.Random(args.seed))
+    seed_seconds = time.perf_counter() - seeded_at
+    conn.close()
+
+    base_url = args.url or start_local_server()
+    generator = LoadGenerator(base_url, dataset, weights, args.concurrency)
+    results = generator.run(args.duration, args.warmup)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'url': args.url or 'in-process',
+            'database': 'postgresql' if postgres else 'sqlite',
+            'order_ingest_mode': os.environ.get('ORDER_INGEST_MODE', 'direct'),
+            'sqlite_single_writer': os.environ.get('SQLITE_SINGLE_WRITER') == '1',
+            'users': args.users,
+            'seeded_orders': args.orders,
+            'seed_seconds': round(seed_seconds, 2),
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'mix': weights
+        },
+        'results': results
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Order Status Events for AquaSphere
+In-process pub/sub for order status transitions, streamed to clients as Server-Sent Events
+
+update_order_status() and create_order() record each event in the
+order_events table inside their write transaction, and publish it after the
+commit. The table's row id is the event id, so ids are the same on every
+worker and survive restarts, and a client reconnecting with Last-Event-ID
+(to any worker) gets what it missed replayed from the table. Every open /api/python/orders/events stream holds a Subscription:
+a small deque plus an Event, so an idle connection costs one blocked
+server thread and a few hundred bytes. Publishing only touches the
+subscribers for that order's user plus the ones watching all orders.
+
+With several workers, set ORDER_EVENTS_PG_BRIDGE=1 on PostgreSQL. Events are
+then sent with pg_notify() inside the writing transaction, and each worker's
+PostgresNotifyBridge thread LISTENs and republishes them locally.
+"""
+
+import json
+import time
+import select
+import threading
+from collections import deque
+from datetime import datetime
+
+from response_encoding import dumps
+from db import sql
+
+# Channel used for pg_notify() / LISTEN
+NOTIFY_CHANNEL = 'order_events'
+
+# Most missed events replayed to a client reconnecting with Last-Event-ID
+REPLAY_LIMIT = 1000
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_BUFFER_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15.0
+
+
+def make_event(order_id, user_id, status, previous_status=None):
+    """Build the event payload for an order status transition"""
+    return {
+        'order_id': order_id,
+        'user_id': user_id,
+        'status': status,
+        'previous_status': previous_status,
+        'at': datetime.now().isoformat()
+    }
+
+
+def ensure_schema(cursor, postgres=False):
+    """Create the event table if it doesn't exist"""
+    id_type = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS order_events (
+            id {id_type},
+            order_id INTEGER NOT NULL,
+            user_id INTEGER,
+            status TEXT NOT NULL,
+            previous_status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def record(cursor, event, postgres=False):
+    """
+    Store an event inside the caller's transaction and give it the row id
+
+    Returns:
+        The event id (also set as event['id'])
+    """
+    query = """
+        INSERT INTO order_events (order_id, user_id, status, previous_status, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    params = (event['order_id'], event['user_id'], event['status'], event['previous_status'], event['at'])
+    if postgres:
+        cursor.execute(sql(query + " RETURNING id", postgres), params)
+        event['id'] = cursor.fetchone()[0]
+    else:
+        cursor.execute(query, params)
+        event['id'] = cursor.lastrowid
+    return event['id']
+
+
+def load_since(cursor, last_event_id, user_id=None, postgres=False, limit=REPLAY_LIMIT):
+    """
+    Load events newer than last_event_id for a reconnecting client
+
+    Returns:
+        List of (id, event) tuples, oldest first
+    """
+    query = """
+        SELECT id, order_id, user_id, status, previous_status, created_at
+        FROM order_events WHERE id > ?
+    """
+    params = [last_event_id]
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params.append(user_id)
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    cursor.execute(sql(query, postgres), params)
+
+    events = []
+    for event_id, order_id, event_user_id, status, previous_status, created_at in cursor.fetchall():
+        events.append((event_id, {
+            'id': event_id,
+            'order_id': order_id,
+            'user_id': event_user_id,
+            'status': status,
+            'previous_status': previous_status,
+            'at': created_at.isoformat() if isinstance(created_at, datetime) else created_at
+        }))
+    return events
+
+
+class Subscription:
+    """A stream's mailbox: buffered events and a flag set when new ones arrive"""
+
+    __slots__ = ('user_id', 'events', 'ready')
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.events = deque(maxlen=SUBSCRIBER_BUFFER_SIZE)
+        self.ready = threading.Event()
+
+    def deliver(self, event):
+        self.events.append(event)
+        self.ready.set()
+
+    def wait(self, timeout):
+        """
+        Wait for events
+
+        Returns:
+            List of (id, event) tuples, empty if the timeout passed first
+        """
+        if not self.ready.wait(timeout):
+            return []
+        # Clear before draining so an event published mid-drain sets it again
+        self.ready.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+class OrderEventBus:
+    """
+    In-process publish/subscribe for order status events
+
+    Subscribers either follow one user's orders (user_id) or all orders
+    (user_id=None, for the admin orders page).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user = {}
+        self._all = set()
+        self._last_id = None
+        self._published = 0
+
+    def subscribe(self, user_id=None):
+        """
+        Register a subscriber
+
+        Returns:
+            Subscription (pass it to unsubscribe() when the stream closes)
+        """
+        subscription = Subscription(user_id)
+        with self._lock:
+            if user_id is None:
+                self._all.add(subscription)
+            else:
+                self._by_user.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.user_id is None:
+                self._all.discard(subscription)
+            else:
+                subscribers = self._by_user.get(subscription.user_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_user[subscription.user_id]
+
+    def publish(self, event):
+        """Deliver a recorded event (one with an 'id') to this process's subscribers; returns its id"""
+        event_id = event['id']
+        with self._lock:
+            self._last_id = event_id
+            self._published += 1
+            targets = list(self._all)
+            targets.extend(self._by_user.get(event.get('user_id'), ()))
+        for subscription in targets:
+            subscription.deliver((event_id, event))
+        return event_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._all) + sum(len(s) for s in self._by_user.values()),
+                'all_orders_subscribers': len(self._all),
+                'users_watched': len(self._by_user),
+                'published': self._published,
+                'last_event_id': self._last_id
+            }
+
+
+def format_sse(event_id, event):
+    """Encode one event in text/event-stream framing"""
+    return b'id: %d\nevent: status\ndata: %s\n\n' % (event_id, dumps(event))
+
+
+def stream(bus, user_id=None, last_event_id=None, replay=None, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Generator of text/event-stream chunks for a streaming response
+
+    The subscription is made when the response starts and removed when the
+    client disconnects. Keep-alive comments go out on idle streams so
+    proxies keep the connection open and a closed client is noticed.
+
+    Args:
+        bus: OrderEventBus to subscribe to
+        user_id: Only stream this user's orders (None for all orders)
+        last_event_id: Last event id the client saw, if it is reconnecting
+        replay: Callable (last_event_id, user_id) -> [(id, event)] loading missed events
+        heartbeat: Seconds between keep-alive comments
+    """
+    # Subscribe before loading missed events so nothing falls in between
+    subscription = bus.subscribe(user_id)
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield b'retry: 5000\n\n'
+        replayed = set()
+        if last_event_id is not None and replay is not None:
+            missed = replay(last_event_id, user_id)
+            replayed = {event_id for event_id, _ in missed}
+            if missed:
+                yield b''.join(format_sse(event_id, event) for event_id, event in missed)
+        while True:
+            events = subscription.wait(heartbeat)
+            if not events:
+                yield b': keep-alive\n\n'
+                continue
+            events = [(event_id, event) for event_id, event in events if event_id not in replayed]
+            if events:
+                yield b''.join(format_sse(event_id, event) for event_id, event in events)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def notify(cursor, event):
+    """Queue an event with pg_notify(); PostgreSQL sends it when the transaction commits"""
+    cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, dumps(event).decode('utf-8')))
+
+
+class PostgresNotifyBridge:
+    """
+    LISTENs on the order events channel and republishes each notification locally
+
+    Args:
+        connect: Callable returning a new psycopg2 connection
+        bus: OrderEventBus to publish into
+    """
+
+    def __init__(self, connect, bus, channel=NOTIFY_CHANNEL):
+        self.connect = connect
+        self.bus = bus
+        self.channel = channel
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the listener thread if it isn't running"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='order-events-listen', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {self.channel}")
+                backoff = 1.0
+                while True:
+                    # Wake up now and then so a dead connection is noticed
+                    if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                        conn.cursor().execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        self.bus.publish(json.loads(notification.payload))
+            except Exception:
+                # Reconnect; events sent while disconnected are missed
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
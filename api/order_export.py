@@ -0,0 +1,164 @@
+"""
+Streaming Order Export for AquaSphere
+Streams filtered order histories as NDJSON or CSV without loading them into memory
+
+Rows are read in batches (a named server-side cursor on PostgreSQL,
+fetchmany() on SQLite) and each batch is encoded and yielded as one chunk,
+so memory stays flat no matter how many orders match.
+"""
+
+import io
+import csv
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from rollups import municipality_from_address
+from response_encoding import dumps
+from db import sql
+
+EXPORT_COLUMNS = ['id', 'user_id', 'order_date', 'delivery_date', 'delivery_time', 'status',
+                  'payment_method', 'total_amount', 'bottles', 'items', 'municipality', 'delivery_address']
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+# A one-pass scan gains nothing from SQLite's large page cache or memory-mapped
+# reads, which would only grow the process by the size of the data scanned
+EXPORT_CACHE_SIZE_KB = 2048
+
+
+def _json_value(value):
+    """Make psycopg2 values (Decimal, datetime, date) JSON/CSV friendly"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def build_query(filters, postgres=False):
+    """
+    Build the export query for the SQL-side filters
+
+    Args:
+        filters: Dictionary with optional 'date_from', 'date_to' (YYYY-MM-DD,
+                 inclusive, on order_date) and 'statuses' (list)
+
+    Returns:
+        Tuple of (query, params)
+    """
+    item_summary = ("string_agg(product_name || ' x' || quantity, '; ' ORDER BY id)" if postgres
+                    else "group_concat(product_name || ' x' || quantity, '; ')")
+    conditions = []
+    params = []
+
+    if filters.get('date_from'):
+        conditions.append("o.order_date >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        # Inclusive end date: everything before the start of the next day
+        conditions.append("o.order_date < ?")
+        params.append((date.fromisoformat(filters['date_to']) + timedelta(days=1)).isoformat())
+    if filters.get('statuses'):
+        conditions.append(f"o.status IN ({', '.join('?' for _ in filters['statuses'])})")
+        params.extend(filters['statuses'])
+
+    # Correlated subqueries keep rows in primary-key order so they stream
+    # without grouping or sorting the whole result first
+    query = f"""
+        SELECT o.id, o.user_id, o.order_date, o.delivery_date, o.delivery_time, o.status,
+               o.payment_method, o.total_amount,
+               (SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE order_id = o.id),
+               (SELECT {item_summary} FROM order_items WHERE order_id = o.id),
+               o.delivery_address
+        FROM orders o
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY o.id
+    """
+    return sql(query, postgres), params
+
+
+def iter_orders(conn, filters, postgres=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield batches of export rows (dicts keyed by EXPORT_COLUMNS)
+
+    The municipality filter is applied here because delivery_address is a
+    JSON string; it is matched case-insensitively against the address city.
+    """
+    query, params = build_query(filters, postgres)
+    if postgres:
+        # Named cursor: PostgreSQL keeps the result and sends batch_size rows per round trip
+        cursor = conn.cursor(name='order_export')
+        cursor.itersize = batch_size
+    else:
+        cursor = conn.cursor()
+    municipality = (filters.get('municipality') or '').strip().lower()
+
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                order = dict(zip(EXPORT_COLUMNS[:9], (_json_value(value) for value in row[:9])))
+                order['items'] = row[9] or ''
+                order['municipality'] = municipality_from_address(row[10])
+                order['delivery_address'] = row[10]
+                if municipality and order['municipality'].lower() != municipality:
+                    continue
+                batch.append(order)
+            if batch:
+                yield batch
+    finally:
+        cursor.close()
+
+
+def encode_ndjson(batch):
+    return b''.join(dumps(order) + b'\n' for order in batch)
+
+
+def encode_csv(batch, header=False):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    if header:
+        writer.writeheader()
+    writer.writerows(batch)
+    return buffer.getvalue()
+
+
+def stream_export(connect, filters, export_format='ndjson', postgres=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Generator of encoded export chunks for a streaming response
+
+    Args:
+        connect: Callable returning a database connection (closed when the stream ends)
+        filters: See build_query() and iter_orders()
+        export_format: 'ndjson' or 'csv'
+    """
+    conn = connect()
+    saved_pragmas = None
+    try:
+        if not postgres:
+            saved_pragmas = [conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ('cache_size', 'mmap_size')]
+            conn.execute(f"PRAGMA cache_size = -{EXPORT_CACHE_SIZE_KB}")
+            conn.execute("PRAGMA mmap_size = 0")
+
+        if export_format == 'csv':
+            yield encode_csv([], header=True)
+        for batch in iter_orders(conn, filters, postgres, batch_size):
+            yield encode_csv(batch) if export_format == 'csv' else encode_ndjson(batch)
+    finally:
+        if postgres:
+            # End the read transaction that held the named cursor
+            conn.rollback()
+        elif saved_pragmas is not None:
+            # Pooled read connections are reused by other requests
+            conn.execute(f"PRAGMA cache_size = {saved_pragmas[0]}")
+            conn.execute(f"PRAGMA mmap_size = {saved_pragmas[1]}")
+        conn.close()
@@ -0,0 +1,217 @@
+"""
+Group-Commit Order Ingestion for AquaSphere
+Commits validated orders in small groups from a single writer thread
+
+During checkout bursts every request doing its own connect/insert/commit
+serializes on the database write lock. The writer here takes up to
+`max_batch` queued orders (or whatever arrived within `max_wait_ms` of the
+first one), writes each inside its own savepoint and commits the group once.
+Callers block until the commit returns, so the order_id they get back is
+durable. A caller that times out withdraws its order if the writer hasn't
+taken it yet, so an order reported as failed is never committed later.
+"""
+
+import time
+import queue
+import threading
+
+
+class _PendingOrder:
+    """An order waiting for the writer, with a slot for its result"""
+
+    __slots__ = ('payload', 'enqueued_at', 'done', 'result', 'error', '_lock', '_claimed', '_withdrawn')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._withdrawn = False
+
+    def claim(self):
+        """Writer side: take the order unless its caller already gave up on it"""
+        with self._lock:
+            if self._withdrawn:
+                return False
+            self._claimed = True
+            return True
+
+    def withdraw(self):
+        """Caller side: give up on the order unless the writer already took it"""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._withdrawn = True
+            return True
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that commits orders in groups
+
+    Args:
+        connect: Callable returning a new database connection
+        write: Callable (cursor, payload) -> result, run inside the group's transaction
+        postgres: True when connect() returns a PostgreSQL connection
+        max_batch: Most orders committed in one transaction
+        max_wait_ms: Longest the first order of a group waits for company
+    """
+
+    def __init__(self, connect, write, postgres=False, max_batch=32, max_wait_ms=5.0):
+        self.connect = connect
+        self.write = write
+        self.postgres = postgres
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._orders = 0
+        self._failed = 0
+        self._withdrawn = 0
+        self._commit_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._started_at = time.perf_counter()
+
+    def start(self):
+        """Start the writer thread if it isn't running"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='order-group-commit', daemon=True)
+                self._thread.start()
+
+    def submit(self, payload, timeout=30):
+        """
+        Queue an order and wait until its group is committed
+
+        Returns:
+            Whatever write returned for this payload
+
+        Raises:
+            The exception write raised for this payload, the commit
+            error for its group, or TimeoutError if the writer didn't
+            take the order within timeout seconds (it is then never written)
+        """
+        self.start()
+        pending = _PendingOrder(payload)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            if pending.withdraw():
+                raise TimeoutError('Order was not committed in time')
+            # The writer already has it: its group's commit decides the outcome
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stats(self):
+        """Throughput and latency counters since start (or the last reset)"""
+        with self._stats_lock:
+            elapsed = time.perf_counter() - self._started_at
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait_ms,
+                'batches': self._batches,
+                'orders': self._orders,
+                'failed': self._failed,
+                'withdrawn': self._withdrawn,
+                'avg_batch_size': round(self._orders / self._batches, 2) if self._batches else 0.0,
+                'avg_commit_ms': round(self._commit_seconds / self._batches * 1000, 3) if self._batches else 0.0,
+                'avg_queue_wait_ms': round(self._wait_seconds / self._orders * 1000, 3) if self._orders else 0.0,
+                'orders_per_second': round(self._orders / elapsed, 2) if elapsed > 0 else 0.0,
+                'queued': self._queue.qsize()
+            }
+
+    def reset_stats(self):
+        """Start a fresh measurement window"""
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _take(self, timeout=None):
+        """Next queued order whose caller is still waiting (raises queue.Empty on timeout)"""
+        while True:
+            pending = self._queue.get(timeout=timeout)
+            if pending.claim():
+                return pending
+            with self._stats_lock:
+                self._withdrawn += 1
+
+    def _collect(self):
+        """Block for the first order, then gather more until the batch or time cap"""
+        group = [self._take()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(group) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                group.append(self._take(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        conn = None
+        while True:
+            group = self._collect()
+            started = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = self.connect()
+                self._write_group(conn, group)
+            except Exception as e:
+                # Commit (or connection) failed: nothing in the group is durable
+                for pending in group:
+                    if not pending.done.is_set():
+                        pending.result = None
+                        pending.error = e
+                try:
+                    conn.rollback()
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+            committed = time.perf_counter()
+
+            failed = 0
+            waited = 0.0
+            for pending in group:
+                if pending.error is not None:
+                    failed += 1
+                waited += started - pending.enqueued_at
+                pending.done.set()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._orders += len(group)
+                self._failed += failed
+                self._commit_seconds += committed - started
+                self._wait_seconds += waited
+
+    def _write_group(self, conn, group):
+        """Write every order in its own savepoint, then commit once"""
+        cursor = conn.cursor()
+        if not self.postgres:
+            # Take the write lock once for the whole group; savepoints nest inside it
+            cursor.execute('BEGIN IMMEDIATE')
+
+        for pending in group:
+            cursor.execute('SAVEPOINT order_write')
+            try:
+                pending.result = self.write(cursor, pending.payload)
+                cursor.execute('RELEASE SAVEPOINT order_write')
+            except Exception as e:
+                cursor.execute('ROLLBACK TO SAVEPOINT order_write')
+                cursor.execute('RELEASE SAVEPOINT order_write')
+                pending.error = e
+
+        conn.commit()
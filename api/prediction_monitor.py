@@ -0,0 +1,545 @@
+"""
+Prediction Accuracy and Drift Monitor for AquaSphere
+Scores live delivery-time quotes against actual deliveries and watches feature drift per municipality
+
+Orders created with a quoted delivery_time_minutes get a prediction_quotes
+row in the same transaction. sync() matches quotes with the first
+'delivered' entry in order_status_history and measures the trip from the
+first dispatch entry ('shipped' or 'out_for_delivery'; the order time when
+there is none), so time spent waiting for a slot isn't counted as model
+error. The error goes into rolling windows (MAE and bias, overall and per municipality). Every quote from
+/api/python/predict-delivery also goes into per-municipality quantile
+sketches of the model's inputs. Those are compared with the training
+distribution saved in model_metadata.json using the population stability
+index (PSI).
+
+All state is bounded: fixed-size error windows, sketches with a capped
+number of bins, and a capped number of tracked municipalities. When the
+rolling error or drift crosses its threshold the alarm goes on and
+RETRAIN_COMMAND (if set) is started in the ml directory.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shlex
+import threading
+import subprocess
+from collections import deque
+from datetime import datetime
+
+# Distance and model version come from the prediction module
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml')
+sys.path.insert(0, ML_DIR)
+from predict import haversine_distance, model_version, HUB_LATITUDE, HUB_LONGITUDE
+from db import sql
+
+ML_MODEL_DIR = os.path.join(ML_DIR, 'models')
+
+# Features sketched per municipality (the training profile uses the same names)
+MONITORED_FEATURES = ['distance_km', 'time_of_order', 'day_of_week', 'order_size']
+
+# Matched quotes in the overall and per-municipality error windows
+ERROR_WINDOW = int(os.environ.get('MONITOR_ERROR_WINDOW', 500))
+MUNICIPALITY_ERROR_WINDOW = 100
+
+# Quotes per municipality before its sketches roll over; stats cover the last
+# one to two windows so old traffic ages out
+DRIFT_WINDOW = int(os.environ.get('MONITOR_DRIFT_WINDOW', 5000))
+
+# Municipalities tracked individually; the rest share the '_other' bucket
+MAX_MUNICIPALITIES = 64
+
+# Statuses marking an order as having left the hub
+DISPATCH_STATUSES = ('shipped', 'out_for_delivery')
+
+# Quotes still waiting for a delivery after this many days are no longer matched
+MATCH_HORIZON_DAYS = 14
+
+# Seconds between background matching runs
+SYNC_SECONDS = float(os.environ.get('MONITOR_SYNC_SECONDS', 300))
+
+# Alarm thresholds. The MAE limit defaults to MAE_ALARM_RATIO times the
+# training MAE and the bias limit to the training MAE; both can be set in minutes.
+MAE_ALARM_RATIO = float(os.environ.get('MONITOR_MAE_ALARM_RATIO', 1.5))
+MAE_ALARM_MINUTES = os.environ.get('MONITOR_MAE_ALARM_MINUTES')
+BIAS_ALARM_MINUTES = os.environ.get('MONITOR_BIAS_ALARM_MINUTES')
+DRIFT_ALARM_PSI = float(os.environ.get('MONITOR_DRIFT_ALARM_PSI', 0.25))
+MIN_ERROR_SAMPLES = 50
+MIN_DRIFT_SAMPLES = 200
+
+# Command started when the alarm goes on, e.g. "python train_model.py"
+RETRAIN_COMMAND = os.environ.get('RETRAIN_COMMAND')
+RETRAIN_COOLDOWN_HOURS = float(os.environ.get('MONITOR_RETRAIN_COOLDOWN_HOURS', 24))
+
+
+def _as_datetime(value):
+    """Timestamps come back as datetime from psycopg2 and as text from SQLite"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def municipality_key(municipality):
+    return str(municipality or '').strip().lower()
+
+
+def ensure_schema(cursor, postgres=False):
+    """Create the prediction_quotes table if it doesn't exist"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prediction_quotes (
+            order_id INTEGER PRIMARY KEY,
+            model_version TEXT NOT NULL,
+            municipality TEXT,
+            distance_km REAL,
+            order_size INTEGER,
+            predicted_minutes REAL NOT NULL,
+            ordered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            actual_minutes REAL,
+            matched_at TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_prediction_quotes_ordered_at ON prediction_quotes (ordered_at)")
+
+
+def record_quote(cursor, order_id, predicted_minutes, address=None, order_size=None, postgres=False,
+                 model_dir=ML_MODEL_DIR):
+    """
+    Store an order's quoted delivery time (inside the order's transaction)
+
+    Args:
+        cursor: Database cursor
+        order_id: The new order's id
+        predicted_minutes: The delivery_time_minutes the customer was quoted
+        address: Saved-address dict from address_features.parse_address(), if any
+        order_size: Bottles in the order
+    """
+    municipality = distance_km = None
+    if address is not None:
+        municipality = address.get('city')
+        distance_km = haversine_distance(HUB_LATITUDE, HUB_LONGITUDE,
+                                         float(address['latitude']), float(address['longitude']))
+    cursor.execute(sql("""
+        INSERT INTO prediction_quotes (order_id, model_version, municipality, distance_km, order_size, predicted_minutes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, postgres), (order_id, model_version(model_dir) or '', municipality, distance_km, order_size,
+                     float(predicted_minutes)))
+
+
+class QuantileSketch:
+    """
+    Streaming quantiles of non-negative values in bounded memory
+
+    Values are counted in logarithmic buckets, so every quantile is within
+    relative_accuracy of a value seen (the DDSketch scheme). Integer
+    features such as hour and weekday land in buckets of their own. When
+    there are more than max_bins buckets the lowest ones are merged.
+    """
+
+    __slots__ = ('gamma', 'log_gamma', 'max_bins', 'bins', 'zero_count', 'count')
+
+    def __init__(self, relative_accuracy=0.01, max_bins=512):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value):
+        self.count += 1
+        if value <= 1e-9:
+            self.zero_count += 1
+            return
+        key = self._key(value)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            keys = sorted(self.bins)
+            self.bins[keys[1]] += self.bins.pop(keys[0])
+
+    def merge(self, other):
+        """Add another sketch's counts to this one"""
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        while len(self.bins) > self.max_bins:
+            keys = sorted(self.bins)
+            self.bins[keys[1]] += self.bins.pop(keys[0])
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0-1), None when empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def fraction_at_most(self, value):
+        """Approximate fraction of values <= value"""
+        if not self.count:
+            return 0.0
+        if value < 0:
+            return 0.0
+        seen = self.zero_count
+        if value > 1e-9:
+            limit = self._key(value)
+            seen += sum(count for key, count in self.bins.items() if key <= limit)
+        return seen / self.count
+
+
+class RollingError:
+    """Mean absolute error and bias (predicted - actual) over the last size matched quotes"""
+
+    __slots__ = ('errors', 'total', 'total_abs')
+
+    def __init__(self, size):
+        self.errors = deque(maxlen=size)
+        self.total = 0.0
+        self.total_abs = 0.0
+
+    def add(self, error):
+        if len(self.errors) == self.errors.maxlen:
+            oldest = self.errors[0]
+            self.total -= oldest
+            self.total_abs -= abs(oldest)
+        self.errors.append(error)
+        self.total += error
+        self.total_abs += abs(error)
+
+    def to_dict(self, digits=2):
+        count = len(self.errors)
+        return {
+            'count': count,
+            'mae_minutes': round(self.total_abs / count, digits) if count else None,
+            'bias_minutes': round(self.total / count, digits) if count else None
+        }
+
+
+def psi(expected, actual, floor=1e-4):
+    """Population stability index between two lists of bin fractions"""
+    total = 0.0
+    for e, a in zip(expected, actual):
+        e = max(e, floor)
+        a = max(a, floor)
+        total += (a - e) * math.log(a / e)
+    return total
+
+
+def profile_psi(distribution, sketch):
+    """PSI of a sketch against a training distribution from train_model.build_feature_profile()"""
+    edges = distribution['edges']
+    cumulative = [sketch.fraction_at_most(edge) for edge in edges] + [1.0]
+    actual = [cumulative[0]] + [cumulative[i] - cumulative[i - 1] for i in range(1, len(cumulative))]
+    return psi(distribution['fractions'], actual)
+
+
+class PredictionMonitor:
+    """
+    Online accuracy and drift statistics for the delivery-time model
+
+    Args:
+        run_write: Callable running job(cursor) in a committed transaction (app.run_write)
+        postgres: Whether the database is PostgreSQL
+        model_dir: Directory of the model being served
+    """
+
+    def __init__(self, run_write, postgres=False, model_dir=ML_MODEL_DIR):
+        self.run_write = run_write
+        self.postgres = postgres
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self.retrain_process = None
+        self.retrain_started_at = None
+        self.last_error = None
+        self._reset(model_version(model_dir) or '')
+
+    def _reset(self, version):
+        """Start over for a newly loaded model (called with _lock held or during __init__)"""
+        self.model_version = version
+        self.errors = RollingError(ERROR_WINDOW)
+        self.municipality_errors = {}
+        self.sketches = {}
+        self.previous_sketches = {}
+        self.matched = 0
+        self.last_sync_at = None
+        self.alarm_reasons = []
+        self.alarm_since = None
+        self._loaded = False
+
+        metadata = {}
+        metadata_file = os.path.join(self.model_dir, 'model_metadata.json')
+        if os.path.exists(metadata_file):
+            with open(metadata_file) as f:
+                metadata = json.load(f)
+        self.profile = metadata.get('feature_profile') or {}
+        self.training_mae = (metadata.get('metrics') or {}).get('mae')
+
+    def start(self):
+        """Start the background matching thread if it isn't running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='prediction-monitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(SYNC_SECONDS)
+            try:
+                self.sync()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def _bucket(self, municipality):
+        """Municipality key for the sketches and error windows (called with _lock held)"""
+        key = municipality_key(municipality) or '_unknown'
+        if key in self.sketches or key in self.municipality_errors:
+            return key
+        if len(set(self.sketches) | set(self.municipality_errors)) >= MAX_MUNICIPALITIES:
+            return '_other'
+        return key
+
+    def observe_quote(self, order, predicted_minutes):
+        """
+        Add a quote's features to the drift sketches
+
+        Args:
+            order: Dict with the predict_delivery_time() arguments (distance_km
+                   is used when present, otherwise computed)
+            predicted_minutes: The model's answer
+        """
+        distance_km = order.get('distance_km')
+        if distance_km is None:
+            distance_km = haversine_distance(HUB_LATITUDE, HUB_LONGITUDE, order['latitude'], order['longitude'])
+        values = {
+            'distance_km': float(distance_km),
+            'time_of_order': order['time_of_order'],
+            'day_of_week': order['day_of_week'],
+            'order_size': order['order_size']
+        }
+        with self._lock:
+            for key in ('_all', self._bucket(order.get('municipality'))):
+                sketches = self.sketches.get(key)
+                if sketches is None:
+                    sketches = self.sketches[key] = {feature: QuantileSketch() for feature in MONITORED_FEATURES}
+                elif sketches['distance_km'].count >= DRIFT_WINDOW:
+                    # Roll over: keep the last full window for the stats and start a new one
+                    self.previous_sketches[key] = sketches
+                    sketches = self.sketches[key] = {feature: QuantileSketch() for feature in MONITORED_FEATURES}
+                for feature, value in values.items():
+                    sketches[feature].add(value)
+        self.start()
+
+    def _add_error(self, municipality, error):
+        """Called with _lock held"""
+        self.errors.add(error)
+        key = self._bucket(municipality)
+        window = self.municipality_errors.get(key)
+        if window is None:
+            window = self.municipality_errors[key] = RollingError(MUNICIPALITY_ERROR_WINDOW)
+        window.add(error)
+
+    def _match(self, cursor):
+        """Match delivered orders with their quotes; runs inside run_write()"""
+        postgres = self.postgres
+        version = model_version(self.model_dir) or ''
+        with self._lock:
+            if version != self.model_version:
+                self._reset(version)
+            load = not self._loaded
+
+        if load:
+            ensure_schema(cursor, postgres)
+            # Rebuild the error windows from quotes matched before a restart
+            cursor.execute(sql("""
+                SELECT municipality, predicted_minutes - actual_minutes
+                FROM prediction_quotes
+                WHERE model_version = ? AND actual_minutes IS NOT NULL
+                ORDER BY matched_at DESC, order_id DESC
+                LIMIT ?
+            """, postgres), (version, ERROR_WINDOW))
+            rows = cursor.fetchall()
+            with self._lock:
+                for municipality, error in reversed(rows):
+                    self._add_error(municipality, float(error))
+                self._loaded = True
+
+        horizon = ("CURRENT_TIMESTAMP - INTERVAL '%d days'" if postgres
+                   else "datetime('now', '-%d days')") % MATCH_HORIZON_DAYS
+        cursor.execute(sql(f"""
+            SELECT order_id, municipality, predicted_minutes, ordered_at, dispatched_at, delivered_at
+            FROM (
+                SELECT q.order_id, q.municipality, q.predicted_minutes, q.ordered_at,
+                       (SELECT MIN(h.created_at) FROM order_status_history h
+                        WHERE h.order_id = q.order_id AND h.status IN ({', '.join('?' for _ in DISPATCH_STATUSES)})
+                       ) AS dispatched_at,
+                       (SELECT MIN(h.created_at) FROM order_status_history h
+                        WHERE h.order_id = q.order_id AND h.status = 'delivered') AS delivered_at
+                FROM prediction_quotes q
+                WHERE q.actual_minutes IS NULL AND q.model_version = ? AND q.ordered_at >= {horizon}
+            ) pending
+            WHERE delivered_at IS NOT NULL
+        """, postgres), DISPATCH_STATUSES + (version,))
+        matches = []
+        for order_id, municipality, predicted_minutes, ordered_at, dispatched_at, delivered_at in cursor.fetchall():
+            # The model predicts the trip, so start the clock when the order left the hub
+            started_at = _as_datetime(dispatched_at) or _as_datetime(ordered_at)
+            actual_minutes = max((_as_datetime(delivered_at) - started_at).total_seconds() / 60, 0.0)
+            matches.append((order_id, municipality, float(predicted_minutes), actual_minutes))
+
+        for order_id, _, _, actual_minutes in matches:
+            cursor.execute(sql("""
+                UPDATE prediction_quotes SET actual_minutes = ?, matched_at = CURRENT_TIMESTAMP WHERE order_id = ?
+            """, postgres), (actual_minutes, order_id))
+        return matches
+
+    def sync(self):
+        """
+        Match newly delivered orders, update the rolling errors and check the alarm
+
+        Returns:
+            Number of quotes matched
+        """
+        with self._sync_lock:
+            matches = self.run_write(self._match)
+            with self._lock:
+                for _, municipality, predicted_minutes, actual_minutes in matches:
+                    self._add_error(municipality, predicted_minutes - actual_minutes)
+                self.matched += len(matches)
+                self.last_sync_at = datetime.now().isoformat()
+                self._check_alarm()
+            return len(matches)
+
+    def _limits(self):
+        mae_limit = float(MAE_ALARM_MINUTES) if MAE_ALARM_MINUTES else (
+            self.training_mae * MAE_ALARM_RATIO if self.training_mae else None)
+        bias_limit = float(BIAS_ALARM_MINUTES) if BIAS_ALARM_MINUTES else self.training_mae
+        return mae_limit, bias_limit
+
+    def _feature_sketches(self, key):
+        """Current and previous window merged (called with _lock held)"""
+        merged = {feature: QuantileSketch() for feature in MONITORED_FEATURES}
+        for generation in (self.previous_sketches.get(key), self.sketches.get(key)):
+            for feature, sketch in (generation or {}).items():
+                merged[feature].merge(sketch)
+        return merged
+
+    def _drift(self, key, sketches):
+        """PSI per feature against the municipality's training profile (overall profile if it has none)"""
+        profile = self.profile.get(key) or self.profile.get('_all')
+        if not profile:
+            return {}
+        return {feature: round(profile_psi(profile[feature], sketch), 4)
+                for feature, sketch in sketches.items() if feature in profile and sketch.count}
+
+    def _check_alarm(self):
+        """Update the alarm and start retraining when it goes on (called with _lock held)"""
+        reasons = []
+        mae_limit, bias_limit = self._limits()
+        rolling = self.errors.to_dict()
+        if rolling['count'] >= MIN_ERROR_SAMPLES:
+            if mae_limit is not None and rolling['mae_minutes'] > mae_limit:
+                reasons.append(f"rolling MAE {rolling['mae_minutes']} min is above {mae_limit:.2f}")
+            if bias_limit is not None and abs(rolling['bias_minutes']) > bias_limit:
+                reasons.append(f"rolling bias {rolling['bias_minutes']} min is beyond +/-{bias_limit:.2f}")
+        for key in self.sketches:
+            sketches = self._feature_sketches(key)
+            if sketches['distance_km'].count < MIN_DRIFT_SAMPLES:
+                continue
+            for feature, value in self._drift(key, sketches).items():
+                if value > DRIFT_ALARM_PSI:
+                    reasons.append(f"{key} {feature} PSI {value} is above {DRIFT_ALARM_PSI}")
+
+        if reasons and not self.alarm_reasons:
+            self.alarm_since = datetime.now().isoformat()
+        elif not reasons:
+            self.alarm_since = None
+        self.alarm_reasons = reasons
+        if reasons:
+            self._maybe_retrain()
+
+    def _maybe_retrain(self):
+        """Start RETRAIN_COMMAND unless it is running or ran within the cooldown"""
+        if not RETRAIN_COMMAND:
+            return
+        if self.retrain_process is not None and self.retrain_process.poll() is None:
+            return
+        if self.retrain_started_at is not None and time.time() - self.retrain_started_at < RETRAIN_COOLDOWN_HOURS * 3600:
+            return
+        try:
+            self.retrain_process = subprocess.Popen(shlex.split(RETRAIN_COMMAND), cwd=os.path.dirname(self.model_dir),
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.retrain_started_at = time.time()
+        except OSError as e:
+            self.last_error = f"Could not start RETRAIN_COMMAND: {e}"
+
+    def stats(self):
+        """Snapshot of the rolling accuracy, feature drift and alarm"""
+        with self._lock:
+            mae_limit, bias_limit = self._limits()
+            municipalities = {}
+            for key in sorted(set(self.sketches) | set(self.municipality_errors)):
+                sketches = self._feature_sketches(key)
+                drift = self._drift(key, sketches)
+                municipalities[key] = {
+                    'errors': self.municipality_errors[key].to_dict() if key in self.municipality_errors else None,
+                    'features': {
+                        feature: {
+                            'count': sketch.count,
+                            'p10': _round(sketch.quantile(0.1)),
+                            'p50': _round(sketch.quantile(0.5)),
+                            'p90': _round(sketch.quantile(0.9)),
+                            'psi': drift.get(feature)
+                        }
+                        for feature, sketch in sketches.items()
+                    }
+                }
+
+            retrain = None
+            if self.retrain_process is not None:
+                retrain = {
+                    'started_at': datetime.fromtimestamp(self.retrain_started_at).isoformat(),
+                    'pid': self.retrain_process.pid,
+                    'returncode': self.retrain_process.poll()
+                }
+
+            return {
+                'model_version': self.model_version,
+                'training_mae_minutes': _round(self.training_mae),
+                'errors': self.errors.to_dict(),
+                'matched': self.matched,
+                'last_sync_at': self.last_sync_at,
+                'municipalities': municipalities,
+                'alarm': {
+                    'active': bool(self.alarm_reasons),
+                    'since': self.alarm_since,
+                    'reasons': self.alarm_reasons,
+                    'thresholds': {
+                        'mae_minutes': _round(mae_limit),
+                        'bias_minutes': _round(bias_limit),
+                        'psi': DRIFT_ALARM_PSI,
+                        'min_error_samples': MIN_ERROR_SAMPLES,
+                        'min_drift_samples': MIN_DRIFT_SAMPLES
+                    }
+                },
+                'retrain_command': RETRAIN_COMMAND,
+                'retrain': retrain,
+                'last_error': self.last_error
+            }
+
+
+def _round(value, digits=2):
+    return round(value, digits) if value is not None else None
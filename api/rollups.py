@@ -0,0 +1,250 @@
+"""
+Admin Dashboard Rollups for AquaSphere
+Keeps per-day, per-status, per-municipality order aggregates up to date
+
+The order_rollups table is updated in the same transaction as order creation
+and status changes, so the dashboard reads O(days) rows instead of scanning
+every order. Run `python api/rollups.py rebuild` to backfill existing orders.
+
+Only the Python API's writes are counted incrementally. The PHP pages
+(create_order.php, cancel_order.php, admin/update_order_status.php and
+paymongo_webhook.php) change orders without touching the rollups, so the
+API rebuilds them every ROLLUPS_REBUILD_SECONDS (see app.py) and they can
+lag those pages by up to that long.
+"""
+
+import sys
+import json
+from datetime import date, datetime
+
+from db import sql, begin_write
+
+# Statuses counted as active deliveries on the dashboard
+ACTIVE_STATUSES = ('shipped', 'out_for_delivery')
+
+# Statuses shown on the dashboard even when they have no orders yet
+DASHBOARD_STATUSES = ['pending', 'preparing', 'shipped', 'out_for_delivery', 'delivered', 'cancelled', 'paid']
+
+UNKNOWN_MUNICIPALITY = 'Unknown'
+
+
+def _to_day(value):
+    """Normalize order_date values from psycopg2 (datetime) and SQLite (text) to ISO dates"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None:
+        return date.today().isoformat()
+    return str(value)[:10]
+
+
+def municipality_from_address(delivery_address):
+    """Get the municipality (city) from a delivery address dict or JSON string"""
+    address = delivery_address
+    if isinstance(address, str):
+        try:
+            address = json.loads(address)
+        except ValueError:
+            return UNKNOWN_MUNICIPALITY
+    if isinstance(address, dict) and address.get('city'):
+        return address['city']
+    return UNKNOWN_MUNICIPALITY
+
+
+def ensure_schema(cursor, postgres=False):
+    """Create the rollup table if it doesn't exist"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_rollups (
+            day DATE NOT NULL,
+            status TEXT NOT NULL,
+            municipality TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            bottles INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status, municipality)
+        )
+    """)
+
+
+def _apply(cursor, day, status, municipality, orders, revenue, bottles, postgres):
+    """Add (or subtract, with negative values) one bucket's counters"""
+    cursor.execute(sql("""
+        INSERT INTO order_rollups (day, status, municipality, order_count, revenue, bottles)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, status, municipality) DO UPDATE SET
+            order_count = order_rollups.order_count + EXCLUDED.order_count,
+            revenue = order_rollups.revenue + EXCLUDED.revenue,
+            bottles = order_rollups.bottles + EXCLUDED.bottles
+    """, postgres), (day, status, municipality, orders, revenue, bottles))
+
+
+def _order_facts(cursor, order_id, postgres):
+    """Read what an order contributes to the rollups (locks the order row, or the SQLite database)"""
+    begin_write(cursor, postgres)
+    cursor.execute(sql("""
+        SELECT o.order_date, o.status, o.delivery_address, o.total_amount,
+               (SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE order_id = o.id)
+        FROM orders o
+        WHERE o.id = ?
+    """ + (" FOR UPDATE OF o" if postgres else ""), postgres), (order_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    order_date, status, delivery_address, total_amount, bottles = row
+    return {
+        'day': _to_day(order_date),
+        'status': status or 'pending',
+        'municipality': municipality_from_address(delivery_address),
+        'revenue': float(total_amount or 0),
+        'bottles': int(bottles or 0)
+    }
+
+
+def record_order_created(cursor, order_id, postgres=False):
+    """Count a newly inserted order (call after its items are inserted, before commit)"""
+    facts = _order_facts(cursor, order_id, postgres)
+    if facts:
+        _apply(cursor, facts['day'], facts['status'], facts['municipality'],
+               1, facts['revenue'], facts['bottles'], postgres)
+
+
+def record_status_change(cursor, order_id, new_status, postgres=False):
+    """Move an order between status buckets (call before the orders UPDATE, before commit)"""
+    facts = _order_facts(cursor, order_id, postgres)
+    if not facts or facts['status'] == new_status:
+        return
+    _apply(cursor, facts['day'], facts['status'], facts['municipality'],
+           -1, -facts['revenue'], -facts['bottles'], postgres)
+    _apply(cursor, facts['day'], new_status, facts['municipality'],
+           1, facts['revenue'], facts['bottles'], postgres)
+
+
+def rebuild(cursor, postgres=False, batch_size=5000):
+    """
+    Recompute every rollup from the orders table
+
+    Orders are streamed in batches and aggregated in memory (one entry per
+    day/status/municipality), then the table is replaced in one transaction.
+    Incremental updates wait for the rebuild (the rollup table is locked
+    before orders are read), so none is lost to the DELETE.
+
+    Returns:
+        Number of orders processed
+    """
+    ensure_schema(cursor, postgres)
+    if postgres:
+        cursor.execute("LOCK TABLE order_rollups IN SHARE ROW EXCLUSIVE MODE")
+    else:
+        begin_write(cursor, postgres)
+
+    cursor.execute("""
+        SELECT o.order_date, o.status, o.delivery_address, o.total_amount,
+               COALESCE(b.bottles, 0)
+        FROM orders o
+        LEFT JOIN (
+            SELECT order_id, SUM(quantity) AS bottles FROM order_items GROUP BY order_id
+        ) b ON b.order_id = o.id
+    """)
+
+    buckets = {}
+    processed = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for order_date, status, delivery_address, total_amount, bottles in rows:
+            key = (_to_day(order_date), status or 'pending', municipality_from_address(delivery_address))
+            bucket = buckets.setdefault(key, [0, 0.0, 0])
+            bucket[0] += 1
+            bucket[1] += float(total_amount or 0)
+            bucket[2] += int(bottles or 0)
+        processed += len(rows)
+
+    cursor.execute("DELETE FROM order_rollups")
+    cursor.executemany(sql("""
+        INSERT INTO order_rollups (day, status, municipality, order_count, revenue, bottles)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, postgres), [key + tuple(bucket) for key, bucket in buckets.items()])
+
+    return processed
+
+
+def dashboard_stats(cursor, days=30, postgres=False):
+    """
+    Build dashboard numbers from the rollups
+
+    Args:
+        cursor: Database cursor
+        days: How many recent days to include in the daily series
+
+    Returns:
+        Dictionary with totals, status counts, per-municipality totals and a daily series
+    """
+    cursor.execute("""
+        SELECT day, status, municipality, order_count, revenue, bottles
+        FROM order_rollups
+        WHERE order_count != 0
+    """)
+
+    today = date.today().isoformat()
+    status_counts = {status: 0 for status in DASHBOARD_STATUSES}
+    by_municipality = {}
+    daily = {}
+    total_orders = 0
+    total_revenue = 0.0
+    today_revenue = 0.0
+    total_bottles = 0
+
+    for day, status, municipality, order_count, revenue, bottles in cursor.fetchall():
+        day = _to_day(day)
+        order_count, revenue, bottles = int(order_count), float(revenue), int(bottles)
+
+        total_orders += order_count
+        status_counts[status] = status_counts.get(status, 0) + order_count
+
+        # Revenue and bottles exclude cancelled orders, like api/admin/stats.php
+        if status == 'cancelled':
+            continue
+        total_revenue += revenue
+        total_bottles += bottles
+        if day == today:
+            today_revenue += revenue
+
+        muni = by_municipality.setdefault(municipality, {'orders': 0, 'revenue': 0.0, 'bottles': 0})
+        muni['orders'] += order_count
+        muni['revenue'] += revenue
+        muni['bottles'] += bottles
+
+        point = daily.setdefault(day, {'day': day, 'orders': 0, 'revenue': 0.0, 'bottles': 0})
+        point['orders'] += order_count
+        point['revenue'] += revenue
+        point['bottles'] += bottles
+
+    return {
+        'total_orders': total_orders,
+        'active_deliveries': sum(status_counts.get(s, 0) for s in ACTIVE_STATUSES),
+        'completed_orders': status_counts.get('delivered', 0),
+        'total_revenue': round(total_revenue, 2),
+        'today_revenue': round(today_revenue, 2),
+        'total_bottles': total_bottles,
+        'status_counts': status_counts,
+        'by_municipality': by_municipality,
+        'daily': [daily[day] for day in sorted(daily)[-days:]] if days > 0 else []
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python rollups.py rebuild")
+        sys.exit(1)
+
+    from app import get_write_connection, is_postgres
+
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    processed = rebuild(cursor, is_postgres())
+    conn.commit()
+    conn.close()
+    print(f"Rebuilt order rollups from {processed} orders")
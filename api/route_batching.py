@@ -0,0 +1,242 @@
+"""
+Route Batching Engine for AquaSphere
+Groups a day's pending orders into vehicle routes under bottle and shift limits
+"""
+
+import os
+import sys
+import json
+from datetime import date
+
+import numpy as np
+
+# Hub location and delivery time estimates come from the prediction module
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml')
+sys.path.insert(0, ML_DIR)
+from predict import HUB_LATITUDE, HUB_LONGITUDE, predict_delivery_times
+from db import sql
+
+ML_MODEL_DIR = os.path.join(ML_DIR, 'models')
+
+# Same average driving speed the fallback prediction uses (~24 km/h)
+MINUTES_PER_KM = 2.5
+
+# Minimum time spent at a stop (parking, unloading, payment)
+MIN_SERVICE_MINUTES = 5.0
+
+# Default vehicle limits
+DEFAULT_VEHICLE_CAPACITY = 200  # Water bottles per trip
+DEFAULT_SHIFT_MINUTES = 8 * 60
+
+# Hour used for delivery time estimates when planning the day's dispatch
+DISPATCH_HOUR = 8
+
+# Rows per block when building the distance matrix (bounds temporary memory)
+MATRIX_BLOCK_ROWS = 512
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_matrix(latitudes, longitudes):
+    """
+    Calculate the pairwise distance matrix between points in kilometers
+
+    Args:
+        latitudes: Sequence of latitudes in decimal degrees
+        longitudes: Sequence of longitudes in decimal degrees
+
+    Returns:
+        float32 numpy array of shape (n, n)
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    n = len(lat)
+
+    matrix = np.empty((n, n), dtype=np.float32)
+    for start in range(0, n, MATRIX_BLOCK_ROWS):
+        end = min(start + MATRIX_BLOCK_ROWS, n)
+        dlat = lat[None, :] - lat[start:end, None]
+        dlon = lon[None, :] - lon[start:end, None]
+        a = np.sin(dlat / 2) ** 2 + cos_lat[start:end, None] * cos_lat[None, :] * np.sin(dlon / 2) ** 2
+        matrix[start:end] = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    return matrix
+
+
+def _two_opt(path, travel, max_passes=20):
+    """
+    Improve a closed route (hub at both ends) with 2-opt moves
+
+    Each pass tries every segment start i and evaluates all segment ends
+    at once, applying the best improving reversal.
+    """
+    path = np.array(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(path) - 2):
+            a, b = path[i - 1], path[i]
+            c, d = path[i + 1:-1], path[i + 2:]
+            delta = travel[a, c] + travel[b, d] - travel[a, b] - travel[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-6:
+                end = i + 1 + j
+                path[i:end + 1] = path[i:end + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+def plan_routes(stops, vehicle_capacity=DEFAULT_VEHICLE_CAPACITY, shift_minutes=DEFAULT_SHIFT_MINUTES):
+    """
+    Cluster stops into vehicle routes (nearest neighbour + 2-opt)
+
+    Args:
+        stops: List of dicts with 'order_id', 'latitude', 'longitude', 'order_size'
+               and optionally 'delivery_time_minutes' (predicted hub-to-door minutes)
+        vehicle_capacity: Water bottles a vehicle carries per route
+        shift_minutes: Longest a route may take, including the return to the hub
+
+    Returns:
+        Dictionary with 'routes', 'vehicles', 'total_distance_km' and 'total_minutes'
+    """
+    if not stops:
+        return {'routes': [], 'vehicles': 0, 'total_distance_km': 0.0, 'total_minutes': 0.0}
+
+    # Index 0 is the hub, stops are 1..n
+    latitudes = [HUB_LATITUDE] + [float(s['latitude']) for s in stops]
+    longitudes = [HUB_LONGITUDE] + [float(s['longitude']) for s in stops]
+    distance = haversine_matrix(latitudes, longitudes)
+    travel = distance * MINUTES_PER_KM
+
+    sizes = np.array([0] + [int(s.get('order_size', 1)) for s in stops], dtype=np.int64)
+
+    # Time at the door = predicted delivery time minus the direct drive from the hub
+    predicted = np.array([0.0] + [
+        float(s['delivery_time_minutes']) if s.get('delivery_time_minutes') is not None else 0.0
+        for s in stops
+    ])
+    service = np.maximum(MIN_SERVICE_MINUTES, predicted - travel[0])
+    service[0] = 0.0
+    return_to_hub = travel[:, 0]
+
+    unvisited = np.ones(len(latitudes), dtype=bool)
+    unvisited[0] = False
+
+    routes = []
+    while unvisited.any():
+        current, load, elapsed = 0, 0, 0.0
+        route = []
+        while True:
+            arrival_done = elapsed + travel[current] + service
+            feasible = (unvisited
+                        & (sizes <= vehicle_capacity - load)
+                        & (arrival_done + return_to_hub <= shift_minutes))
+            if not feasible.any():
+                break
+            candidates = np.where(feasible, travel[current], np.inf)
+            nxt = int(np.argmin(candidates))
+            route.append(nxt)
+            unvisited[nxt] = False
+            load += int(sizes[nxt])
+            elapsed = float(arrival_done[nxt])
+            current = nxt
+
+        if not route:
+            # A stop that can't fit an empty vehicle still gets its own trip
+            route = [int(np.flatnonzero(unvisited)[0])]
+            unvisited[route[0]] = False
+
+        routes.append(route)
+
+    planned = []
+    total_distance = 0.0
+    total_minutes = 0.0
+    for vehicle, route in enumerate(routes, 1):
+        path = _two_opt([0] + route + [0], travel) if len(route) > 2 else np.array([0] + route + [0])
+        legs = distance[path[:-1], path[1:]]
+        route_distance = float(legs.sum())
+        route_minutes = float(legs.sum() * MINUTES_PER_KM + service[path].sum())
+        route_bottles = int(sizes[path].sum())
+
+        planned.append({
+            'vehicle': vehicle,
+            'order_ids': [stops[i - 1]['order_id'] for i in path[1:-1]],
+            'bottles': route_bottles,
+            'distance_km': round(route_distance, 2),
+            'duration_minutes': round(route_minutes, 2),
+            'over_limit': route_bottles > vehicle_capacity or route_minutes > shift_minutes
+        })
+        total_distance += route_distance
+        total_minutes += route_minutes
+
+    return {
+        'routes': planned,
+        'vehicles': len(planned),
+        'total_distance_km': round(total_distance, 2),
+        'total_minutes': round(total_minutes, 2)
+    }
+
+
+def load_pending_stops(cursor, delivery_date, postgres=False, model_dir=ML_MODEL_DIR):
+    """
+    Load a day's pending orders as routing stops
+
+    Coordinates come from the delivery address JSON saved with the order and
+    order size is the number of bottles across its items.
+
+    Returns:
+        Tuple of (stops, skipped_order_ids) where skipped orders have no coordinates
+    """
+    cursor.execute(sql("""
+        SELECT o.id, o.delivery_address, COALESCE(SUM(oi.quantity), 0)
+        FROM orders o
+        LEFT JOIN order_items oi ON o.id = oi.order_id
+        WHERE o.status = 'pending' AND o.delivery_date = ?
+        GROUP BY o.id, o.delivery_address
+        ORDER BY o.id
+    """, postgres), (delivery_date,))
+
+    day_of_week = date.fromisoformat(str(delivery_date)[:10]).weekday()
+    stops = []
+    features = []
+    skipped = []
+    for order_id, delivery_address, order_size in cursor.fetchall():
+        address = delivery_address
+        if isinstance(address, str):
+            try:
+                address = json.loads(address)
+            except ValueError:
+                address = None
+
+        if not isinstance(address, dict) or not address.get('latitude') or not address.get('longitude'):
+            skipped.append(order_id)
+            continue
+
+        latitude = float(address['latitude'])
+        longitude = float(address['longitude'])
+        order_size = int(order_size) or 1
+        stops.append({
+            'order_id': order_id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'order_size': order_size
+        })
+        features.append({
+            'latitude': latitude,
+            'longitude': longitude,
+            'municipality': address.get('city', ''),
+            'barangay': address.get('barangay', ''),
+            'postal_code': address.get('postalCode', ''),
+            'time_of_order': DISPATCH_HOUR,
+            'day_of_week': day_of_week,
+            'order_size': order_size
+        })
+
+    # One model call for the whole day instead of one per stop
+    if stops:
+        for stop, minutes in zip(stops, predict_delivery_times(features, model_dir)):
+            stop['delivery_time_minutes'] = minutes
+
+    return stops, skipped
@@ -0,0 +1,170 @@
+"""
+SQLite Backend Profile for AquaSphere
+WAL journaling, tuned pragmas, pooled read connections and a single writer
+
+Several workers writing to one SQLite file with default journaling run into
+"database is locked" errors and retry storms. This profile puts the database
+in WAL mode (readers never block the writer), hands reads to a pool of
+read-only connections and funnels every write in a process through one
+writer thread.
+
+The writer is per process: with N worker processes there are N writers,
+which still take turns on the database lock through busy_timeout. Each
+holds the lock for one grouped commit instead of one per request, which
+is what keeps the lock errors down; a single writer across processes would
+need a separate writer service.
+"""
+
+import os
+import queue
+import time
+import sqlite3
+import threading
+
+from order_ingest import GroupCommitWriter
+
+# Pragmas applied to every SQLite connection (override with environment variables)
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+
+# FULL syncs the WAL on every commit, so a committed order survives a power
+# loss or OS crash. NORMAL skips that sync and is noticeably faster for small
+# write transactions; the database stays consistent, but the last commits
+# before a power loss or OS crash can be lost (an application crash loses
+# nothing). Opt in with SQLITE_SYNCHRONOUS=NORMAL only if that is acceptable.
+SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'FULL').upper()
+if SYNCHRONOUS not in ('FULL', 'NORMAL'):
+    raise ValueError(f"SQLITE_SYNCHRONOUS must be FULL or NORMAL, not {SYNCHRONOUS!r}")
+
+DEFAULT_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
+
+
+def _enable_wal(conn):
+    """
+    Put the database in WAL mode
+
+    Switching needs an exclusive lock and SQLite doesn't wait on busy_timeout
+    for it, so workers starting together retry until the first one has done it.
+    """
+    deadline = time.monotonic() + BUSY_TIMEOUT_MS / 1000.0
+    while True:
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
+                conn.execute("PRAGMA journal_mode = WAL")
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+def configure_connection(conn, readonly=False):
+    """Apply the profile's pragmas to a connection"""
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if not readonly:
+        # journal_mode is persistent, so setting it from a writer is enough
+        _enable_wal(conn)
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def connect(db_path):
+    """Open a writable SQLite connection with the profile's pragmas"""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False)
+    return configure_connection(conn)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Read connection that goes back to its pool on close()"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+            return
+        # End any read transaction so the WAL can be checkpointed
+        self.rollback()
+        self.pool.release(self)
+
+
+class ReadPool:
+    """Bounded pool of read-only SQLite connections shared between threads"""
+
+    def __init__(self, db_path, size=DEFAULT_READ_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                               timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               check_same_thread=False, factory=PooledConnection)
+        configure_connection(conn, readonly=True)
+        conn.pool = self
+        return conn
+
+    def acquire(self, timeout=BUSY_TIMEOUT_MS / 1000.0):
+        """Get an idle connection, opening a new one while under the pool size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError('No read connection available')
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+
+def _run_job(cursor, job):
+    """Writer callback: each queued job is a callable taking the cursor"""
+    return job(cursor)
+
+
+class SingleWriterBackend:
+    """
+    SQLite backend where one thread owns all of this process's writes
+
+    Args:
+        db_path: SQLite database file
+        read_pool_size: Most read connections open at once
+        max_batch: Most write jobs committed per transaction
+        max_wait_ms: Longest a write waits for others to share its commit
+    """
+
+    def __init__(self, db_path, read_pool_size=DEFAULT_READ_POOL_SIZE, max_batch=32, max_wait_ms=1.0):
+        self.db_path = db_path
+        self.reads = ReadPool(db_path, read_pool_size)
+        self.writer = GroupCommitWriter(lambda: connect(db_path), _run_job,
+                                        max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def read_connection(self):
+        """Pooled read-only connection; close() returns it to the pool"""
+        return self.reads.acquire()
+
+    def write(self, job):
+        """Run job(cursor) on the writer thread and wait for its commit"""
+        return self.writer.submit(job)
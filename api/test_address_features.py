@@ -0,0 +1,151 @@
+"""
+Test for precomputed address features
+Checks a stored-feature hit, an unknown address, a stale model_version and the save command run by user_state_save.php
+
+Usage:
+    python api/test_address_features.py
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import address_features
+from conftest import api_database
+from generate_synthetic_data import generate_synthetic_data
+from train_model import prepare_features, train_models, save_model
+from predict import load_model, compute_address_features, predict_delivery_time_for_address, load_address_features
+
+ADDRESS = {'latitude': 14.2691, 'longitude': 121.4113, 'city': 'Santa Cruz',
+           'barangay': 'Poblacion', 'postalCode': '4009'}
+
+
+def train_small_model():
+    """Train a model on a small synthetic dataset in a temporary directory"""
+    model_dir = os.path.join(tempfile.mkdtemp(prefix='aquasphere-features-'), 'models')
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y, label_encoders, feature_cols = prepare_features(generate_synthetic_data(500))
+        model, model_type, metrics = train_models(X, y)
+        save_model(model, model_type, label_encoders, feature_cols, metrics, model_dir)
+    return model_dir
+
+
+def model_prediction(model_dir, features, time_of_order, day_of_week, order_size):
+    """What the model predicts for exactly these features"""
+    model, label_encoders, metadata = load_model(model_dir)
+    row = dict(features, time_of_order=time_of_order, day_of_week=day_of_week, order_size=order_size)
+    minutes = model.predict(np.array([[row[col] for col in metadata['feature_columns']]]))[0]
+    return round(max(20, minutes), 2)
+
+
+def test_hit_and_stale_version(api_db):
+    model_dir = train_small_model()
+    conn = api_db[1]
+
+    address_id = address_features.upsert_address_features(conn.cursor(), ADDRESS, model_dir=model_dir)
+    conn.commit()
+    stored = address_features.get_address_features(conn.cursor(), address_id)
+    fresh = compute_address_features(ADDRESS['latitude'], ADDRESS['longitude'], ADDRESS['city'],
+                                     ADDRESS['barangay'], ADDRESS['postalCode'], model_dir)
+    assert stored == fresh, (stored, fresh)
+    assert stored['model_version'] is not None
+
+    # Saving the same address again updates its row instead of adding one
+    assert address_features.upsert_address_features(conn.cursor(), dict(ADDRESS), model_dir=model_dir) == address_id
+    assert conn.execute("SELECT COUNT(*) FROM address_features").fetchone()[0] == 1
+
+    # Hit: stored encodings for the current model are used as they are, not looked up again
+    conn.execute("""
+        UPDATE address_features SET municipality_encoded = 7, barangay_encoded = 11, postal_code_encoded = 3
+        WHERE id = ?
+    """, (address_id,))
+    conn.commit()
+    tampered = address_features.get_address_features(conn.cursor(), address_id)
+    assert predict_delivery_time_for_address(tampered, 9, 2, 4, model_dir) == \
+        model_prediction(model_dir, tampered, 9, 2, 4)
+
+    # Stale: the same encodings from another model are recomputed at quote time
+    conn.execute("UPDATE address_features SET model_version = 'old' WHERE id = ?", (address_id,))
+    conn.commit()
+    stale = address_features.get_address_features(conn.cursor(), address_id)
+    assert predict_delivery_time_for_address(stale, 9, 2, 4, model_dir) == \
+        model_prediction(model_dir, fresh, 9, 2, 4)
+
+
+def test_miss(api_db):
+    conn = api_db[1]
+    assert address_features.get_address_features(conn.cursor(), 12345) is None
+
+    conn.execute("INSERT INTO users (id, username, password_hash, email) VALUES (1, 'ana', 'x', 'ana@example.com')")
+    conn.commit()
+    from app import app
+    client = app.test_client()
+    response = client.post('/api/python/predict-delivery', json={'address_id': 12345})
+    assert response.status_code == 404, response.get_json()
+
+    # A saved address is found by the id the save endpoint returned
+    response = client.put('/api/python/users/1/delivery-address', json=ADDRESS)
+    assert response.status_code == 200, response.get_json()
+    response = client.post('/api/python/predict-delivery', json={'address_id': response.get_json()['address_id']})
+    assert response.status_code == 200 and response.get_json()['success'], response.get_json()
+
+
+def test_save_command(api_db):
+    """The command user_state_save.php runs when a delivery address is saved"""
+    path, conn = api_db
+    saved = json.dumps(ADDRESS)
+    conn.execute("""
+        INSERT INTO users (id, username, password_hash, email, delivery_address)
+        VALUES (1, 'ana', 'x', 'ana@example.com', ?)
+    """, (saved,))
+    conn.commit()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'address_features.py')
+    env = {name: value for name, value in os.environ.items() if name != 'DATABASE_URL' and not name.startswith('PG')}
+
+    def save(user_id, address_json, **extra_env):
+        return subprocess.run([sys.executable, script, 'save', str(user_id), address_json], capture_output=True,
+                              text=True, env=dict(env, DATABASE_PATH=path, **extra_env), timeout=60)
+
+    result = save(1, saved)
+    assert result.returncode == 0, result.stderr
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    assert output['success'], output
+    row = conn.execute("SELECT municipality, barangay, postal_code FROM address_features WHERE id = ?",
+                       (output['address_id'],)).fetchone()
+    assert row == ('Santa Cruz', 'Poblacion', '4009'), row
+
+    # The id is written back into the saved address, so the cart can quote with it
+    address = json.loads(conn.execute("SELECT delivery_address FROM users WHERE id = 1").fetchone()[0])
+    assert address == dict(ADDRESS, address_id=output['address_id']), address
+    assert load_address_features(address['address_id'], path) == \
+        address_features.get_address_features(conn.cursor(), output['address_id'])
+
+    # A run for an address the user has since replaced doesn't overwrite the newer one
+    older = json.dumps(dict(ADDRESS, barangay='Bagumbayan'))
+    assert save(1, older).returncode == 0
+    assert json.loads(conn.execute("SELECT delivery_address FROM users WHERE id = 1").fetchone()[0]) == address
+
+    # Addresses without coordinates are rejected
+    assert save(1, json.dumps({'city': 'Santa Cruz'})).returncode == 1
+
+    # With PostgreSQL configured, a missing driver is an error, not a write to the local SQLite file
+    try:
+        import psycopg2
+    except ImportError:
+        result = save(1, saved, DATABASE_URL='postgresql://aquasphere@localhost/aquasphere')
+        assert result.returncode != 0 and 'psycopg2' in result.stderr, result.stderr
+
+
+if __name__ == '__main__':
+    for test in (test_hit_and_stale_version, test_miss, test_save_command):
+        with api_database() as db:
+            test(db)
+    print("Address feature checks passed")
@@ -0,0 +1,195 @@
+"""
+Test for the delivery slot scheduler
+Checks reservations, overflow to the next day, release and reinstatement, cancellations made outside the API,
+index refresh across workers and the order and quote APIs
+
+Usage:
+    python api/test_delivery_slots.py
+"""
+
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import api_database
+from delivery_slots import DeliverySlotScheduler, NoDeliveryCapacity
+
+DAY = date(2026, 3, 2)
+
+
+def add_orders(conn, orders=4):
+    """Insert pending orders 1..orders"""
+    for order_id in range(1, orders + 1):
+        conn.execute("INSERT INTO orders (id, user_id, total_amount, status) VALUES (?, 1, 35, 'pending')",
+                     (order_id,))
+    conn.commit()
+    return conn
+
+
+def reserved_minutes(conn, day):
+    row = conn.execute("SELECT reserved_minutes FROM delivery_slot_capacity WHERE slot_date = ?",
+                       (day.isoformat(),)).fetchone()
+    return row[0] if row else 0
+
+
+def test_reserve_and_overflow(api_db):
+    conn = add_orders(api_db[1])
+    scheduler = DeliverySlotScheduler(capacity_minutes=100)
+    scheduler.load(conn.cursor())
+
+    first = scheduler.reserve(conn.cursor(), 1, 60, DAY)
+    conn.commit()
+    scheduler.confirm(first)
+    assert first['slot_date'] == DAY.isoformat()
+    assert scheduler.remaining_minutes(first['hub_id'], DAY) == 40
+
+    # 60 more minutes don't fit on DAY, so the order moves to the next day
+    second = scheduler.reserve(conn.cursor(), 2, 60, DAY)
+    conn.commit()
+    scheduler.confirm(second)
+    assert second['slot_date'] == (DAY + timedelta(days=1)).isoformat()
+    assert reserved_minutes(conn, DAY) == 60 and reserved_minutes(conn, DAY + timedelta(days=1)) == 60
+
+    # A reservation that had to move means the index was stale, so it is reloaded before the next quote
+    assert scheduler.needs_load()
+
+    # Nothing within the horizon has room for more than a day's capacity
+    assert scheduler.reserve(conn.cursor(), 3, 150, DAY) is None
+    conn.rollback()
+
+
+def test_release_and_reinstate(api_db):
+    conn = add_orders(api_db[1])
+    scheduler = DeliverySlotScheduler(capacity_minutes=100)
+    scheduler.load(conn.cursor())
+    scheduler.confirm(scheduler.reserve(conn.cursor(), 1, 60, DAY))
+    conn.commit()
+
+    released = scheduler.release(conn.cursor(), 1)
+    conn.commit()
+    scheduler.confirm(released, released=True)
+    assert released == {'order_id': 1, 'hub_id': released['hub_id'], 'slot_date': DAY.isoformat(), 'minutes': 60.0}
+    assert reserved_minutes(conn, DAY) == 0
+    assert scheduler.remaining_minutes(released['hub_id'], DAY) == 100
+
+    # A second cancellation (e.g. a racing request) has nothing left to give back
+    assert scheduler.release(conn.cursor(), 1) is None
+    assert reserved_minutes(conn, DAY) == 0
+
+    # Another order takes most of the day, so the reinstated order moves to the next one
+    scheduler.confirm(scheduler.reserve(conn.cursor(), 2, 80, DAY))
+    reinstated = scheduler.reinstate(conn.cursor(), 1, today=DAY)
+    conn.commit()
+    assert reinstated['slot_date'] == (DAY + timedelta(days=1)).isoformat() and reinstated['minutes'] == 60
+    assert scheduler.reinstate(conn.cursor(), 1, today=DAY) is None
+    assert scheduler.release(conn.cursor(), 1) is not None
+    conn.commit()
+
+    # With every day full, reinstating fails and the transaction is rolled back
+    scheduler.reserve(conn.cursor(), 3, 80, DAY + timedelta(days=1))
+    conn.commit()
+    small = DeliverySlotScheduler(capacity_minutes=100, horizon_days=1)
+    try:
+        small.reinstate(conn.cursor(), 1, today=DAY)
+        assert False, 'expected NoDeliveryCapacity'
+    except NoDeliveryCapacity:
+        conn.rollback()
+    assert conn.execute("SELECT released_at IS NOT NULL FROM delivery_slot_reservations WHERE order_id = 1").fetchone() == (1,)
+
+
+def test_cancelled_outside_the_api(api_db):
+    conn = add_orders(api_db[1])
+    scheduler = DeliverySlotScheduler(capacity_minutes=100)
+    scheduler.load(conn.cursor())
+    scheduler.confirm(scheduler.reserve(conn.cursor(), 1, 90, DAY))
+    conn.commit()
+
+    # cancel_order.php only flips the status; the index agrees with the counter reserve() checks
+    conn.execute("UPDATE orders SET status = 'cancelled' WHERE id = 1")
+    conn.commit()
+    scheduler.load(conn.cursor())
+    assert scheduler.remaining_minutes('san-pablo', DAY) == 10
+
+    # The next reload gives the cancelled order's minutes back, so DAY is quoted and booked again
+    assert scheduler.release_cancelled(conn.cursor()) == 1
+    assert scheduler.release_cancelled(conn.cursor()) == 0
+    conn.commit()
+    scheduler.load(conn.cursor())
+    assert scheduler.remaining_minutes('san-pablo', DAY) == 100
+    reservation = scheduler.reserve(conn.cursor(), 2, 60, DAY)
+    conn.commit()
+    assert reservation['slot_date'] == DAY.isoformat()
+    assert not scheduler.needs_load()
+
+
+def test_index_refresh_between_workers(api_db):
+    conn = add_orders(api_db[1])
+    worker_a = DeliverySlotScheduler(capacity_minutes=100, refresh_seconds=3600)
+    worker_b = DeliverySlotScheduler(capacity_minutes=100, refresh_seconds=0)
+    worker_a.load(conn.cursor())
+    worker_b.load(conn.cursor())
+
+    worker_a.confirm(worker_a.reserve(conn.cursor(), 1, 90, DAY))
+    conn.commit()
+    assert not worker_a.needs_load()
+
+    # Worker B doesn't see A's reservation until it reloads
+    assert worker_b.remaining_minutes('san-pablo', DAY) == 100
+    assert worker_b.needs_load()
+    worker_b.load(conn.cursor())
+    assert worker_b.remaining_minutes('san-pablo', DAY) == 10
+
+
+def test_order_api(api_db):
+    conn = api_db[1]
+    from app import app, slot_scheduler
+    client = app.test_client()
+    order = {'user_id': 1, 'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 2}],
+             'delivery_address': json.dumps({'latitude': 14.07, 'longitude': 121.32, 'city': 'San Pablo City'})}
+
+    for bad in ('soon', '', -5, [60]):
+        response = client.post('/api/python/orders', json=dict(order, delivery_time_minutes=bad))
+        assert response.status_code == 400, (bad, response.get_json())
+
+    response = client.post('/api/python/orders', json=dict(order, delivery_time_minutes=60))
+    assert response.status_code == 200, response.get_json()
+    order_id = response.get_json()['order_id']
+    slot_date = response.get_json()['delivery_slot']
+
+    def reserved():
+        return sum(row[0] for row in conn.execute("SELECT reserved_minutes FROM delivery_slot_capacity"))
+
+    assert reserved() == 60
+    for status, expected in (('cancelled', 0), ('cancelled', 0), ('pending', 60), ('preparing', 60)):
+        response = client.put(f'/api/python/orders/{order_id}/status', json={'status': status})
+        assert response.status_code == 200, response.get_json()
+        assert reserved() == expected, (status, reserved())
+    assert slot_scheduler.remaining_minutes('san-pablo', date.fromisoformat(slot_date)) == \
+        slot_scheduler.capacity_minutes - 60
+
+    # Quotes offer the earliest day with capacity, not just the model's date range
+    quote = {'latitude': 14.07, 'longitude': 121.32, 'order_size': 2}
+    first = client.post('/api/python/predict-delivery', json=quote).get_json()
+    assert first['success'], first
+    conn.execute("UPDATE delivery_slot_capacity SET reserved_minutes = capacity_minutes WHERE slot_date = ?",
+                 (first['delivery_slot'],))
+    conn.execute("""
+        INSERT OR IGNORE INTO delivery_slot_capacity (hub_id, slot_date, capacity_minutes, reserved_minutes)
+        VALUES ('san-pablo', ?, 100, 100)
+    """, (first['delivery_slot'],))
+    conn.commit()
+    slot_scheduler.loaded_at = None
+    second = client.post('/api/python/predict-delivery', json=quote).get_json()
+    assert second['delivery_slot'] > first['delivery_slot'], (first, second)
+    assert second['delivery_start_date'] > first['delivery_start_date']
+
+
+if __name__ == '__main__':
+    for test in (test_reserve_and_overflow, test_release_and_reinstate, test_cancelled_outside_the_api,
+                 test_index_refresh_between_workers, test_order_api):
+        with api_database() as db:
+            test(db)
+    print("Delivery slot checks passed")
@@ -0,0 +1,73 @@
+"""
+Test for order status event ids and Last-Event-ID replay
+Checks that event ids come from the database, so a client reconnecting to a different worker gets exactly what it missed
+
+Usage:
+    python api/test_order_events.py
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import order_events
+from conftest import api_database
+
+
+def parse_frames(chunk):
+    """(id, event) for each event frame in a text/event-stream chunk"""
+    events = []
+    for frame in chunk.split(b'\n\n'):
+        lines = dict(line.split(b': ', 1) for line in frame.split(b'\n') if b': ' in line)
+        if b'id' in lines:
+            events.append((int(lines[b'id']), json.loads(lines[b'data'])))
+    return events
+
+
+def test_replay_on_another_worker(api_db):
+    path, conn = api_db
+
+    # "Worker A" is the app in this process
+    from app import app, order_event_bus
+    client = app.test_client()
+    a_stream = order_events.stream(order_event_bus, user_id=7, heartbeat=0.01)
+    next(a_stream)
+
+    order_id = client.post('/api/python/orders', json={
+        'user_id': 7, 'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 1}]}).get_json()['order_id']
+    client.post('/api/python/orders', json={'user_id': 8, 'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 1}]})
+    for status in ('preparing', 'shipped', 'delivered'):
+        assert client.put(f'/api/python/orders/{order_id}/status', json={'status': status}).status_code == 200
+
+    seen = parse_frames(next(a_stream))
+    a_stream.close()
+    assert [event['status'] for _, event in seen] == ['pending', 'preparing', 'shipped', 'delivered']
+    stored = [row[0] for row in conn.execute("SELECT id FROM order_events WHERE user_id = 7 ORDER BY id")]
+    assert [event_id for event_id, _ in seen] == stored
+
+    # The client saw the first two events, then reconnects to "worker B" (its own bus, same database)
+    def replay(last_event_id, user_id):
+        reader = sqlite3.connect(path)
+        try:
+            return order_events.load_since(reader.cursor(), last_event_id, user_id)
+        finally:
+            reader.close()
+
+    other_bus = order_events.OrderEventBus()
+    b_stream = order_events.stream(other_bus, user_id=7, last_event_id=seen[1][0], replay=replay, heartbeat=0.01)
+    assert next(b_stream).startswith(b'retry:')
+    assert parse_frames(next(b_stream)) == seen[2:]
+
+    # A live event already sent during the replay isn't sent twice
+    other_bus.publish(seen[3][1])
+    assert next(b_stream) == b': keep-alive\n\n'
+    b_stream.close()
+
+
+if __name__ == '__main__':
+    with api_database() as db:
+        test_replay_on_another_worker(db)
+    print("Order event replay checks passed")
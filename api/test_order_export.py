@@ -0,0 +1,144 @@
+"""
+Memory test for the streaming order export
+Exports a large synthetic order table through the API and checks RSS stays under a fixed ceiling
+
+Usage:
+    python api/test_order_export.py [rows] [rss_ceiling_mb]    (default: 1000000 64)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import create_schema, random_address, PRODUCTS, SEED_STATUSES
+
+DEFAULT_ROWS = 1_000_000
+DEFAULT_RSS_CEILING_MB = 64
+
+
+def current_rss_mb():
+    """Resident set size of this process right now (Linux)"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def seed_orders(path, rows):
+    """Bulk-insert synthetic orders with one or two items each"""
+    rng = random.Random(7)
+    addresses = [json.dumps(random_address(rng)) for _ in range(500)]
+    statuses = [status for status, _ in SEED_STATUSES]
+    weights = [weight for _, weight in SEED_STATUSES]
+    start = datetime(2026, 1, 1)
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    create_schema(cursor)
+
+    def orders():
+        for order_id in range(1, rows + 1):
+            # Spread the orders over 2026
+            order_date = start + timedelta(minutes=order_id * 525599 // rows)
+            yield (order_id, order_id % 5000 + 1, order_date.strftime('%Y-%m-%d %H:%M:%S'),
+                   addresses[order_id % len(addresses)], 35.0 * (order_id % 10 + 1), 'COD',
+                   rng.choices(statuses, weights)[0])
+
+    def items():
+        for order_id in range(1, rows + 1):
+            for name, price in PRODUCTS[:1 + order_id % 2]:
+                yield (order_id, name, price, order_id % 10 + 1, price * (order_id % 10 + 1))
+
+    cursor.executemany("""
+        INSERT INTO orders (id, user_id, order_date, delivery_address, total_amount, payment_method, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, orders())
+    cursor.executemany("""
+        INSERT INTO order_items (order_id, product_name, product_price, quantity, subtotal)
+        VALUES (?, ?, ?, ?, ?)
+    """, items())
+    conn.commit()
+    conn.close()
+
+
+def export(client, query):
+    """
+    Stream an export and count its lines
+
+    Returns:
+        Tuple of (lines, bytes, seconds, peak RSS growth in MB)
+    """
+    baseline = current_rss_mb()
+    peak = baseline
+    lines = 0
+    size = 0
+    started = time.perf_counter()
+
+    response = client.get(f"/api/python/orders/export?{query}", buffered=False)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    for chunk in response.iter_encoded():
+        lines += chunk.count(b'\n')
+        size += len(chunk)
+        peak = max(peak, current_rss_mb())
+    response.close()
+
+    return lines, size, time.perf_counter() - started, peak - baseline
+
+
+def expected_count(path, where, params=()):
+    conn = sqlite3.connect(path)
+    count = conn.execute(f"SELECT COUNT(*) FROM orders WHERE {where}", params).fetchone()[0]
+    conn.close()
+    return count
+
+
+def run_test(rows, ceiling_mb):
+    path = os.path.join(tempfile.mkdtemp(prefix='aquasphere-export-'), 'export.db')
+    os.environ['DATABASE_PATH'] = path
+
+    print("=" * 72)
+    print(f"Streaming Order Export Test ({rows:,} orders, RSS ceiling {ceiling_mb} MB)")
+    print("=" * 72)
+
+    started = time.perf_counter()
+    seed_orders(path, rows)
+    print(f"Seeded {rows:,} orders in {time.perf_counter() - started:.1f}s")
+
+    from app import app
+    client = app.test_client()
+    # Warm up lazy imports and caches so they aren't counted as export growth
+    export(client, 'format=ndjson&date_to=2026-01-01')
+
+    cases = [
+        ('ndjson, all orders', 'format=ndjson', rows),
+        ('csv, all orders', 'format=csv', rows + 1),
+        ('ndjson, delivered in March', 'format=ndjson&status=delivered&date_from=2026-03-01&date_to=2026-03-31',
+         expected_count(path, "status = 'delivered' AND order_date >= '2026-03-01' AND order_date < '2026-04-01'")),
+        ('csv, Calamba', 'format=csv&municipality=calamba',
+         expected_count(path, "json_extract(delivery_address, '$.city') = 'Calamba'") + 1)
+    ]
+
+    print(f"{'export':<30} {'lines':>10} {'MB':>8} {'seconds':>8} {'RSS +MB':>8}  result")
+    failures = 0
+    for name, query, expected_lines in cases:
+        lines, size, seconds, growth = export(client, query)
+        ok = lines == expected_lines and growth <= ceiling_mb
+        failures += not ok
+        detail = 'ok' if ok else f"FAILED (expected {expected_lines} lines, ceiling {ceiling_mb} MB)"
+        print(f"{name:<30} {lines:>10} {size / 1024 ** 2:>8.1f} {seconds:>8.1f} {growth:>8.1f}  {detail}")
+
+    print("=" * 72)
+    print("Test completed!" if not failures else f"{failures} export(s) failed")
+    print("=" * 72)
+    return failures == 0
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    ceiling_mb = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RSS_CEILING_MB
+    sys.exit(0 if run_test(rows, ceiling_mb) else 1)
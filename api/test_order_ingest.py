@@ -0,0 +1,110 @@
+"""
+Test for group-commit order ingestion
+Checks that one failing order doesn't fail its group and that timed-out orders are never committed later
+
+Usage:
+    python api/test_order_ingest.py
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from order_ingest import GroupCommitWriter
+
+
+def open_database():
+    path = os.path.join(tempfile.mkdtemp(prefix='aquasphere-ingest-'), 'ingest.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, reference TEXT NOT NULL)")
+    conn.execute("CREATE TABLE order_items (order_id INTEGER NOT NULL, quantity INTEGER NOT NULL CHECK (quantity > 0))")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def write_order(cursor, payload):
+    """Insert an order and its items; a bad item fails after the order row is written"""
+    cursor.execute("INSERT INTO orders (reference) VALUES (?)", (payload['reference'],))
+    order_id = cursor.lastrowid
+    for quantity in payload['quantities']:
+        cursor.execute("INSERT INTO order_items (order_id, quantity) VALUES (?, ?)", (order_id, quantity))
+    return order_id
+
+
+def references(path):
+    conn = sqlite3.connect(path)
+    rows = [row[0] for row in conn.execute("SELECT reference FROM orders ORDER BY id")]
+    conn.close()
+    return rows
+
+
+def test_failed_order_does_not_fail_its_group(orders=8):
+    path = open_database()
+    # A long wait so every order lands in the same group
+    writer = GroupCommitWriter(lambda: sqlite3.connect(path, check_same_thread=False), write_order,
+                               max_batch=orders, max_wait_ms=500)
+    results = {}
+    barrier = threading.Barrier(orders)
+
+    def submit(n):
+        payload = {'reference': f'order-{n}', 'quantities': [2, 0 if n == 3 else 1]}
+        barrier.wait()
+        try:
+            results[n] = writer.submit(payload)
+        except sqlite3.IntegrityError as e:
+            results[n] = e
+
+    threads = [threading.Thread(target=submit, args=(n,)) for n in range(orders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = writer.stats()
+    assert stats['batches'] == 1 and stats['orders'] == orders and stats['failed'] == 1, stats
+    assert isinstance(results[3], sqlite3.IntegrityError)
+    assert all(isinstance(results[n], int) for n in range(orders) if n != 3), results
+    # The failed order's savepoint took its order row with it; the rest committed
+    assert sorted(references(path)) == sorted(f'order-{n}' for n in range(orders) if n != 3)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM order_items").fetchone()[0] == 2 * (orders - 1)
+    conn.close()
+
+
+def test_timed_out_order_is_never_committed():
+    path = open_database()
+    unblock = threading.Event()
+
+    def slow_write(cursor, payload):
+        if payload['reference'] == 'slow':
+            unblock.wait()
+        return write_order(cursor, payload)
+
+    writer = GroupCommitWriter(lambda: sqlite3.connect(path, check_same_thread=False), slow_write,
+                               max_batch=1, max_wait_ms=0)
+    slow = threading.Thread(target=writer.submit, args=({'reference': 'slow', 'quantities': [1]},))
+    slow.start()
+
+    # The writer is busy with the slow order, so this one times out while still queued
+    try:
+        writer.submit({'reference': 'late', 'quantities': [1]}, timeout=0.1)
+        assert False, 'expected TimeoutError'
+    except TimeoutError:
+        pass
+
+    unblock.set()
+    slow.join()
+    writer.submit({'reference': 'after', 'quantities': [1]})
+    assert references(path) == ['slow', 'after']
+    assert writer.stats()['withdrawn'] == 1
+
+
+if __name__ == '__main__':
+    test_failed_order_does_not_fail_its_group()
+    test_timed_out_order_is_never_committed()
+    print("Group commit checks passed")
@@ -0,0 +1,204 @@
+"""
+Test for the prediction accuracy and drift monitor
+Checks sketch accuracy and memory, quote matching through the API, the drift PSI and the retraining alarm
+
+Usage:
+    python api/test_prediction_monitor.py
+"""
+
+import os
+import sys
+import json
+import random
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import prediction_monitor
+from conftest import api_database
+from prediction_monitor import PredictionMonitor, QuantileSketch, MONITORED_FEATURES
+from load_test import create_schema, random_address
+from train_model import build_feature_profile
+from predict import haversine_distance, HUB_LATITUDE, HUB_LONGITUDE
+
+
+def test_sketch():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(mean=3, sigma=1, size=200_000)
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    worst = max(abs(sketch.quantile(q) - np.quantile(values, q)) / np.quantile(values, q)
+                for q in (0.01, 0.1, 0.5, 0.9, 0.99))
+    assert worst < 0.02, f"quantiles off by {worst:.4f}"
+
+    # Integer features get one bucket per value, so they are counted exactly
+    hours = rng.integers(0, 24, size=50_000)
+    sketch = QuantileSketch()
+    for hour in hours:
+        sketch.add(int(hour))
+    assert all(abs(sketch.fraction_at_most(h) - np.mean(hours <= h)) < 1e-9 for h in range(24))
+
+    # Values spanning twelve orders of magnitude need more buckets than the cap
+    sketch = QuantileSketch(max_bins=512)
+    for value in 10 ** rng.uniform(-6, 6, size=100_000):
+        sketch.add(value)
+    assert len(sketch.bins) <= 512, f"{len(sketch.bins)} buckets"
+
+
+def test_matching(api_db):
+    conn = api_db[1]
+    from app import app, run_write
+    # Alarm settings are read at import, so set them on the module (and put them back afterwards)
+    alarm_settings = prediction_monitor.MAE_ALARM_MINUTES, prediction_monitor.RETRAIN_COMMAND
+    prediction_monitor.MAE_ALARM_MINUTES = '20'
+    prediction_monitor.RETRAIN_COMMAND = f'"{sys.executable}" -c "pass"'
+    try:
+        check_matching(app, run_write, conn)
+    finally:
+        prediction_monitor.MAE_ALARM_MINUTES, prediction_monitor.RETRAIN_COMMAND = alarm_settings
+
+
+def check_matching(app, run_write, conn):
+    """Body of test_matching(), run with its alarm settings in place"""
+    client = app.test_client()
+    rng = random.Random(5)
+
+    def place_orders(count, late_by):
+        """
+        Create quoted orders and record them as delivered late_by(n) minutes after
+        the quoted trip. Most orders wait hours for dispatch first, which must not
+        count as error; every third one has no dispatch entry and is timed from the order.
+        """
+        for n in range(count):
+            response = client.post('/api/python/orders', json={
+                'user_id': 1 + n % 20,
+                'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 2}],
+                'delivery_address': json.dumps(random_address(rng)),
+                'delivery_time_minutes': 60
+            }).get_json()
+            assert response['success'], response
+            queued = 0 if n % 3 == 0 else 180
+            history = [('delivered', queued + 60 + late_by(n))]
+            if queued:
+                history += [('shipped', queued), ('out_for_delivery', queued + 10)]
+            for status, minutes in history:
+                conn.execute("""
+                    INSERT INTO order_status_history (order_id, user_id, status, created_at)
+                    SELECT order_id, 1, ?, datetime(ordered_at, ?) FROM prediction_quotes WHERE order_id = ?
+                """, (status, f"+{minutes} minutes", response['order_id']))
+            conn.commit()
+
+    # Half five minutes early, half five minutes late: MAE 5, no bias
+    place_orders(60, lambda n: 5 if n % 2 else -5)
+    monitor = client.get('/api/python/predict-delivery/monitor').get_json()['monitor']
+    assert monitor['matched'] == 60, monitor['matched']
+    assert monitor['errors']['mae_minutes'] == 5.0 and monitor['errors']['bias_minutes'] == 0.0, monitor['errors']
+    assert not monitor['alarm']['active'], monitor['alarm']['reasons']
+
+    # Deliveries start running 40 minutes late: (60 * 5 + 100 * 40) / 160 = 26.88 minutes MAE
+    place_orders(100, lambda n: 40)
+    monitor = client.get('/api/python/predict-delivery/monitor').get_json()['monitor']
+    assert monitor['errors']['mae_minutes'] == 26.88 and monitor['errors']['bias_minutes'] == -25.0, monitor['errors']
+    assert monitor['alarm']['active']
+    assert monitor['retrain'] is not None
+
+    # A second sync matches nothing new, and a restarted monitor rebuilds its window from the table
+    again = client.get('/api/python/predict-delivery/monitor').get_json()['monitor']
+    assert again['errors'] == monitor['errors']
+    restarted = PredictionMonitor(run_write, False, prediction_monitor.ML_MODEL_DIR)
+    restarted.sync()
+    assert restarted.stats()['errors'] == monitor['errors']
+
+
+def test_lifecycle_through_api(api_db):
+    """An order created and moved to delivered only through the Python API is scored"""
+    conn = api_db[1]
+    from app import app, accuracy_monitor
+    client = app.test_client()
+    order_id = client.post('/api/python/orders', json={
+        'user_id': 1,
+        'items': [{'name': 'Round Gallon', 'price': 35, 'quantity': 2}],
+        'delivery_address': json.dumps(random_address(random.Random(3))),
+        'delivery_time_minutes': 60
+    }).get_json()['order_id']
+    for status in ('preparing', 'shipped', 'delivered'):
+        assert client.put(f'/api/python/orders/{order_id}/status', json={'status': status}).status_code == 200
+
+    history = [row[0] for row in conn.execute(
+        "SELECT status FROM order_status_history WHERE order_id = ? ORDER BY id", (order_id,))]
+    assert history == ['preparing', 'shipped', 'delivered'], history
+    assert accuracy_monitor.sync() == 1
+    # Shipped and delivered within the same second: the whole 60 minute quote is error
+    assert 59 <= accuracy_monitor.stats()['errors']['bias_minutes'] <= 60
+
+
+def random_quote(rng, hours=range(24), bottles=(1, 50)):
+    address = random_address(rng)
+    return {
+        'latitude': address['latitude'],
+        'longitude': address['longitude'],
+        'municipality': address['city'],
+        'time_of_order': rng.choice(hours),
+        'day_of_week': rng.randint(0, 6),
+        'order_size': rng.randint(*bottles)
+    }
+
+
+def test_drift():
+    work_dir = tempfile.mkdtemp(prefix='aquasphere-drift-')
+    rng = random.Random(9)
+    training = pd.DataFrame([random_quote(rng) for _ in range(20_000)])
+    training['distance_km'] = [haversine_distance(HUB_LATITUDE, HUB_LONGITUDE, lat, lon)
+                               for lat, lon in zip(training['latitude'], training['longitude'])]
+    model_dir = os.path.join(work_dir, 'models')
+    os.makedirs(model_dir)
+    with open(os.path.join(model_dir, 'model_metadata.json'), 'w') as f:
+        json.dump({'metrics': {'mae': 5.0}, 'feature_profile': build_feature_profile(training)}, f)
+
+    db = sqlite3.connect(os.path.join(work_dir, 'drift.db'), check_same_thread=False)
+    create_schema(db.cursor())
+
+    def run_write(job):
+        result = job(db.cursor())
+        db.commit()
+        return result
+
+    def observe(monitor, quotes):
+        for quote in quotes:
+            monitor.observe_quote(quote, 60.0)
+        monitor.sync()
+        return monitor.stats()
+
+    steady = observe(PredictionMonitor(run_write, False, model_dir), [random_quote(rng) for _ in range(5000)])
+    worst = max(feature['psi'] for feature in steady['municipalities']['_all']['features'].values())
+    assert worst < 0.1, f"same distribution, worst PSI {worst}"
+    assert not steady['alarm']['active'], steady['alarm']['reasons']
+
+    # Evening-only, bulk orders
+    shifted = observe(PredictionMonitor(run_write, False, model_dir),
+                      [random_quote(rng, hours=range(18, 24), bottles=(40, 120)) for _ in range(5000)])
+    features = shifted['municipalities']['_all']['features']
+    assert features['time_of_order']['psi'] > 0.25 and features['order_size']['psi'] > 0.25, features
+    assert features['distance_km']['psi'] < 0.1, features['distance_km']
+    assert any('PSI' in reason for reason in shifted['alarm']['reasons'])
+    # One sketch per feature and municipality
+    assert all(len(m['features']) == len(MONITORED_FEATURES) for m in shifted['municipalities'].values())
+    db.close()
+
+
+if __name__ == '__main__':
+    test_sketch()
+    print("Quantile sketch: ok")
+    with api_database() as db:
+        test_matching(db)
+    print("Quote matching through the API: ok")
+    with api_database() as db:
+        test_lifecycle_through_api(db)
+    print("Order lifecycle through the API: ok")
+    test_drift()
+    print("Feature drift: ok")
@@ -0,0 +1,102 @@
+"""
+Consistency test for the dashboard rollups
+Runs concurrent status updates through the API and checks the incremental rollups match a full rebuild,
+and that orders written by the PHP pages are counted after the scheduled rebuild
+
+Usage:
+    python api/test_rollups.py
+"""
+
+import os
+import sys
+import random
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rollups
+from conftest import api_database
+from load_test import seed
+
+STATUSES = ['pending', 'preparing', 'shipped', 'out_for_delivery', 'delivered', 'cancelled']
+
+
+def rollup_rows(conn):
+    return sorted(conn.execute("""
+        SELECT day, status, municipality, order_count, ROUND(revenue, 2), bottles
+        FROM order_rollups WHERE order_count != 0
+    """).fetchall())
+
+
+def test_concurrent_status_updates_match_rebuild(api_db, threads=16, updates_per_thread=60, orders=20):
+    conn = api_db[1]
+    dataset = seed(conn, False, users=10, orders=orders, rng=random.Random(3))
+
+    from app import app
+    # Few orders, many writers: updates to the same order race each other
+    barrier = threading.Barrier(threads)
+    failures = []
+
+    def update(seed_value):
+        client = app.test_client()
+        rng = random.Random(seed_value)
+        barrier.wait()
+        for _ in range(updates_per_thread):
+            response = client.put(f"/api/python/orders/{rng.choice(dataset['order_ids'])}/status",
+                                  json={'status': rng.choice(STATUSES)})
+            if response.status_code != 200:
+                failures.append(response.get_json())
+
+    workers = [threading.Thread(target=update, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not failures, failures[:3]
+
+    incremental = rollup_rows(conn)
+    assert all(row[3] >= 0 for row in incremental), [row for row in incremental if row[3] < 0]
+    rollups.rebuild(conn.cursor())
+    conn.commit()
+    assert incremental == rollup_rows(conn)
+
+
+def test_php_writes_show_up_after_rebuild(api_db):
+    """Orders changed by the PHP pages (plain SQL, no rollup update) are counted after the next rebuild"""
+    conn = api_db[1]
+    dataset = seed(conn, False, users=5, orders=10, rng=random.Random(4))
+
+    import app as app_module
+    client = app_module.app.test_client()
+
+    def total_orders():
+        response = client.get('/api/python/admin/stats')
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['stats']['total_orders']
+
+    # The first dashboard read in a worker rebuilds, which also backfills
+    assert total_orders() == 10
+
+    # What cancel_order.php and create_order.php do
+    conn.execute("UPDATE orders SET status = 'cancelled' WHERE id = ?", (dataset['order_ids'][0],))
+    conn.execute("INSERT INTO orders (user_id, total_amount, status) VALUES (?, 35, 'pending')",
+                 (next(iter(dataset['users'])),))
+    conn.commit()
+    assert total_orders() == 10
+
+    # Once the interval has passed, the dashboard matches the orders table again
+    app_module._rollups_rebuilt_at -= app_module.ROLLUPS_REBUILD_SECONDS
+    assert total_orders() == 11
+    expected = rollup_rows(conn)
+    rollups.rebuild(conn.cursor())
+    conn.commit()
+    assert rollup_rows(conn) == expected
+
+
+if __name__ == '__main__':
+    with api_database() as db:
+        test_concurrent_status_updates_match_rebuild(db)
+    print("Rollups match a full rebuild after concurrent status updates")
+    with api_database() as db:
+        test_php_writes_show_up_after_rebuild(db)
+    print("Orders written by the PHP pages are counted after the scheduled rebuild")
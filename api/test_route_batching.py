@@ -0,0 +1,97 @@
+"""
+Test for the route batching engine
+Checks that planned routes respect the bottle and shift limits, flag oversized stops and are improved by 2-opt
+
+Usage:
+    python api/test_route_batching.py
+"""
+
+import os
+import sys
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from route_batching import plan_routes, haversine_matrix, _two_opt, MINUTES_PER_KM, MIN_SERVICE_MINUTES
+from load_test import random_address
+from predict import HUB_LATITUDE, HUB_LONGITUDE
+
+
+def random_stops(count, seed=7):
+    rng = random.Random(seed)
+    stops = []
+    for order_id in range(1, count + 1):
+        address = random_address(rng)
+        stops.append({'order_id': order_id, 'latitude': address['latitude'], 'longitude': address['longitude'],
+                      'order_size': rng.randint(1, 40), 'delivery_time_minutes': rng.uniform(30, 90)})
+    return stops
+
+
+def route_length(path, latitudes, longitudes):
+    distance = haversine_matrix(latitudes, longitudes)
+    return float(distance[path[:-1], path[1:]].sum())
+
+
+def test_routes_stay_within_limits():
+    stops = random_stops(300)
+    plan = plan_routes(stops, vehicle_capacity=120, shift_minutes=240)
+    sizes = {stop['order_id']: stop['order_size'] for stop in stops}
+
+    assigned = [order_id for route in plan['routes'] for order_id in route['order_ids']]
+    assert sorted(assigned) == sorted(sizes), 'every stop is on exactly one route'
+    assert plan['vehicles'] == len(plan['routes']) > 1
+
+    flagged = 0
+    for route in plan['routes']:
+        assert route['bottles'] == sum(sizes[order_id] for order_id in route['order_ids'])
+        if route['over_limit']:
+            # Only a stop that doesn't fit an empty vehicle goes over, and it travels alone
+            assert len(route['order_ids']) == 1 and route['duration_minutes'] > 240, route
+            flagged += 1
+            continue
+        assert route['bottles'] <= 120, route
+        assert route['duration_minutes'] <= 240, route
+    assert flagged < plan['vehicles'] // 2
+    assert abs(plan['total_minutes'] - sum(route['duration_minutes'] for route in plan['routes'])) < 0.01 * plan['vehicles']
+
+    # The same input always gives the same plan
+    assert plan_routes(stops, vehicle_capacity=120, shift_minutes=240) == plan
+
+
+def test_route_duration_and_oversized_stop():
+    # A single stop: out and back at the fallback speed, plus the minimum service time
+    stop = {'order_id': 1, 'latitude': 14.2, 'longitude': 121.4, 'order_size': 300}
+    distance = haversine_matrix([HUB_LATITUDE, 14.2], [HUB_LONGITUDE, 121.4])[0, 1]
+    plan = plan_routes([stop], vehicle_capacity=200)
+    route = plan['routes'][0]
+    assert route['distance_km'] == round(float(distance) * 2, 2)
+    assert abs(route['duration_minutes'] - (float(distance) * 2 * MINUTES_PER_KM + MIN_SERVICE_MINUTES)) < 0.01
+
+    # More bottles than a vehicle carries: still delivered, on its own trip, and flagged
+    assert route['order_ids'] == [1] and route['over_limit']
+
+    # A stop too far for the shift is flagged the same way
+    plan = plan_routes([dict(stop, order_size=1)], shift_minutes=30)
+    assert plan['routes'][0]['over_limit']
+
+
+def test_two_opt_removes_crossings():
+    # Hub plus the corners of a square visited in a crossing order (0 -> 1 -> 3 -> 2 -> 4 -> 0)
+    latitudes = [HUB_LATITUDE, HUB_LATITUDE + 0.1, HUB_LATITUDE + 0.1, HUB_LATITUDE + 0.2, HUB_LATITUDE + 0.2]
+    longitudes = [HUB_LONGITUDE, HUB_LONGITUDE - 0.1, HUB_LONGITUDE + 0.1, HUB_LONGITUDE - 0.1, HUB_LONGITUDE + 0.1]
+    travel = haversine_matrix(latitudes, longitudes) * MINUTES_PER_KM
+    crossed = np.array([0, 1, 4, 3, 2, 0])
+    improved = _two_opt(crossed, travel)
+    assert improved[0] == 0 and improved[-1] == 0 and sorted(improved[1:-1]) == [1, 2, 3, 4]
+    assert route_length(improved, latitudes, longitudes) < route_length(crossed, latitudes, longitudes) - 1
+    # No single reversal shortens the result any further
+    assert list(_two_opt(improved, travel)) == list(improved)
+
+
+if __name__ == '__main__':
+    test_routes_stay_within_limits()
+    test_route_duration_and_oversized_stop()
+    test_two_opt_removes_crossings()
+    print("Route batching checks passed")
@@ -69,6 +69,10 @@ foreach ($fields_map as $input_key => $db_column) {
         }
         $params[] = $value_json;
         $param_num++;
+        
+        if ($input_key === 'delivery_address' && $value_json !== null) {
+            $saved_delivery_address = $value_json;
+        }
     }
 }
 
@@ -103,6 +107,22 @@ if (!$success) {
     exit;
 }
 
+// Precompute the new address's prediction features (distance from the hub, encoded
+// location ids) in the background so saving doesn't wait for Python to start. The
+// script writes the address_id back into users.delivery_address; failures (e.g.
+// PostgreSQL configured without psycopg2) are logged instead of discarded.
+if (isset($saved_delivery_address)) {
+    $is_windows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
+    $log_file = escapeshellarg(sys_get_temp_dir() . DIRECTORY_SEPARATOR . 'aquasphere-address-features.log');
+    $command = escapeshellarg($is_windows ? 'python' : 'python3') . ' ' . escapeshellarg(__DIR__ . '/address_features.py')
+        . ' save ' . escapeshellarg((string)$user_id) . ' ' . escapeshellarg($saved_delivery_address);
+    if ($is_windows) {
+        pclose(popen('start /B "" ' . $command . ' >> ' . $log_file . ' 2>&1', 'r'));
+    } else {
+        exec($command . ' >> ' . $log_file . ' 2>&1 &');
+    }
+}
+
 echo json_encode(['success' => true]);
 ?>
 
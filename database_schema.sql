@@ -2,6 +2,12 @@
 -- This schema can be used to create an ERD in MySQL Workbench or other database tools
 
 -- Drop existing tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS order_events;
+DROP TABLE IF EXISTS prediction_quotes;
+DROP TABLE IF EXISTS order_rollups;
+DROP TABLE IF EXISTS delivery_slot_reservations;
+DROP TABLE IF EXISTS delivery_slot_capacity;
+DROP TABLE IF EXISTS address_features;
 DROP TABLE IF EXISTS order_items;
 DROP TABLE IF EXISTS order_status_history;
 DROP TABLE IF EXISTS orders;
@@ -135,6 +141,77 @@ CREATE TABLE order_items (
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Tables maintained by the Python API (api/app.py also creates them on first use)
+
+-- Precomputed prediction features of saved delivery addresses
+CREATE TABLE address_features (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    address_key VARCHAR(255) UNIQUE NOT NULL,
+    latitude DOUBLE NOT NULL,
+    longitude DOUBLE NOT NULL,
+    municipality VARCHAR(255),
+    barangay VARCHAR(255),
+    postal_code VARCHAR(255),
+    distance_km DOUBLE NOT NULL,
+    municipality_encoded INT,
+    barangay_encoded INT,
+    postal_code_encoded INT,
+    model_version VARCHAR(255),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Delivery minutes per hub and day, and each order's reservation
+CREATE TABLE delivery_slot_capacity (
+    hub_id VARCHAR(255) NOT NULL,
+    slot_date DATE NOT NULL,
+    capacity_minutes DOUBLE NOT NULL,
+    reserved_minutes DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (hub_id, slot_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE delivery_slot_reservations (
+    order_id INT PRIMARY KEY,
+    hub_id VARCHAR(255) NOT NULL,
+    slot_date DATE NOT NULL,
+    minutes DOUBLE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    released_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Dashboard counters per day, status and municipality
+CREATE TABLE order_rollups (
+    day DATE NOT NULL,
+    status VARCHAR(255) NOT NULL,
+    municipality VARCHAR(255) NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    bottles INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, municipality)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Quoted delivery times, scored against actual deliveries by the prediction monitor
+CREATE TABLE prediction_quotes (
+    order_id INT PRIMARY KEY,
+    model_version VARCHAR(255) NOT NULL,
+    municipality VARCHAR(255),
+    distance_km DOUBLE,
+    order_size INT,
+    predicted_minutes DOUBLE NOT NULL,
+    ordered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    actual_minutes DOUBLE,
+    matched_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Order status events streamed to clients (ids are used for Last-Event-ID replay)
+CREATE TABLE order_events (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    user_id INT,
+    status VARCHAR(255) NOT NULL,
+    previous_status VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Create indexes for better performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_username ON users(username);
@@ -148,4 +225,6 @@ CREATE INDEX idx_order_items_order_id ON order_items(order_id);
 CREATE INDEX idx_order_status_history_order_id ON order_status_history(order_id);
 CREATE INDEX idx_order_status_history_user_id ON order_status_history(user_id);
 CREATE INDEX idx_products_category ON products(category);
+CREATE INDEX idx_delivery_slot_reservations_slot ON delivery_slot_reservations(hub_id, slot_date);
+CREATE INDEX idx_prediction_quotes_ordered_at ON prediction_quotes(ordered_at);
 
@@ -0,0 +1,110 @@
+"""
+Benchmark for the prediction coalescer
+Compares one-row predictions with coalesced batches under concurrent load
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import contextlib
+import io
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_synthetic_data import generate_synthetic_data, LAGUNA_MUNICIPALITIES, BARANGAYS
+from train_model import prepare_features, train_models, save_model
+from predict import predict_delivery_time
+from prediction_coalescer import PredictionCoalescer
+
+# predict.py passes plain arrays to a model fitted on a DataFrame
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+THREADS = 32
+REQUESTS_PER_THREAD = 40
+
+# (max_wait_ms, max_batch) settings to compare
+COALESCER_SETTINGS = [(1.0, 32), (2.0, 64), (5.0, 128)]
+
+
+def train_benchmark_model():
+    """Train a model on synthetic data into a scratch directory"""
+    model_dir = tempfile.mkdtemp(prefix='aquasphere-model-')
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y, label_encoders, feature_cols = prepare_features(generate_synthetic_data(5000))
+        model, model_type, metrics = train_models(X, y)
+        save_model(model, model_type, label_encoders, feature_cols, metrics, model_dir)
+    return model_dir
+
+
+def sample_request(rng):
+    municipality = rng.choice(list(LAGUNA_MUNICIPALITIES.keys()))
+    muni = LAGUNA_MUNICIPALITIES[municipality]
+    return (
+        muni['lat'] + rng.uniform(-0.05, 0.05),
+        muni['lng'] + rng.uniform(-0.05, 0.05),
+        municipality,
+        rng.choice(BARANGAYS[municipality]),
+        muni['postal'],
+        rng.randint(0, 23),
+        rng.randint(0, 6),
+        rng.randint(1, 50)
+    )
+
+
+def run(predict):
+    """Drive predict() from THREADS threads and collect latencies"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(REQUESTS_PER_THREAD):
+            args = sample_request(rng)
+            started = time.perf_counter()
+            predict(*args)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    return len(latencies) / wall, pct(0.50), pct(0.99)
+
+
+def run_benchmark():
+    model_dir = train_benchmark_model()
+    # Warm the model cache so both modes start equal
+    predict_delivery_time(*sample_request(random.Random(0)), model_dir)
+
+    print("=" * 68)
+    print(f"Prediction Coalescer Benchmark ({THREADS} threads x {REQUESTS_PER_THREAD} requests)")
+    print("=" * 68)
+    print(f"{'mode':<26} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+
+    throughput, p50, p99 = run(lambda *args: predict_delivery_time(*args, model_dir))
+    print(f"{'direct (1 row per call)':<26} {throughput:>9.1f} {p50:>9.2f} {p99:>9.2f} {1.0:>10.1f}")
+
+    for max_wait_ms, max_batch in COALESCER_SETTINGS:
+        coalescer = PredictionCoalescer(model_dir, max_wait_ms=max_wait_ms, max_batch=max_batch)
+        throughput, p50, p99 = run(coalescer.predict)
+        label = f"coalesced {max_wait_ms}ms/{max_batch}"
+        print(f"{label:<26} {throughput:>9.1f} {p50:>9.2f} {p99:>9.2f} {coalescer.stats()['avg_batch_size']:>10.1f}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
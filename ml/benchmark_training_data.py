@@ -0,0 +1,117 @@
+"""
+Benchmark for the training data store
+Reports load time, feature preparation time and memory for CSV and Parquet training data
+
+Usage:
+    python benchmark_training_data.py [rows ...]    (default: 5000 1000000 10000000)
+"""
+
+import os
+import sys
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_synthetic_data import generate_synthetic_data
+from train_model import load_data, prepare_features, convert_csv_to_parquet
+
+DEFAULT_SIZES = [5_000, 1_000_000, 10_000_000]
+CHUNK_ROWS = 1_000_000
+
+
+def write_dataset(csv_file, rows):
+    """Write a CSV of `rows` samples (resampled from the 5,000-row synthetic set) in chunks"""
+    base = generate_synthetic_data(num_samples=5000)
+    rng = np.random.default_rng(42)
+    written = 0
+    while written < rows:
+        count = min(CHUNK_ROWS, rows - written)
+        chunk = base.iloc[rng.integers(0, len(base), count)]
+        chunk.to_csv(csv_file, mode='a' if written else 'w', header=not written, index=False)
+        written += count
+
+
+def legacy_load(csv_file):
+    """What train_model.py did before: inferred dtypes, a full copy, then LabelEncoder per column"""
+    df = pd.read_csv(csv_file)
+    started = time.perf_counter()
+    df_processed = df.copy()
+    for col in ['municipality', 'barangay', 'postal_code']:
+        df_processed[col + '_encoded'] = LabelEncoder().fit_transform(df_processed[col])
+    return df, df_processed, started
+
+
+def typed_load(data_file):
+    df = load_data(data_file)
+    started = time.perf_counter()
+    X, y, label_encoders, feature_cols = prepare_features(df)
+    return df, X, started
+
+
+def measure(mode, data_file, results):
+    """Runs in a fresh process so peak RSS belongs to this mode alone"""
+    started = time.perf_counter()
+    if mode == 'csv (inferred)':
+        df, features, prepare_started = legacy_load(data_file)
+    else:
+        df, features, prepare_started = typed_load(data_file)
+    finished = time.perf_counter()
+
+    results.put({
+        'load_s': prepare_started - started,
+        'prepare_s': finished - prepare_started,
+        'frame_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    })
+
+
+def run_mode(mode, data_file):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(mode, data_file, results))
+    process.start()
+    process.join()
+    # A non-zero exit code here is usually the OOM killer
+    return results.get() if process.exitcode == 0 else None
+
+
+def run_benchmark(sizes):
+    print("=" * 84)
+    print("Training Data Store Benchmark")
+    print("=" * 84)
+    print(f"{'rows':>10} {'format':<16} {'file MB':>9} {'load s':>8} {'prepare s':>10} "
+          f"{'frame MB':>9} {'peak RSS MB':>12}")
+
+    for rows in sizes:
+        workdir = tempfile.mkdtemp(prefix='aquasphere-training-')
+        try:
+            csv_file = os.path.join(workdir, 'training.csv')
+            parquet_file = os.path.join(workdir, 'training.parquet')
+            write_dataset(csv_file, rows)
+            convert_csv_to_parquet(csv_file, parquet_file)
+
+            for mode, data_file in [('csv (inferred)', csv_file),
+                                    ('csv (typed)', csv_file),
+                                    ('parquet', parquet_file)]:
+                file_mb = os.path.getsize(data_file) / 1024 ** 2
+                result = run_mode(mode, data_file)
+                if result is None:
+                    print(f"{rows:>10} {mode:<16} {file_mb:>9.1f} {'failed (out of memory?)':>42}")
+                    continue
+                print(f"{rows:>10} {mode:<16} {file_mb:>9.1f} {result['load_s']:>8.2f} "
+                      f"{result['prepare_s']:>10.2f} {result['frame_mb']:>9.1f} {result['peak_rss_mb']:>12.1f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    run_benchmark([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
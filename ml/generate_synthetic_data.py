@@ -8,6 +8,8 @@ import numpy as np
 from datetime import datetime, timedelta
 import random
 
+from train_model import save_training_data, PARQUET_FILE, PYARROW_AVAILABLE
+
 # Delivery hub location (San Pablo City, Laguna)
 HUB_LATITUDE = 14.0703
 HUB_LONGITUDE = 121.3253
@@ -178,6 +180,11 @@ if __name__ == '__main__':
     df.to_csv(output_file, index=False)
     print(f"Dataset generated: {len(df)} samples")
     print(f"Saved to: {output_file}")
+    
+    # Typed columnar copy for training (needs pyarrow)
+    if PYARROW_AVAILABLE:
+        save_training_data(df, PARQUET_FILE)
+        print(f"Saved to: {PARQUET_FILE}")
     print("\nDataset preview:")
     print(df.head(10))
     print("\nDataset statistics:")
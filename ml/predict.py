@@ -10,6 +10,9 @@ import numpy as np
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 import os
+import time
+import queue
+import threading
 from datetime import datetime, timedelta
 
 # Delivery hub location (San Pablo City)
@@ -32,6 +35,10 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     r = 6371  # Earth radius in km
     return c * r
 
+# Loaded models keyed by model directory, reused by long-running callers
+# (e.g. the Flask API) until the model file is retrained
+_model_cache = {}
+
 def load_model(model_dir='models'):
     """Load the trained model and encoders"""
     model_file = os.path.join(model_dir, 'delivery_time_model.joblib')
@@ -41,12 +48,18 @@ def load_model(model_dir='models'):
     if not os.path.exists(model_file):
         raise FileNotFoundError(f"Model file not found: {model_file}. Please train the model first.")
     
+    model_mtime = os.path.getmtime(model_file)
+    cached = _model_cache.get(model_dir)
+    if cached and cached[0] == model_mtime:
+        return cached[1]
+    
     model = joblib.load(model_file)
     label_encoders = joblib.load(encoders_file)
     
     with open(metadata_file, 'r') as f:
         metadata = json.load(f)
     
+    _model_cache[model_dir] = (model_mtime, (model, label_encoders, metadata))
     return model, label_encoders, metadata
 
 def encode_categorical_features(features, label_encoders):
@@ -133,6 +146,316 @@ def predict_delivery_time(latitude, longitude, municipality, barangay, postal_co
         delivery_time_minutes = base_time + (distance_km * minutes_per_km) + (order_size * 0.5)
         return round(max(20, delivery_time_minutes), 2)
 
+def model_version(model_dir='models'):
+    """Identify the trained model by its file modification time (None if not trained)"""
+    model_file = os.path.join(model_dir, 'delivery_time_model.joblib')
+    return str(os.path.getmtime(model_file)) if os.path.exists(model_file) else None
+
+def _encoder_lookups(label_encoders):
+    """Class -> code lookups; unseen values map to the first class like encode_categorical_features()"""
+    return {
+        col: {value: code for code, value in enumerate(encoder.classes_)}
+        for col, encoder in label_encoders.items()
+    }
+
+def compute_address_features(latitude, longitude, municipality, barangay, postal_code, model_dir='models'):
+    """
+    Compute the time-independent features of a delivery address
+    
+    These are stored with saved addresses so quotes only need to fill in
+    time_of_order, day_of_week and order_size. Encoded ids are tied to the
+    model they were computed with (model_version) and are recomputed at
+    quote time if the model has been retrained since.
+    
+    Returns:
+        Dictionary with the raw address fields, 'distance_km', the
+        '<column>_encoded' ids and 'model_version'
+    """
+    features = {
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'municipality': municipality,
+        'barangay': barangay,
+        'postal_code': postal_code,
+        'distance_km': haversine_distance(HUB_LATITUDE, HUB_LONGITUDE, float(latitude), float(longitude)),
+        'model_version': None
+    }
+    
+    try:
+        model, label_encoders, metadata = load_model(model_dir)
+        for col, lookup in _encoder_lookups(label_encoders).items():
+            features[col + '_encoded'] = lookup.get(features.get(col), 0)
+        features['model_version'] = model_version(model_dir)
+    except Exception:
+        # No model yet; encodings are filled in at quote time
+        pass
+    
+    return features
+
+def load_address_features(address_id, database_path=None):
+    """
+    Load precomputed address features saved by the Python API
+    
+    Uses the same database as the PHP pages (see api/db.py connect()):
+    PostgreSQL when it is configured, otherwise the SQLite database at
+    database_path (default: DATABASE_PATH or aquasphere.db).
+    
+    Returns:
+        Features dictionary, or None if the address id is unknown
+    """
+    api_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+    if api_dir not in sys.path:
+        sys.path.insert(0, api_dir)
+    from db import connect
+    from address_features import get_address_features
+    
+    conn, postgres = connect(database_path)
+    try:
+        return get_address_features(conn.cursor(), int(address_id), postgres)
+    finally:
+        conn.close()
+
+def predict_delivery_times(orders, model_dir='models'):
+    """
+    Predict delivery times for many orders with a single model call
+    
+    Args:
+        orders: List of dicts with the predict_delivery_time() arguments
+                ('latitude', 'longitude', 'municipality', 'barangay', 'postal_code',
+                'time_of_order', 'day_of_week', 'order_size'). Precomputed address
+                features from compute_address_features() are used when present.
+        model_dir: Directory containing trained model
+    
+    Returns:
+        List of predicted delivery times in minutes, in the same order
+    """
+    try:
+        model, label_encoders, metadata = load_model(model_dir)
+        feature_cols = metadata['feature_columns']
+        lookups = _encoder_lookups(label_encoders)
+        current_version = model_version(model_dir)
+        
+        rows = []
+        for order in orders:
+            distance_km = order.get('distance_km')
+            if distance_km is None:
+                distance_km = haversine_distance(HUB_LATITUDE, HUB_LONGITUDE, order['latitude'], order['longitude'])
+            features = {
+                'distance_km': distance_km,
+                'latitude': order['latitude'],
+                'longitude': order['longitude'],
+                'time_of_order': int(order['time_of_order']),
+                'day_of_week': int(order['day_of_week']),
+                'order_size': int(order['order_size'])
+            }
+            # Stored encodings are only valid for the model they were computed with
+            reuse_encoded = order.get('model_version') is not None and order.get('model_version') == current_version
+            for col, lookup in lookups.items():
+                encoded = order.get(col + '_encoded') if reuse_encoded else None
+                features[col + '_encoded'] = encoded if encoded is not None else lookup.get(order.get(col), 0)
+            rows.append([features.get(col, 0) for col in feature_cols])
+        
+        predictions = model.predict(np.array(rows))
+        return [round(max(20, minutes), 2) for minutes in predictions]
+    
+    except Exception as e:
+        # Fallback calculation if model fails
+        results = []
+        for order in orders:
+            distance_km = order.get('distance_km')
+            if distance_km is None:
+                distance_km = haversine_distance(HUB_LATITUDE, HUB_LONGITUDE, order['latitude'], order['longitude'])
+            delivery_time_minutes = 15 + (distance_km * 2.5) + (order['order_size'] * 0.5)
+            results.append(round(max(20, delivery_time_minutes), 2))
+        return results
+
+def predict_delivery_time_for_address(address, time_of_order, day_of_week, order_size, model_dir='models'):
+    """
+    Predict delivery time for a saved address using its precomputed features
+    
+    Args:
+        address: Features dict from compute_address_features() / load_address_features()
+        time_of_order: Hour of order (0-23)
+        day_of_week: Day of week (0=Monday, 6=Sunday)
+        order_size: Number of water bottles
+        model_dir: Directory containing trained model
+    
+    Returns:
+        Predicted delivery time in minutes
+    """
+    order = dict(address)
+    order['time_of_order'] = time_of_order
+    order['day_of_week'] = day_of_week
+    order['order_size'] = order_size
+    return predict_delivery_times([order], model_dir)[0]
+
+class RunningStats:
+    """Streaming count, mean, standard deviation and min/max (Welford's algorithm)"""
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+    
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def to_dict(self, digits=3):
+        std = (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'mean': round(self.mean, digits),
+            'std': round(std, digits),
+            'min': round(self.min, digits) if self.min is not None else None,
+            'max': round(self.max, digits) if self.max is not None else None
+        }
+
+class ShadowEvaluator:
+    """
+    Scores a candidate model on live traffic without slowing down quotes
+    
+    The caller returns the primary model's answer right away and hands the
+    request to submit(); a background worker predicts it with the candidate
+    model and accumulates the differences and each model's latency. When the
+    queue is full, requests are dropped rather than blocking the caller.
+    
+    Latency is model time per row. The primary is served in batches (see
+    PredictionCoalescer), so the candidate is scored in batches too, of
+    whatever is queued up to max_batch, and both batch times are divided by
+    their row counts.
+    
+    Args:
+        candidate_model_dir: Directory containing the candidate model
+        max_queue: Most requests waiting to be scored
+        max_batch: Most queued requests scored in one candidate model call
+    """
+    
+    def __init__(self, candidate_model_dir, max_queue=1000, max_batch=64):
+        self.candidate_model_dir = candidate_model_dir
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset()
+    
+    def reset(self):
+        """Clear the accumulated statistics"""
+        with self._lock:
+            self.difference = RunningStats()  # candidate - primary, minutes
+            self.abs_difference = RunningStats()
+            self.primary_ms_per_row = RunningStats()
+            self.candidate_ms_per_row = RunningStats()
+            self.dropped = 0
+            self.errors = 0
+            self.last_error = None
+    
+    def start(self):
+        """Start the scoring thread if it isn't running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+                self._thread.start()
+    
+    def submit(self, order, primary_minutes, primary_latency_ms):
+        """
+        Queue a request for candidate scoring (never blocks)
+        
+        Args:
+            order: Dict with the predict_delivery_time() arguments
+            primary_minutes: What the primary model answered
+            primary_latency_ms: Primary model milliseconds for this row (a
+                batch's model call divided by its row count)
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((order, primary_minutes, primary_latency_ms))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+    
+    def stats(self):
+        """Snapshot of the streaming comparison"""
+        with self._lock:
+            return {
+                'candidate_model_dir': self.candidate_model_dir,
+                'difference_minutes': self.difference.to_dict(),
+                'abs_difference_minutes': self.abs_difference.to_dict(),
+                'primary_ms_per_row': self.primary_ms_per_row.to_dict(),
+                'candidate_ms_per_row': self.candidate_ms_per_row.to_dict(),
+                'pending': self._queue.qsize(),
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_error': self.last_error
+            }
+    
+    def _take_batch(self):
+        """Block for one queued request, then take whatever else is waiting up to max_batch"""
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                # Load explicitly so a missing candidate is an error, not the fallback formula
+                load_model(self.candidate_model_dir)
+                started = time.perf_counter()
+                candidate_minutes = predict_delivery_times([order for order, _, _ in batch], self.candidate_model_dir)
+                candidate_ms_per_row = (time.perf_counter() - started) * 1000 / len(batch)
+            except Exception as e:
+                with self._lock:
+                    self.errors += len(batch)
+                    self.last_error = str(e)
+                continue
+            
+            with self._lock:
+                for (order, primary_minutes, primary_latency_ms), minutes in zip(batch, candidate_minutes):
+                    diff = float(minutes) - float(primary_minutes)
+                    self.difference.add(diff)
+                    self.abs_difference.add(abs(diff))
+                    self.primary_ms_per_row.add(float(primary_latency_ms))
+                    self.candidate_ms_per_row.add(candidate_ms_per_row)
+
+def predict_with_shadow(latitude, longitude, municipality, barangay, postal_code,
+                        time_of_order, day_of_week, order_size, shadow, model_dir='models'):
+    """
+    Predict with the primary model and queue the same request for the shadow candidate
+    
+    Returns:
+        The primary model's predicted delivery time in minutes
+    """
+    started = time.perf_counter()
+    delivery_time_minutes = predict_delivery_time(
+        latitude, longitude, municipality, barangay, postal_code,
+        time_of_order, day_of_week, order_size, model_dir
+    )
+    latency_ms = (time.perf_counter() - started) * 1000
+    
+    shadow.submit({
+        'latitude': latitude,
+        'longitude': longitude,
+        'municipality': municipality,
+        'barangay': barangay,
+        'postal_code': postal_code,
+        'time_of_order': time_of_order,
+        'day_of_week': day_of_week,
+        'order_size': order_size
+    }, delivery_time_minutes, latency_ms)
+    
+    return delivery_time_minutes
+
 def calculate_shipping_fee(delivery_time_minutes):
     """
     Calculate shipping fee based on delivery time
@@ -238,11 +561,7 @@ def main():
             sys.exit(1)
     
     # Extract input parameters
-    latitude = float(input_data.get('latitude'))
-    longitude = float(input_data.get('longitude'))
-    municipality = input_data.get('municipality', '')
-    barangay = input_data.get('barangay', '')
-    postal_code = input_data.get('postal_code', '')
+    address_id = input_data.get('address_id')
     time_of_order = input_data.get('time_of_order', 12)  # Default to noon
     day_of_week = input_data.get('day_of_week', 0)  # Default to Monday
     order_size = int(input_data.get('order_size', 1))
@@ -260,11 +579,26 @@ def main():
         order_datetime = datetime.now()
     
     try:
-        # Predict delivery time
-        delivery_time_minutes = predict_delivery_time(
-            latitude, longitude, municipality, barangay, postal_code,
-            time_of_order, day_of_week, order_size, model_dir
-        )
+        if address_id is not None:
+            # Saved address: distance and encodings were computed when it was saved
+            address = load_address_features(address_id, input_data.get('database_path'))
+            if address is None:
+                raise ValueError(f"Unknown address_id: {address_id}")
+            delivery_time_minutes = predict_delivery_time_for_address(
+                address, time_of_order, day_of_week, order_size, model_dir
+            )
+        else:
+            latitude = float(input_data.get('latitude'))
+            longitude = float(input_data.get('longitude'))
+            municipality = input_data.get('municipality', '')
+            barangay = input_data.get('barangay', '')
+            postal_code = input_data.get('postal_code', '')
+            
+            # Predict delivery time
+            delivery_time_minutes = predict_delivery_time(
+                latitude, longitude, municipality, barangay, postal_code,
+                time_of_order, day_of_week, order_size, model_dir
+            )
         
         # Calculate shipping fee
         shipping_fee = calculate_shipping_fee(delivery_time_minutes)
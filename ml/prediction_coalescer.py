@@ -0,0 +1,148 @@
+"""
+Micro-batching Prediction Coalescer
+Stacks concurrent delivery time predictions into one model call
+
+Per-call sklearn overhead dwarfs the cost of a single row, so when quotes
+are served from a long-running process, requests that arrive within a
+small window (max_wait_ms) or until max_batch rows are queued are predicted
+together and the results are handed back to each caller.
+"""
+
+import time
+import queue
+import threading
+
+from predict import predict_delivery_times
+
+
+class _PendingPrediction:
+    """A caller waiting for its row of a batch"""
+
+    __slots__ = ('order', 'done', 'result', 'error', 'model_ms')
+
+    def __init__(self, order):
+        self.order = order
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.model_ms = None
+
+
+class PredictionCoalescer:
+    """
+    Coalesces concurrent predict_delivery_time() calls into batches
+
+    Args:
+        model_dir: Directory containing trained model
+        max_wait_ms: Longest the first request of a batch waits for company
+        max_batch: Most rows predicted in one model call
+    """
+
+    def __init__(self, model_dir='models', max_wait_ms=2.0, max_batch=64):
+        self.model_dir = model_dir
+        self.max_wait_ms = max_wait_ms
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+
+    def start(self):
+        """Start the batching thread if it isn't running"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='prediction-coalescer', daemon=True)
+                self._thread.start()
+
+    def predict(self, latitude, longitude, municipality, barangay, postal_code,
+                time_of_order, day_of_week, order_size, timeout=10):
+        """
+        Predict delivery time in minutes (same arguments as predict_delivery_time())
+
+        Blocks until the batch containing this request has been predicted.
+        """
+        return self.predict_features({
+            'latitude': latitude,
+            'longitude': longitude,
+            'municipality': municipality,
+            'barangay': barangay,
+            'postal_code': postal_code,
+            'time_of_order': time_of_order,
+            'day_of_week': day_of_week,
+            'order_size': order_size
+        }, timeout)
+
+    def predict_features(self, order, timeout=10):
+        """
+        Predict delivery time in minutes for a predict_delivery_times() order dict
+
+        Accepts precomputed address features (see compute_address_features()).
+        """
+        return self.predict_timed(order, timeout)[0]
+
+    def predict_timed(self, order, timeout=10):
+        """
+        Like predict_features(), but also report how long the model took
+
+        Returns:
+            Tuple of (delivery time in minutes, model milliseconds per row): the
+            batch's model call divided by its row count, leaving out the time
+            spent waiting for the batch to fill
+        """
+        self.start()
+        pending = _PendingPrediction(order)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError('Prediction was not served in time')
+        if pending.error is not None:
+            raise pending.error
+        return pending.result, pending.model_ms
+
+    def stats(self):
+        """Batch counters since start"""
+        with self._stats_lock:
+            return {
+                'max_wait_ms': self.max_wait_ms,
+                'max_batch': self.max_batch,
+                'batches': self._batches,
+                'rows': self._rows,
+                'avg_batch_size': round(self._rows / self._batches, 2) if self._batches else 0.0
+            }
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch or time cap"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                started = time.perf_counter()
+                results = predict_delivery_times([p.order for p in batch], self.model_dir)
+                model_ms_per_row = (time.perf_counter() - started) * 1000 / len(batch)
+                for pending, result in zip(batch, results):
+                    pending.result = result
+                    pending.model_ms = model_ms_per_row
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+
+            for pending in batch:
+                pending.done.set()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._rows += len(batch)
@@ -14,27 +14,177 @@ import joblib
 import json
 import os
 
-def load_data(csv_file='synthetic_delivery_data.csv'):
-    """Load the synthetic dataset"""
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"Dataset file '{csv_file}' not found. Please run generate_synthetic_data.py first.")
+# Try to import pyarrow for the Parquet training store, but make it optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+CSV_FILE = 'synthetic_delivery_data.csv'
+PARQUET_FILE = 'synthetic_delivery_data.parquet'
+
+CATEGORICAL_COLUMNS = ['municipality', 'barangay', 'postal_code']
+
+# Compact dtypes for the training data; location names repeat a few dozen
+# values, so they are stored as categoricals instead of one string per row
+TRAINING_DTYPES = {
+    'distance_km': 'float32',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'municipality': 'category',
+    'barangay': 'category',
+    'postal_code': 'category',
+    'time_of_order': 'int8',
+    'day_of_week': 'int8',
+    'order_size': 'int16',
+    'delivery_time_minutes': 'float32'
+}
+
+# Features whose live distribution is compared with training by the API's
+# prediction monitor, and the fewest rows a municipality needs for its own profile
+PROFILE_FEATURES = ['distance_km', 'time_of_order', 'day_of_week', 'order_size']
+PROFILE_MIN_ROWS = 100
+
+def optimize_dtypes(df):
+    """Cast a training frame to TRAINING_DTYPES (postal codes stay strings, as predict.py sends them)"""
+    dtypes = {col: dtype for col, dtype in TRAINING_DTYPES.items() if col in df.columns}
+    if 'postal_code' in df.columns:
+        df = df.assign(postal_code=df['postal_code'].astype(str))
+    return df.astype(dtypes)
+
+def save_training_data(df, parquet_file=PARQUET_FILE):
+    """Write a training frame to the Parquet store (categoricals are dictionary-encoded)"""
+    optimize_dtypes(df).to_parquet(parquet_file, index=False)
+
+def convert_csv_to_parquet(csv_file=CSV_FILE, parquet_file=PARQUET_FILE, chunksize=1_000_000):
+    """
+    Convert a training CSV to the Parquet store without loading it whole
     
-    df = pd.read_csv(csv_file)
-    return df
+    Returns:
+        Number of rows written
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for the Parquet training store: pip install pyarrow")
+    
+    # Location names are written as plain strings; Parquet dictionary-encodes
+    # them on disk and load_data() reads them back as categoricals
+    dtypes = {col: (str if dtype == 'category' else dtype) for col, dtype in TRAINING_DTYPES.items()}
+    writer = None
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_file, dtype=dtypes, chunksize=chunksize):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_file, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
 
-def prepare_features(df):
-    """Prepare features for training"""
-    # Create a copy to avoid modifying original
-    df_processed = df.copy()
+def load_data(data_file=None, columns=None):
+    """
+    Load the training dataset with compact dtypes
+    
+    Args:
+        data_file: Parquet or CSV file (default: the Parquet store if present, else the CSV)
+        columns: Only load these columns (default: all)
+    
+    Returns:
+        DataFrame with TRAINING_DTYPES
+    """
+    if data_file is None:
+        data_file = PARQUET_FILE if PYARROW_AVAILABLE and os.path.exists(PARQUET_FILE) else CSV_FILE
+    if not os.path.exists(data_file):
+        raise FileNotFoundError(f"Dataset file '{data_file}' not found. Please run generate_synthetic_data.py first.")
+    
+    if data_file.endswith('.parquet'):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required to read Parquet training data: pip install pyarrow")
+        
+        return _read_parquet(data_file, columns)
+    
+    return pd.read_csv(data_file, usecols=columns, dtype=TRAINING_DTYPES)
+
+def _read_parquet(data_file, columns=None):
+    """
+    Read a Parquet training file one row group at a time into preallocated columns
+    
+    The file is memory-mapped and only the requested columns are decoded.
+    Each row group is copied straight into its slice of the final arrays,
+    so peak memory is the result plus one row group (Table.to_pandas()
+    would hold the whole decoded table and its concatenated copy at once).
+    Location columns are kept as dictionary codes and become categoricals.
+    """
+    parquet_file = pq.ParquetFile(data_file, memory_map=True, read_dictionary=CATEGORICAL_COLUMNS)
+    schema = parquet_file.schema_arrow
+    names = columns or schema.names
+    total_rows = parquet_file.metadata.num_rows
+    
+    arrays = {}
+    categories = {}
+    for name in names:
+        if name in CATEGORICAL_COLUMNS:
+            arrays[name] = np.empty(total_rows, dtype=np.int16)
+            categories[name] = {}
+        else:
+            arrays[name] = np.empty(total_rows, dtype=schema.field(name).type.to_pandas_dtype())
+    
+    offset = 0
+    for index in range(parquet_file.num_row_groups):
+        group = parquet_file.read_row_group(index, columns=names)
+        for name in names:
+            start = offset
+            for chunk in group.column(name).chunks:
+                if name in categories:
+                    # Each row group has its own dictionary; map it to file-wide codes
+                    lookup = categories[name]
+                    mapping = np.array([lookup.setdefault(value, len(lookup)) for value in chunk.dictionary.to_pylist()],
+                                       dtype=np.int16)
+                    arrays[name][start:start + len(chunk)] = mapping[chunk.indices.to_numpy()]
+                else:
+                    arrays[name][start:start + len(chunk)] = chunk.to_numpy()
+                start += len(chunk)
+        offset += group.num_rows
+        del group
     
+    for name, lookup in categories.items():
+        arrays[name] = pd.Categorical.from_codes(arrays[name], categories=list(lookup))
+    return pd.DataFrame(arrays, copy=False)
+
+def encode_categorical(series):
+    """
+    Label-encode a column, reusing categorical codes instead of re-hashing every row
+    
+    Returns:
+        Tuple of (fitted LabelEncoder, encoded values)
+    """
+    le = LabelEncoder()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        if len(codes) and codes.min() >= 0:
+            # LabelEncoder classes are the sorted values that occur; remap
+            # category codes to that order (unused categories are dropped)
+            categories = np.asarray(series.cat.categories, dtype=object)
+            used = np.flatnonzero(np.bincount(codes, minlength=len(categories)))
+            order = used[np.argsort(categories[used])]
+            remap = np.full(len(categories), -1, dtype=np.int32)
+            remap[order] = np.arange(len(order), dtype=np.int32)
+            le.classes_ = categories[order]
+            return le, remap[codes]
+    return le, le.fit_transform(series)
+
+def prepare_features(df):
+    """Prepare features for training (the input frame is not copied or modified)"""
     # Encode categorical variables
     label_encoders = {}
-    categorical_cols = ['municipality', 'barangay', 'postal_code']
+    encoded = {}
     
-    for col in categorical_cols:
-        le = LabelEncoder()
-        df_processed[col + '_encoded'] = le.fit_transform(df_processed[col])
-        label_encoders[col] = le
+    for col in CATEGORICAL_COLUMNS:
+        label_encoders[col], encoded[col + '_encoded'] = encode_categorical(df[col])
     
     # Select features for training
     feature_cols = [
@@ -49,11 +199,38 @@ def prepare_features(df):
         'order_size'
     ]
     
-    X = df_processed[feature_cols]
-    y = df_processed['delivery_time_minutes']
+    X = pd.DataFrame({col: encoded[col] if col in encoded else df[col] for col in feature_cols})
+    y = df['delivery_time_minutes']
     
     return X, y, label_encoders, feature_cols
 
+def _distribution(values):
+    """Decile bin edges of a feature and the fraction of values in each bin"""
+    values = np.asarray(values, dtype=np.float64)
+    # Discrete features (hour, weekday, bottles) share deciles; keep each edge once
+    edges = np.unique(np.quantile(values, np.linspace(0.1, 0.9, 9)))
+    # Bin i holds edges[i-1] < value <= edges[i]; the last bin is open-ended
+    counts = np.bincount(np.searchsorted(edges, values, side='left'), minlength=len(edges) + 1)
+    return {
+        'edges': [round(float(edge), 4) for edge in edges],
+        'fractions': [round(float(count), 6) for count in counts / len(values)]
+    }
+
+def build_feature_profile(df, features=PROFILE_FEATURES, min_rows=PROFILE_MIN_ROWS):
+    """
+    Summarize the training distribution of each feature, overall and per municipality
+    
+    Returns:
+        Dictionary of {municipality (lower case) or '_all': {feature: {'edges', 'fractions'}}}
+    """
+    municipalities = df['municipality'].astype(str).str.strip().str.lower()
+    profile = {'_all': {feature: _distribution(df[feature]) for feature in features}}
+    for municipality, index in municipalities.groupby(municipalities, observed=True).groups.items():
+        if len(index) >= min_rows:
+            rows = df.loc[index]
+            profile[municipality] = {feature: _distribution(rows[feature]) for feature in features}
+    return profile
+
 def train_models(X, y):
     """Train both Linear Regression and Random Forest models"""
     # Split data
@@ -109,8 +286,8 @@ def train_models(X, y):
             'r2': lr_r2
         }
 
-def save_model(model, model_type, label_encoders, feature_cols, metrics, output_dir='models'):
-    """Save the trained model and metadata"""
+def save_model(model, model_type, label_encoders, feature_cols, metrics, output_dir='models', feature_profile=None):
+    """Save the trained model and metadata (feature_profile: see build_feature_profile())"""
     os.makedirs(output_dir, exist_ok=True)
     
     # Save model
@@ -128,7 +305,8 @@ def save_model(model, model_type, label_encoders, feature_cols, metrics, output_
         'model_type': model_type,
         'feature_columns': feature_cols,
         'metrics': metrics,
-        'categorical_columns': list(label_encoders.keys())
+        'categorical_columns': list(label_encoders.keys()),
+        'feature_profile': feature_profile
     }
     
     metadata_file = os.path.join(output_dir, 'model_metadata.json')
@@ -144,7 +322,7 @@ if __name__ == '__main__':
     # Load data
     print("\n1. Loading dataset...")
     df = load_data()
-    print(f"   Loaded {len(df)} samples")
+    print(f"   Loaded {len(df)} samples ({df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB in memory)")
     
     # Prepare features
     print("\n2. Preparing features...")
@@ -156,9 +334,9 @@ if __name__ == '__main__':
     print("\n3. Training models...")
     model, model_type, metrics = train_models(X, y)
     
-    # Save model
+    # Save model with the training feature distributions for drift monitoring
     print("\n4. Saving model...")
-    save_model(model, model_type, label_encoders, feature_cols, metrics)
+    save_model(model, model_type, label_encoders, feature_cols, metrics, feature_profile=build_feature_profile(df))
     
     print("\n" + "=" * 60)
     print("Training completed successfully!")